@@ -14,10 +14,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Número máximo de respostas guardadas para chaves de idempotência
+IDEMPOTENCIA_MAX_CHAVES = 10000
+
 # Função para conectar ao banco de dados
-def get_db():
+def get_db(compartilhada: bool = False):
+    """Abre uma conexão; `compartilhada` permite usá-la em outra thread (pool de conexões)"""
     try:
-        conn = sqlite3.connect("DataBase/mensagens.db")
+        conn = sqlite3.connect("DataBase/mensagens.db", check_same_thread=not compartilhada)
         conn.row_factory = sqlite3.Row  # Permite acessar resultados por nome de coluna
         return conn
     except Exception as e:
@@ -73,7 +77,109 @@ def criar_tabelas():
             conn.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_conversa ON mensagens(conversa_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_tipo ON mensagens(tipo)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_respondida ON mensagens(respondida)")
-            
+
+            # Cria fila de respostas pendentes (uma linha por mensagem recebida)
+            logger.info("Criando/verificando tabela de reply_jobs...")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reply_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    mensagem_id INTEGER NOT NULL UNIQUE,
+                    conversa_id INTEGER NOT NULL,
+                    status TEXT CHECK(status IN ('pendente', 'reservado', 'concluido')) NOT NULL DEFAULT 'pendente',
+                    worker_id TEXT,
+                    lease_expira_em TIMESTAMP,
+                    disponivel_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (mensagem_id) REFERENCES mensagens (id),
+                    FOREIGN KEY (conversa_id) REFERENCES conversas (id)
+                )
+            """)
+
+            # Índices para o claim: busca por status na ordem de chegada
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reply_jobs_status ON reply_jobs(status, disponivel_em, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reply_jobs_lease ON reply_jobs(status, lease_expira_em)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reply_jobs_conversa ON reply_jobs(conversa_id, status)")
+
+            # Gera jobs para mensagens recebidas ainda não respondidas (bancos antigos)
+            conn.execute("""
+                INSERT OR IGNORE INTO reply_jobs (mensagem_id, conversa_id)
+                SELECT id, conversa_id FROM mensagens
+                WHERE tipo = 'recebida' AND respondida = FALSE
+            """)
+
+            # Cria tabela de resumo por conversa, mantida por triggers
+            logger.info("Criando/verificando tabela de conversa_resumo...")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversa_resumo (
+                    conversa_id INTEGER PRIMARY KEY,
+                    email TEXT NOT NULL,
+                    anuncio_id TEXT NOT NULL,
+                    total_recebidas INTEGER NOT NULL DEFAULT 0,
+                    total_enviadas INTEGER NOT NULL DEFAULT 0,
+                    recebidas_pendentes INTEGER NOT NULL DEFAULT 0,
+                    ultima_recebida TEXT,
+                    ultima_recebida_em TIMESTAMP,
+                    ultima_enviada TEXT,
+                    ultima_enviada_em TIMESTAMP,
+                    pendente BOOLEAN NOT NULL DEFAULT FALSE,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (conversa_id) REFERENCES conversas (id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conversa_resumo_pendente ON conversa_resumo(email, pendente)")
+
+            criar_triggers_resumo(conn)
+
+            # Preenche o resumo das conversas que ainda não têm linha (bancos antigos)
+            conn.execute("""
+                INSERT OR IGNORE INTO conversa_resumo (
+                    conversa_id, email, anuncio_id,
+                    total_recebidas, total_enviadas, recebidas_pendentes,
+                    ultima_recebida, ultima_recebida_em, ultima_enviada, ultima_enviada_em,
+                    pendente
+                )
+                SELECT
+                    c.id, c.email, c.anuncio_id,
+                    (SELECT COUNT(*) FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'recebida'),
+                    (SELECT COUNT(*) FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'enviada'),
+                    (SELECT COUNT(*) FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'recebida' AND m.respondida = FALSE),
+                    (SELECT m.mensagem FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'recebida' ORDER BY m.id DESC LIMIT 1),
+                    (SELECT m.created_at FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'recebida' ORDER BY m.id DESC LIMIT 1),
+                    (SELECT m.mensagem FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'enviada' ORDER BY m.id DESC LIMIT 1),
+                    (SELECT m.created_at FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'enviada' ORDER BY m.id DESC LIMIT 1),
+                    EXISTS (SELECT 1 FROM mensagens m WHERE m.conversa_id = c.id AND m.tipo = 'recebida' AND m.respondida = FALSE)
+                FROM conversas c
+            """)
+
+            # Cria tabela de chaves de idempotência (limitada a IDEMPOTENCIA_MAX_CHAVES)
+            logger.info("Criando/verificando tabela de idempotency_keys...")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chave TEXT NOT NULL UNIQUE,
+                    endpoint TEXT NOT NULL,
+                    resposta TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Cria feed de eventos (append-only, consumido por número de sequência)
+            logger.info("Criando/verificando tabela de eventos...")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS eventos (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tipo TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    anuncio_id TEXT NOT NULL,
+                    conversa_id INTEGER NOT NULL,
+                    dados TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_eventos_email ON eventos(email, seq)")
+
             conn.commit()
             logger.info("Tabelas criadas/verificadas com sucesso")
             
@@ -85,4 +191,80 @@ def criar_tabelas():
             
     except Exception as e:
         logger.error(f"Erro ao criar tabelas: {e}")
-        raise 
\ No newline at end of file
+        raise 
+
+def criar_triggers_resumo(conn):
+    """Cria os triggers que mantêm a tabela conversa_resumo atualizada"""
+    # Nova conversa ganha uma linha de resumo zerada
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_conversa_insert
+        AFTER INSERT ON conversas
+        BEGIN
+            INSERT OR IGNORE INTO conversa_resumo (conversa_id, email, anuncio_id)
+            VALUES (NEW.id, NEW.email, NEW.anuncio_id);
+        END
+    """)
+
+    # Nova mensagem atualiza contadores e a última mensagem do seu lado
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_mensagem_insert
+        AFTER INSERT ON mensagens
+        BEGIN
+            INSERT OR IGNORE INTO conversa_resumo (conversa_id, email, anuncio_id)
+            SELECT id, email, anuncio_id FROM conversas WHERE id = NEW.conversa_id;
+
+            UPDATE conversa_resumo
+            SET total_recebidas = total_recebidas + (NEW.tipo = 'recebida'),
+                total_enviadas = total_enviadas + (NEW.tipo = 'enviada'),
+                recebidas_pendentes = recebidas_pendentes + (NEW.tipo = 'recebida' AND NOT NEW.respondida),
+                ultima_recebida = CASE WHEN NEW.tipo = 'recebida' THEN NEW.mensagem ELSE ultima_recebida END,
+                ultima_recebida_em = CASE WHEN NEW.tipo = 'recebida' THEN NEW.created_at ELSE ultima_recebida_em END,
+                ultima_enviada = CASE WHEN NEW.tipo = 'enviada' THEN NEW.mensagem ELSE ultima_enviada END,
+                ultima_enviada_em = CASE WHEN NEW.tipo = 'enviada' THEN NEW.created_at ELSE ultima_enviada_em END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE conversa_id = NEW.conversa_id;
+
+            UPDATE conversa_resumo
+            SET pendente = recebidas_pendentes > 0
+            WHERE conversa_id = NEW.conversa_id;
+        END
+    """)
+
+    # Mudança de respondida em mensagens recebidas ajusta o contador de pendentes
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_mensagem_respondida
+        AFTER UPDATE OF respondida ON mensagens
+        WHEN NEW.tipo = 'recebida' AND OLD.respondida != NEW.respondida
+        BEGIN
+            UPDATE conversa_resumo
+            SET recebidas_pendentes = recebidas_pendentes + CASE WHEN NEW.respondida THEN -1 ELSE 1 END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE conversa_id = NEW.conversa_id;
+
+            UPDATE conversa_resumo
+            SET pendente = recebidas_pendentes > 0
+            WHERE conversa_id = NEW.conversa_id;
+        END
+    """)
+
+    # Remoção de mensagem recalcula o resumo da conversa
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_resumo_mensagem_delete
+        AFTER DELETE ON mensagens
+        BEGIN
+            UPDATE conversa_resumo
+            SET total_recebidas = total_recebidas - (OLD.tipo = 'recebida'),
+                total_enviadas = total_enviadas - (OLD.tipo = 'enviada'),
+                recebidas_pendentes = recebidas_pendentes - (OLD.tipo = 'recebida' AND NOT OLD.respondida),
+                ultima_recebida = (SELECT mensagem FROM mensagens WHERE conversa_id = OLD.conversa_id AND tipo = 'recebida' ORDER BY id DESC LIMIT 1),
+                ultima_recebida_em = (SELECT created_at FROM mensagens WHERE conversa_id = OLD.conversa_id AND tipo = 'recebida' ORDER BY id DESC LIMIT 1),
+                ultima_enviada = (SELECT mensagem FROM mensagens WHERE conversa_id = OLD.conversa_id AND tipo = 'enviada' ORDER BY id DESC LIMIT 1),
+                ultima_enviada_em = (SELECT created_at FROM mensagens WHERE conversa_id = OLD.conversa_id AND tipo = 'enviada' ORDER BY id DESC LIMIT 1),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE conversa_id = OLD.conversa_id;
+
+            UPDATE conversa_resumo
+            SET pendente = recebidas_pendentes > 0
+            WHERE conversa_id = OLD.conversa_id;
+        END
+    """)
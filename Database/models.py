@@ -5,6 +5,21 @@ from datetime import datetime
 class MensagemRequest(BaseModel):
     mensagem: str
 
+class MensagemLote(BaseModel):
+    texto: str
+    tipo: str  # "enviada" ou "recebida"
+
+class AbaLote(BaseModel):
+    chave: str  # Chave de idempotência do item (gerada pelo outbox do scraper)
+    anuncio_id: str
+    nome_vendedor: Optional[str] = None
+    titulo_anuncio: Optional[str] = None
+    preco_anuncio: Optional[str] = None
+    mensagens: List[MensagemLote] = []
+
+class LoteRequest(BaseModel):
+    itens: List[AbaLote]
+
 class Mensagem(BaseModel):
     id: int
     conversa_id: int
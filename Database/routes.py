@@ -1,209 +1,223 @@
-from fastapi import APIRouter, HTTPException
-from .models import MensagemRequest
-from .database import get_db, logger
-import sqlite3
+from fastapi import APIRouter, HTTPException, Header, Depends
+from typing import Optional
+from .models import MensagemRequest, LoteRequest
+from .database import logger, IDEMPOTENCIA_MAX_CHAVES
+from .storage import Storage, Repositorio, get_storage
 
 router = APIRouter()
 
+def _buscar_resposta_idempotente(repo: Repositorio, chave: Optional[str], endpoint: str) -> Optional[dict]:
+    """Devolve a resposta já guardada para a chave, se existir"""
+    if not chave:
+        return None
+    registro = repo.buscar_idempotencia(chave)
+    if not registro:
+        return None
+    endpoint_guardado, resposta = registro
+    if endpoint_guardado != endpoint:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Idempotency-Key já utilizada no endpoint {endpoint_guardado}"
+        )
+    logger.info(f"Requisição repetida com Idempotency-Key {chave}, devolvendo resposta guardada")
+    return resposta
+
+def _guardar_resposta_idempotente(repo: Repositorio, chave: Optional[str], endpoint: str, resposta: dict):
+    """Guarda a resposta na mesma transação da escrita"""
+    if chave:
+        repo.guardar_idempotencia(chave, endpoint, resposta, IDEMPOTENCIA_MAX_CHAVES)
+
+def _registrar_mensagem(repo: Repositorio, conversa_id: int, tipo: str, mensagem: str) -> int:
+    """Insere a mensagem atualizando as respondidas e a fila de jobs da conversa"""
+    # Se a mensagem for recebida, marca todas as enviadas como respondidas
+    if tipo == 'recebida':
+        repo.marcar_respondidas(conversa_id, "enviada")
+    # Se a mensagem for enviada, marca todas as recebidas como respondidas
+    elif tipo == 'enviada':
+        repo.marcar_respondidas(conversa_id, "recebida")
+        repo.concluir_jobs_conversa(conversa_id)
+
+    mensagem_id = repo.inserir_mensagem(conversa_id, tipo, mensagem)
+
+    # Cada mensagem recebida gera um job de resposta na fila
+    if tipo == 'recebida':
+        repo.enfileirar_job(mensagem_id, conversa_id)
+    return mensagem_id
+
 @router.get("/conversas/pendentes")
-def buscar_conversas_pendentes(email: str):
+def buscar_conversas_pendentes(email: str, storage: Storage = Depends(get_storage)):
     """Retorna conversas com mensagens recebidas não respondidas"""
     try:
-        with get_db() as conn:
-            conversas = conn.execute(
-                """
-                SELECT c.id, c.email, c.anuncio_id, m.id, m.tipo, m.mensagem, m.respondida
-                FROM conversas c
-                JOIN mensagens m ON c.id = m.conversa_id
-                WHERE c.email = ?
-                AND m.tipo = 'recebida'
-                AND m.respondida = FALSE
-                ORDER BY c.id, m.id
-                """,
-                (email,),
-            ).fetchall()
-
-            resultado = {}
-            for conv in conversas:
-                if conv["id"] not in resultado:
-                    resultado[conv["id"]] = {
-                        "id": conv["id"],
-                        "email": conv["email"],
-                        "anuncio_id": conv["anuncio_id"],
-                        "mensagens": [],
-                    }
-                resultado[conv["id"]]["mensagens"].append(
-                    {
-                        "id": conv["id"],
-                        "conversa_id": conv["id"],
-                        "tipo": conv["tipo"],
-                        "mensagem": conv["mensagem"],
-                        "respondida": bool(conv["respondida"]),
-                    }
-                )
+        with storage.transacao() as repo:
+            conversas = repo.buscar_pendentes(email)
+
+        resultado = {}
+        for conv in conversas:
+            if conv["conversa_id"] not in resultado:
+                resultado[conv["conversa_id"]] = {
+                    "id": conv["conversa_id"],
+                    "email": conv["email"],
+                    "anuncio_id": conv["anuncio_id"],
+                    "mensagens": [],
+                }
+            resultado[conv["conversa_id"]]["mensagens"].append(
+                {
+                    "id": conv["mensagem_id"],
+                    "conversa_id": conv["conversa_id"],
+                    "tipo": conv["tipo"],
+                    "mensagem": conv["mensagem"],
+                    "respondida": bool(conv["respondida"]),
+                }
+            )
 
-            logger.info(f"Buscadas {len(resultado)} conversas pendentes na DB")
-            return {"conversas_pendentes": list(resultado.values())}
+        logger.info(f"Buscadas {len(resultado)} conversas pendentes na DB")
+        return {"conversas_pendentes": list(resultado.values())}
     except Exception as e:
         logger.error(f"Erro ao buscar conversas pendentes na DB: {e}")
         raise HTTPException(status_code=500, detail="Erro interno ao buscar conversas")
 
+@router.get("/conversas/resumo")
+def buscar_resumo_conversas(email: str, pendente: bool = None, anuncio_id: str = None, storage: Storage = Depends(get_storage)):
+    """Retorna o resumo por conversa (contagens, últimas mensagens e status pendente)"""
+    try:
+        with storage.transacao() as repo:
+            return {"conversas": repo.buscar_resumos(email, pendente=pendente, anuncio_id=anuncio_id)}
+    except Exception as e:
+        logger.error(f"Erro ao buscar resumo das conversas: {e}")
+        raise HTTPException(status_code=500, detail="Erro interno ao buscar resumo das conversas")
+
 @router.post("/criar-conversa")
-def criar_conversa(email: str, anuncio_id: str):
+def criar_conversa(email: str, anuncio_id: str, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
     """Cria uma nova conversa no banco de dados"""
     try:
-        with get_db() as conn:
-            # Verifica se a conversa já existe
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id FROM conversas 
-                WHERE email = ? AND anuncio_id = ?
-            """, (email, anuncio_id))
-            
-            if cursor.fetchone():
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, "/criar-conversa")
+            if resposta is not None:
+                return resposta
+
+            _, criada = repo.criar_conversa(email, anuncio_id)
+            if criada:
+                logger.info(f"Nova conversa criada para email {email} e anúncio {anuncio_id}")
+                resposta = {"message": "Conversa criada com sucesso"}
+            else:
                 logger.info(f"Conversa já existe para email {email} e anúncio {anuncio_id}")
-                return {"message": "Conversa já existe"}
-            
-            # Cria nova conversa
-            cursor.execute("""
-                INSERT INTO conversas (email, anuncio_id)
-                VALUES (?, ?)
-            """, (email, anuncio_id))
-            
-            conn.commit()
-            logger.info(f"Nova conversa criada para email {email} e anúncio {anuncio_id}")
-            return {"message": "Conversa criada com sucesso"}
+                resposta = {"message": "Conversa já existe"}
+
+            _guardar_resposta_idempotente(repo, idempotency_key, "/criar-conversa", resposta)
+            return resposta
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao criar conversa: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/enviar-mensagem")
-def enviar_mensagem(email: str, anuncio_id: str, mensagem_data: MensagemRequest):
+def enviar_mensagem(email: str, anuncio_id: str, mensagem_data: MensagemRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
     """Registra uma mensagem enviada e marca todas as mensagens recebidas anteriores como respondidas"""
     try:
-        with get_db() as conn:
-            # Usa INSERT OR IGNORE para evitar duplicatas
-            conn.execute(
-                "INSERT OR IGNORE INTO conversas (email, anuncio_id) VALUES (?, ?)",
-                (email, anuncio_id),
-            )
-            
-            # Atualiza o updated_at da conversa
-            conn.execute(
-                "UPDATE conversas SET updated_at = CURRENT_TIMESTAMP WHERE email = ? AND anuncio_id = ?",
-                (email, anuncio_id),
-            )
-            
-            conversa = conn.execute(
-                "SELECT id FROM conversas WHERE email = ? AND anuncio_id = ?",
-                (email, anuncio_id),
-            ).fetchone()
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, "/enviar-mensagem")
+            if resposta is not None:
+                return resposta
 
-            if not conversa:
-                raise HTTPException(status_code=400, detail="Erro ao criar conversa")
-
-            # Marca mensagens recebidas como respondidas em uma única query
-            conn.execute(
-                """
-                UPDATE mensagens
-                SET respondida = TRUE
-                WHERE conversa_id = ?
-                AND tipo = 'recebida'
-                AND respondida = FALSE
-                """,
-                (conversa["id"],),
-            )
+            conversa_id, _ = repo.criar_conversa(email, anuncio_id)
+            repo.tocar_conversa(conversa_id)
+
+            # Marca mensagens recebidas como respondidas e fecha os jobs da conversa
+            repo.marcar_respondidas(conversa_id, "recebida")
+            repo.concluir_jobs_conversa(conversa_id)
 
             # Insere a nova mensagem
-            conn.execute(
-                """
-                INSERT INTO mensagens (conversa_id, tipo, mensagem, respondida)
-                VALUES (?, 'enviada', ?, FALSE)
-                """,
-                (conversa["id"], mensagem_data.mensagem),
-            )
+            repo.inserir_mensagem(conversa_id, "enviada", mensagem_data.mensagem)
 
-            conn.commit()
-            return {"status": "Mensagem enviada e mensagens anteriores marcadas como respondidas"}
+            resposta = {"status": "Mensagem enviada e mensagens anteriores marcadas como respondidas"}
+            _guardar_resposta_idempotente(repo, idempotency_key, "/enviar-mensagem", resposta)
+            return resposta
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao enviar mensagem na DB: {e}")
         raise HTTPException(status_code=500, detail="Erro interno ao enviar mensagem")
 
 @router.post("/receber-mensagem")
-def receber_mensagem(email: str, anuncio_id: str, mensagem_data: MensagemRequest, tipo: str):
-    """Registra uma mensagem recebida ou enviada"""
-    try:
-        with get_db() as conn:
-            conn.execute(
-                "INSERT OR IGNORE INTO conversas (email, anuncio_id) VALUES (?, ?)",
-                (email, anuncio_id),
-            )
-            conversa = conn.execute(
-                "SELECT id FROM conversas WHERE email = ? AND anuncio_id = ?",
-                (email, anuncio_id),
-            ).fetchone()
+def receber_mensagem(email: str, anuncio_id: str, mensagem_data: MensagemRequest, tipo: str, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
+    """Registra uma mensagem recebida ou enviada.
 
-            if not conversa:
-                raise HTTPException(status_code=400, detail="Erro ao criar conversa")
-
-            # Se a mensagem for recebida, marca todas as enviadas como respondidas
-            if tipo == 'recebida':
-                conn.execute(
-                    """
-                    UPDATE mensagens
-                    SET respondida = TRUE
-                    WHERE conversa_id = ?
-                    AND tipo = 'enviada'
-                    """,
-                    (conversa["id"],),
-                )
-            # Se a mensagem for enviada, marca todas as recebidas como respondidas
-            elif tipo == 'enviada':
-                conn.execute(
-                    """
-                    UPDATE mensagens
-                    SET respondida = TRUE
-                    WHERE conversa_id = ?
-                    AND tipo = 'recebida'
-                    """,
-                    (conversa["id"],),
-                )
-
-            conn.execute(
-                """
-                INSERT INTO mensagens (conversa_id, tipo, mensagem, respondida)
-                VALUES (?, ?, ?, FALSE)
-                """,
-                (conversa["id"], tipo, mensagem_data.mensagem),
-            )
+    Com Idempotency-Key (sincronização do scraper), uma mensagem que a conversa já
+    tem não é gravada de novo, como no /sincronizar-lote; "inserida" diz se houve escrita.
+    """
+    try:
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, "/receber-mensagem")
+            if resposta is not None:
+                return resposta
 
-            conn.commit()
-            return {"status": f"Mensagem {tipo} registrada com sucesso"}
+            conversa_id, _ = repo.criar_conversa(email, anuncio_id)
+            if idempotency_key and repo.mensagem_existe(conversa_id, mensagem_data.mensagem, tipo):
+                resposta = {"status": f"Mensagem {tipo} já registrada", "inserida": False}
+            else:
+                _registrar_mensagem(repo, conversa_id, tipo, mensagem_data.mensagem)
+                resposta = {"status": f"Mensagem {tipo} registrada com sucesso", "inserida": True}
+            _guardar_resposta_idempotente(repo, idempotency_key, "/receber-mensagem", resposta)
+            return resposta
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao receber mensagem na DB: {e}")
         raise HTTPException(status_code=500, detail="Erro interno ao receber mensagem")
 
+@router.post("/sincronizar-lote")
+def sincronizar_lote(email: str, lote: LoteRequest, storage: Storage = Depends(get_storage)):
+    """Aplica em lote as abas extraídas pelo scraper (conversa, informações do anúncio e mensagens).
+
+    Cada item roda na sua própria transação e usa `chave` como chave de idempotência,
+    então reenviar um lote inteiro é seguro. Mensagens já registradas são ignoradas.
+    """
+    resultados = []
+    for item in lote.itens:
+        try:
+            with storage.transacao(escrita=True) as repo:
+                resposta = _buscar_resposta_idempotente(repo, item.chave, "/sincronizar-lote")
+                if resposta is not None:
+                    resultados.append(resposta)
+                    continue
+
+                conversa_id, _ = repo.criar_conversa(email, item.anuncio_id)
+                if item.nome_vendedor is not None:
+                    repo.atualizar_info_anuncio(conversa_id, item.nome_vendedor, item.titulo_anuncio, item.preco_anuncio)
+
+                inseridas = 0
+                for msg in item.mensagens:
+                    if repo.mensagem_existe(conversa_id, msg.texto, msg.tipo):
+                        continue
+                    _registrar_mensagem(repo, conversa_id, msg.tipo, msg.texto)
+                    inseridas += 1
+
+                resposta = {"chave": item.chave, "status": "ok", "inseridas": inseridas}
+                _guardar_resposta_idempotente(repo, item.chave, "/sincronizar-lote", resposta)
+                resultados.append(resposta)
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar item {item.chave} do anúncio {item.anuncio_id}: {e}")
+            resultados.append({"chave": item.chave, "status": "erro", "detalhe": str(e)})
+
+    logger.info(f"Lote sincronizado: {sum(1 for r in resultados if r['status'] == 'ok')}/{len(resultados)} itens")
+    return {"resultados": resultados}
+
 @router.get("/mensagem-existe")
-def verificar_mensagem_existe(email: str, anuncio_id: str, mensagem: str, tipo: str):
+def verificar_mensagem_existe(email: str, anuncio_id: str, mensagem: str, tipo: str, storage: Storage = Depends(get_storage)):
     """Verifica se uma mensagem já existe na DB para um anúncio específico"""
     try:
-        with get_db() as conn:
+        with storage.transacao() as repo:
             # Busca a conversa
-            conversa = conn.execute("SELECT id FROM conversas WHERE email = ? AND anuncio_id = ?", 
-                                  (email, anuncio_id)).fetchone()
-            
+            conversa = repo.obter_conversa(email, anuncio_id)
+
             if not conversa:
                 logger.info(f"Conversa não encontrada para anuncio_id: {anuncio_id}")
                 return {"existe": False}
-            
+
             # Verifica se a mensagem já existe
-            mensagem_existe = conn.execute("""
-                SELECT COUNT(*) FROM mensagens 
-                WHERE conversa_id = ? 
-                AND mensagem = ?
-                AND tipo = ?
-            """, (conversa["id"], mensagem, tipo)).fetchone()[0] > 0
-            
+            mensagem_existe = repo.mensagem_existe(conversa["id"], mensagem, tipo)
+
             logger.info(f"Verificação de mensagem para anuncio_id {anuncio_id}: {'existe' if mensagem_existe else 'não existe'}")
             return {"existe": mensagem_existe}
     except Exception as e:
@@ -211,138 +225,82 @@ def verificar_mensagem_existe(email: str, anuncio_id: str, mensagem: str, tipo:
         raise HTTPException(status_code=500, detail=f"Erro interno ao verificar mensagem: {str(e)}")
 
 @router.get("/mensagens")
-def buscar_mensagens(email: str, tipo: str = None, conversa_id: int = None, anuncio_id: str = None, respondida: bool = None, searched_info: bool = None):
+def buscar_mensagens(email: str, tipo: str = None, conversa_id: int = None, anuncio_id: str = None, respondida: bool = None, searched_info: bool = None, storage: Storage = Depends(get_storage)):
     """Retorna todas as mensagens de um usuário, com opção de filtrar por tipo, conversa, anúncio e status de resposta"""
     try:
-        with get_db() as conn:
-            # Query base otimizada com JOIN
-            query = """
-                SELECT 
-                    c.id as conversa_id, 
-                    c.email, 
-                    c.anuncio_id,
-                    c.nome_vendedor,
-                    c.titulo_anuncio,
-                    c.preco_anuncio,
-                    c.searched_info,
-                    c.created_at as conversa_created_at,
-                    c.updated_at as conversa_updated_at,
-                    m.id as mensagem_id, 
-                    m.tipo, 
-                    m.mensagem, 
-                    m.respondida,
-                    m.created_at as mensagem_created_at
-                FROM conversas c
-                JOIN mensagens m ON c.id = m.conversa_id
-                WHERE c.email = ?
-            """
-            params = [email]
-
-            # Adiciona filtros dinâmicos
-            if tipo:
-                query += " AND m.tipo = ?"
-                params.append(tipo)
-            if conversa_id:
-                query += " AND c.id = ?"
-                params.append(conversa_id)
-            if anuncio_id:
-                query += " AND c.anuncio_id = ?"
-                params.append(anuncio_id)
-            if respondida is not None:
-                query += " AND m.respondida = ?"
-                params.append(respondida)
-            if searched_info is not None:
-                if searched_info:
-                    query += " AND c.searched_info IS NOT NULL"
-                else:
-                    query += " AND c.searched_info IS NULL"
-
-            # Ordena por data de criação da mensagem
-            query += " ORDER BY m.created_at ASC"
-
-            mensagens = conn.execute(query, params).fetchall()
-
-            # Organiza o resultado
-            resultado = {}
-            for msg in mensagens:
-                conversa_id = msg["conversa_id"]
-                if conversa_id not in resultado:
-                    resultado[conversa_id] = {
-                        "id": conversa_id,
-                        "email": msg["email"],
-                        "anuncio_id": msg["anuncio_id"],
-                        "nome_vendedor": msg["nome_vendedor"],
-                        "titulo_anuncio": msg["titulo_anuncio"],
-                        "preco_anuncio": msg["preco_anuncio"],
-                        "searched_info": msg["searched_info"],
-                        "created_at": msg["conversa_created_at"],
-                        "updated_at": msg["conversa_updated_at"],
-                        "mensagens": []
-                    }
-                resultado[conversa_id]["mensagens"].append({
-                    "id": msg["mensagem_id"],
-                    "conversa_id": conversa_id,
-                    "tipo": msg["tipo"],
-                    "mensagem": msg["mensagem"],
-                    "respondida": bool(msg["respondida"]),
-                    "created_at": msg["mensagem_created_at"]
-                })
-
-            return {"conversas": list(resultado.values())}
+        with storage.transacao() as repo:
+            mensagens = repo.buscar_mensagens(
+                email,
+                tipo=tipo,
+                conversa_id=conversa_id,
+                anuncio_id=anuncio_id,
+                respondida=respondida,
+                searched_info=searched_info,
+            )
+
+        # Organiza o resultado
+        resultado = {}
+        for msg in mensagens:
+            conversa_id = msg["conversa_id"]
+            if conversa_id not in resultado:
+                resultado[conversa_id] = {
+                    "id": conversa_id,
+                    "email": msg["email"],
+                    "anuncio_id": msg["anuncio_id"],
+                    "nome_vendedor": msg["nome_vendedor"],
+                    "titulo_anuncio": msg["titulo_anuncio"],
+                    "preco_anuncio": msg["preco_anuncio"],
+                    "searched_info": msg["searched_info"],
+                    "created_at": msg["conversa_created_at"],
+                    "updated_at": msg["conversa_updated_at"],
+                    "mensagens": []
+                }
+            resultado[conversa_id]["mensagens"].append({
+                "id": msg["mensagem_id"],
+                "conversa_id": conversa_id,
+                "tipo": msg["tipo"],
+                "mensagem": msg["mensagem"],
+                "respondida": bool(msg["respondida"]),
+                "created_at": msg["mensagem_created_at"]
+            })
+
+        return {"conversas": list(resultado.values())}
     except Exception as e:
         logger.error(f"Erro ao buscar mensagens: {e}")
         raise HTTPException(status_code=500, detail="Erro interno ao buscar mensagens")
 
 @router.post("/atualizar-info-anuncio")
-def atualizar_info_anuncio(email: str, anuncio_id: str, nome_vendedor: str, titulo_anuncio: str, preco_anuncio: str):
+def atualizar_info_anuncio(email: str, anuncio_id: str, nome_vendedor: str, titulo_anuncio: str, preco_anuncio: str, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
     """Atualiza as informações do anúncio na conversa"""
     try:
-        # Verifica se a conversa existe
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, "/atualizar-info-anuncio")
+            if resposta is not None:
+                return resposta
+
             # Verifica se a conversa existe
-            cursor.execute("""
-                SELECT id FROM conversas 
-                WHERE email = ? AND anuncio_id = ?
-            """, (email, anuncio_id))
-            
-            conversa = cursor.fetchone()
+            conversa = repo.obter_conversa(email, anuncio_id)
             if not conversa:
                 logger.error(f"Conversa não encontrada para email {email} e anúncio {anuncio_id}")
                 raise HTTPException(
                     status_code=404,
                     detail=f"Conversa não encontrada para email {email} e anúncio {anuncio_id}"
                 )
-            
+
             # Tenta atualizar as informações
-            try:
-                cursor.execute("""
-                    UPDATE conversas 
-                    SET nome_vendedor = ?,
-                        titulo_anuncio = ?,
-                        preco_anuncio = ?
-                    WHERE email = ? AND anuncio_id = ?
-                """, (nome_vendedor, titulo_anuncio, preco_anuncio, email, anuncio_id))
-                
-                if cursor.rowcount == 0:
-                    logger.error(f"Nenhuma linha atualizada para email {email} e anúncio {anuncio_id}")
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Nenhuma linha atualizada para email {email} e anúncio {anuncio_id}"
-                    )
-                
-                conn.commit()
-                logger.info(f"Informações do anúncio atualizadas com sucesso para email {email} e anúncio {anuncio_id}")
-                return {"status": "Informações do anúncio atualizadas com sucesso"}
-                
-            except sqlite3.Error as e:
-                logger.error(f"Erro SQL ao atualizar informações do anúncio: {e}")
+            if not repo.atualizar_info_anuncio(conversa["id"], nome_vendedor, titulo_anuncio, preco_anuncio):
+                logger.error(f"Nenhuma linha atualizada para email {email} e anúncio {anuncio_id}")
                 raise HTTPException(
-                    status_code=500,
-                    detail=f"Erro SQL ao atualizar informações do anúncio: {str(e)}"
+                    status_code=400,
+                    detail=f"Nenhuma linha atualizada para email {email} e anúncio {anuncio_id}"
                 )
-                
+
+            resposta = {"status": "Informações do anúncio atualizadas com sucesso"}
+            _guardar_resposta_idempotente(repo, idempotency_key, "/atualizar-info-anuncio", resposta)
+
+            logger.info(f"Informações do anúncio atualizadas com sucesso para email {email} e anúncio {anuncio_id}")
+            return resposta
+
     except HTTPException:
         raise
     except Exception as e:
@@ -353,76 +311,63 @@ def atualizar_info_anuncio(email: str, anuncio_id: str, nome_vendedor: str, titu
         )
 
 @router.get("/info-anuncio")
-def buscar_info_anuncio(email: str, anuncio_id: str):
+def buscar_info_anuncio(email: str, anuncio_id: str, storage: Storage = Depends(get_storage)):
     """Retorna as informações do anúncio"""
     try:
-        with get_db() as conn:
-            info = conn.execute(
-                """
-                SELECT nome_vendedor, titulo_anuncio, preco_anuncio, searched_info
-                FROM conversas
-                WHERE email = ? AND anuncio_id = ?
-                """,
-                (email, anuncio_id)
-            ).fetchone()
-            
-            if info:
-                return {
-                    "nome_vendedor": info["nome_vendedor"],
-                    "titulo_anuncio": info["titulo_anuncio"],
-                    "preco_anuncio": info["preco_anuncio"],
-                    "searched_info": info["searched_info"]
-                }
-            else:
-                return {}
+        with storage.transacao() as repo:
+            info = repo.obter_conversa(email, anuncio_id)
+
+        if info:
+            return {
+                "nome_vendedor": info["nome_vendedor"],
+                "titulo_anuncio": info["titulo_anuncio"],
+                "preco_anuncio": info["preco_anuncio"],
+                "searched_info": info["searched_info"]
+            }
+        else:
+            return {}
     except Exception as e:
         logger.error(f"Erro ao buscar informações do anúncio: {e}")
         raise HTTPException(status_code=500, detail="Erro interno ao buscar informações do anúncio")
 
 @router.post("/atualizar-searched-info")
-def atualizar_searched_info(email: str, anuncio_id: str, searched_info: str):
+def atualizar_searched_info(email: str, anuncio_id: str, searched_info: str, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
     """Atualiza o campo searched_info da conversa se ele ainda estiver vazio"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, "/atualizar-searched-info")
+            if resposta is not None:
+                return resposta
+
             # Verifica se a conversa existe e se searched_info está vazio
-            cursor.execute("""
-                SELECT id, searched_info FROM conversas 
-                WHERE email = ? AND anuncio_id = ?
-            """, (email, anuncio_id))
-            
-            conversa = cursor.fetchone()
+            conversa = repo.obter_conversa(email, anuncio_id)
             if not conversa:
                 logger.error(f"Conversa não encontrada para email {email} e anúncio {anuncio_id}")
                 raise HTTPException(
                     status_code=404,
                     detail=f"Conversa não encontrada para email {email} e anúncio {anuncio_id}"
                 )
-            
+
             if conversa["searched_info"] is not None:
                 logger.info(f"Campo searched_info já preenchido para email {email} e anúncio {anuncio_id}")
-                return {"status": "Campo searched_info já está preenchido"}
-            
+                resposta = {"status": "Campo searched_info já está preenchido"}
+                _guardar_resposta_idempotente(repo, idempotency_key, "/atualizar-searched-info", resposta)
+                return resposta
+
             # Atualiza o campo searched_info
-            cursor.execute("""
-                UPDATE conversas 
-                SET searched_info = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE email = ? AND anuncio_id = ?
-            """, (searched_info, email, anuncio_id))
-            
-            if cursor.rowcount == 0:
+            if not repo.definir_searched_info(conversa["id"], searched_info):
                 logger.error(f"Nenhuma linha atualizada para email {email} e anúncio {anuncio_id}")
                 raise HTTPException(
                     status_code=400,
                     detail=f"Nenhuma linha atualizada para email {email} e anúncio {anuncio_id}"
                 )
-            
-            conn.commit()
+
+            resposta = {"status": "Campo searched_info atualizado com sucesso"}
+            _guardar_resposta_idempotente(repo, idempotency_key, "/atualizar-searched-info", resposta)
+
             logger.info(f"Campo searched_info atualizado com sucesso para email {email} e anúncio {anuncio_id}")
-            return {"status": "Campo searched_info atualizado com sucesso"}
-            
+            return resposta
+
     except HTTPException:
         raise
     except Exception as e:
@@ -430,4 +375,98 @@ def atualizar_searched_info(email: str, anuncio_id: str, searched_info: str):
         raise HTTPException(
             status_code=500,
             detail=f"Erro inesperado ao atualizar searched_info: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/jobs/claim")
+def reservar_jobs(worker_id: str, limite: int = 10, visibilidade: int = 300, email: str = None, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
+    """Reserva atomicamente até `limite` jobs de resposta para um worker durante `visibilidade` segundos"""
+    if limite < 1 or visibilidade < 1:
+        raise HTTPException(status_code=400, detail="limite e visibilidade devem ser positivos")
+    try:
+        # A transação de escrita garante que dois workers não reservem o mesmo job
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, "/jobs/claim")
+            if resposta is not None:
+                return resposta
+
+            jobs = repo.reservar_jobs(worker_id, limite, visibilidade, email=email)
+
+            resposta = {"jobs": jobs}
+            _guardar_resposta_idempotente(repo, idempotency_key, "/jobs/claim", resposta)
+
+            if jobs:
+                logger.info(f"{len(jobs)} jobs reservados para o worker {worker_id}")
+            return resposta
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao reservar jobs: {e}")
+        raise HTTPException(status_code=500, detail="Erro interno ao reservar jobs")
+
+@router.post("/jobs/{job_id}/ack")
+def confirmar_job(job_id: int, worker_id: str, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
+    """Conclui um job reservado pelo worker"""
+    try:
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, f"/jobs/{job_id}/ack")
+            if resposta is not None:
+                return resposta
+
+            if not repo.confirmar_job(job_id, worker_id):
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Job {job_id} não está reservado pelo worker {worker_id}"
+                )
+
+            resposta = {"status": "Job concluído"}
+            _guardar_resposta_idempotente(repo, idempotency_key, f"/jobs/{job_id}/ack", resposta)
+
+            logger.info(f"Job {job_id} concluído pelo worker {worker_id}")
+            return resposta
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao confirmar job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail="Erro interno ao confirmar job")
+
+@router.post("/jobs/{job_id}/nack")
+def devolver_job(job_id: int, worker_id: str, atraso: int = 0, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), storage: Storage = Depends(get_storage)):
+    """Devolve um job reservado à fila, disponível novamente após `atraso` segundos"""
+    try:
+        with storage.transacao(escrita=True) as repo:
+            resposta = _buscar_resposta_idempotente(repo, idempotency_key, f"/jobs/{job_id}/nack")
+            if resposta is not None:
+                return resposta
+
+            if not repo.devolver_job(job_id, worker_id, atraso):
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Job {job_id} não está reservado pelo worker {worker_id}"
+                )
+
+            resposta = {"status": "Job devolvido à fila"}
+            _guardar_resposta_idempotente(repo, idempotency_key, f"/jobs/{job_id}/nack", resposta)
+
+            logger.info(f"Job {job_id} devolvido à fila pelo worker {worker_id}")
+            return resposta
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao devolver job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail="Erro interno ao devolver job")
+
+@router.get("/eventos")
+def buscar_eventos(after: int = 0, limite: int = 100, email: str = None, storage: Storage = Depends(get_storage)):
+    """Retorna os eventos com seq maior que `after`; o consumidor guarda `ultimo_seq` para a próxima chamada"""
+    if limite < 1:
+        raise HTTPException(status_code=400, detail="limite deve ser positivo")
+    try:
+        with storage.transacao() as repo:
+            eventos = repo.buscar_eventos(after, min(limite, 1000), email=email)
+        return {
+            "eventos": eventos,
+            "ultimo_seq": eventos[-1]["seq"] if eventos else after,
+        }
+    except Exception as e:
+        logger.error(f"Erro ao buscar eventos: {e}")
+        raise HTTPException(status_code=500, detail="Erro interno ao buscar eventos")
@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from .routes import router
-from .database import criar_tabelas
+from .storage import get_storage
+import asyncio
+import os
 import uvicorn
 import logging
 
@@ -21,9 +23,30 @@ app = FastAPI()
 # Inclui as rotas
 app.include_router(router)
 
-def iniciar_servidor():
-    """Inicia o servidor FastAPI e cria as tabelas"""
-    # Cria as tabelas ao iniciar
-    criar_tabelas()
-    logger.info("Iniciando servidor FastAPI")
-    uvicorn.run(app, host="localhost", port=8000) 
\ No newline at end of file
+async def _servir(configs):
+    """Roda um servidor uvicorn por config no mesmo event loop"""
+    await asyncio.gather(*(uvicorn.Server(config).serve() for config in configs))
+
+def iniciar_servidor(host: str = "localhost", port: int = 8000, uds: str = None):
+    """Inicia o servidor FastAPI e prepara o armazenamento.
+
+    Com `uds` (ou a variável de ambiente API_UDS) a API também escuta nesse
+    socket Unix, além da porta TCP.
+    """
+    # Cria as tabelas ao iniciar (no backend SQLite)
+    get_storage().inicializar()
+    uds = uds or os.getenv("API_UDS")
+    if not uds:
+        logger.info("Iniciando servidor FastAPI")
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    logger.info(f"Iniciando servidor FastAPI em {host}:{port} e no socket {uds}")
+    try:
+        asyncio.run(_servir([
+            uvicorn.Config(app, host=host, port=port),
+            uvicorn.Config(app, uds=uds),
+        ]))
+    except KeyboardInterrupt:
+        # Mesmo comportamento do uvicorn.run: Ctrl+C encerra os dois servidores sem traceback
+        pass
@@ -0,0 +1,945 @@
+"""
+Camada de armazenamento da API: interface de repositório e implementações SQLite e em memória
+"""
+import os
+import json
+import bisect
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .database import get_db, criar_tabelas, logger
+
+
+class Repositorio(ABC):
+    """Operações sobre conversas, mensagens, informações do anúncio, jobs, idempotência e eventos.
+
+    Uma instância vive dentro de uma transação aberta por `Storage.transacao`.
+    Toda escrita em mensagens, respondida e informações do anúncio gera um evento
+    na mesma transação.
+    """
+
+    # Conversas e informações do anúncio
+    @abstractmethod
+    def obter_conversa(self, email: str, anuncio_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna a conversa ou None se ela não existir"""
+
+    @abstractmethod
+    def criar_conversa(self, email: str, anuncio_id: str) -> Tuple[int, bool]:
+        """Cria a conversa se necessário e retorna (conversa_id, criada)"""
+
+    @abstractmethod
+    def tocar_conversa(self, conversa_id: int) -> None:
+        """Atualiza o updated_at da conversa"""
+
+    @abstractmethod
+    def atualizar_info_anuncio(self, conversa_id: int, nome_vendedor: str, titulo_anuncio: str, preco_anuncio: str) -> bool:
+        """Atualiza vendedor, título e preço; retorna False se nada foi alterado"""
+
+    @abstractmethod
+    def definir_searched_info(self, conversa_id: int, searched_info: str) -> bool:
+        """Grava o searched_info; retorna False se nada foi alterado"""
+
+    # Mensagens
+    @abstractmethod
+    def inserir_mensagem(self, conversa_id: int, tipo: str, mensagem: str) -> int:
+        """Insere uma mensagem não respondida e retorna o seu id"""
+
+    @abstractmethod
+    def marcar_respondidas(self, conversa_id: int, tipo: str) -> int:
+        """Marca como respondidas as mensagens de um tipo e retorna quantas mudaram"""
+
+    @abstractmethod
+    def mensagem_existe(self, conversa_id: int, mensagem: str, tipo: str) -> bool:
+        """Verifica se a conversa já tem uma mensagem com este texto e tipo"""
+
+    @abstractmethod
+    def buscar_mensagens(self, email: str, tipo: str = None, conversa_id: int = None, anuncio_id: str = None,
+                         respondida: bool = None, searched_info: bool = None) -> List[Dict[str, Any]]:
+        """Retorna as mensagens (uma linha por mensagem, com os dados da conversa) em ordem cronológica"""
+
+    @abstractmethod
+    def buscar_pendentes(self, email: str) -> List[Dict[str, Any]]:
+        """Retorna as mensagens recebidas não respondidas das conversas pendentes"""
+
+    @abstractmethod
+    def buscar_resumos(self, email: str, pendente: bool = None, anuncio_id: str = None) -> List[Dict[str, Any]]:
+        """Retorna o resumo por conversa, da atividade mais recente para a mais antiga"""
+
+    # Fila de respostas
+    @abstractmethod
+    def enfileirar_job(self, mensagem_id: int, conversa_id: int) -> None:
+        """Cria o job de resposta de uma mensagem recebida"""
+
+    @abstractmethod
+    def concluir_jobs_conversa(self, conversa_id: int) -> None:
+        """Conclui os jobs em aberto de uma conversa, mantendo o último worker que os reservou"""
+
+    @abstractmethod
+    def reservar_jobs(self, worker_id: str, limite: int, visibilidade: int, email: str = None) -> List[Dict[str, Any]]:
+        """Reserva até `limite` jobs disponíveis para o worker"""
+
+    @abstractmethod
+    def confirmar_job(self, job_id: int, worker_id: str) -> bool:
+        """Conclui um job reservado pelo worker; retorna False se a reserva não é dele.
+
+        Confirmar um job já concluído cuja última reserva foi do mesmo worker
+        (a resposta fechou a conversa antes do ack) também retorna True.
+        """
+
+    @abstractmethod
+    def devolver_job(self, job_id: int, worker_id: str, atraso: int) -> bool:
+        """Devolve um job reservado à fila; retorna False se a reserva não é dele"""
+
+    # Idempotência
+    @abstractmethod
+    def buscar_idempotencia(self, chave: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Retorna (endpoint, resposta) guardados para a chave"""
+
+    @abstractmethod
+    def guardar_idempotencia(self, chave: str, endpoint: str, resposta: Dict[str, Any], limite: int) -> None:
+        """Guarda a resposta da chave mantendo no máximo `limite` chaves"""
+
+    # Eventos
+    @abstractmethod
+    def buscar_eventos(self, depois_de: int, limite: int, email: str = None) -> List[Dict[str, Any]]:
+        """Retorna até `limite` eventos com seq maior que `depois_de`, em ordem"""
+
+
+class Storage(ABC):
+    """Motor de armazenamento que abre transações sobre um Repositorio"""
+
+    nome = ""
+
+    @abstractmethod
+    def inicializar(self) -> None:
+        """Prepara o armazenamento (tabelas, índices, triggers)"""
+
+    @abstractmethod
+    def transacao(self, escrita: bool = False):
+        """Context manager que entrega um Repositorio; confirma ao sair e desfaz em caso de erro"""
+
+
+# ---------------------------------------------------------------------------
+# SQLite
+# ---------------------------------------------------------------------------
+
+class SQLiteRepositorio(Repositorio):
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def _registrar_evento(self, tipo: str, conversa_id: int, dados: Dict[str, Any]) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO eventos (tipo, email, anuncio_id, conversa_id, dados)
+            SELECT ?, email, anuncio_id, id, ? FROM conversas WHERE id = ?
+            """,
+            (tipo, json.dumps(dados, ensure_ascii=False), conversa_id),
+        )
+
+    def obter_conversa(self, email: str, anuncio_id: str) -> Optional[Dict[str, Any]]:
+        conversa = self.conn.execute(
+            "SELECT * FROM conversas WHERE email = ? AND anuncio_id = ?",
+            (email, anuncio_id),
+        ).fetchone()
+        return dict(conversa) if conversa else None
+
+    def criar_conversa(self, email: str, anuncio_id: str) -> Tuple[int, bool]:
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO conversas (email, anuncio_id) VALUES (?, ?)",
+            (email, anuncio_id),
+        )
+        criada = cursor.rowcount > 0
+        conversa = self.conn.execute(
+            "SELECT id FROM conversas WHERE email = ? AND anuncio_id = ?",
+            (email, anuncio_id),
+        ).fetchone()
+        if criada:
+            self._registrar_evento("conversa_criada", conversa["id"], {})
+        return conversa["id"], criada
+
+    def tocar_conversa(self, conversa_id: int) -> None:
+        self.conn.execute(
+            "UPDATE conversas SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (conversa_id,),
+        )
+
+    def atualizar_info_anuncio(self, conversa_id: int, nome_vendedor: str, titulo_anuncio: str, preco_anuncio: str) -> bool:
+        cursor = self.conn.execute(
+            """
+            UPDATE conversas
+            SET nome_vendedor = ?,
+                titulo_anuncio = ?,
+                preco_anuncio = ?
+            WHERE id = ?
+            """,
+            (nome_vendedor, titulo_anuncio, preco_anuncio, conversa_id),
+        )
+        if cursor.rowcount == 0:
+            return False
+        self._registrar_evento("info_anuncio_atualizada", conversa_id, {
+            "nome_vendedor": nome_vendedor,
+            "titulo_anuncio": titulo_anuncio,
+            "preco_anuncio": preco_anuncio,
+        })
+        return True
+
+    def definir_searched_info(self, conversa_id: int, searched_info: str) -> bool:
+        cursor = self.conn.execute(
+            """
+            UPDATE conversas
+            SET searched_info = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            """,
+            (searched_info, conversa_id),
+        )
+        if cursor.rowcount == 0:
+            return False
+        self._registrar_evento("searched_info_atualizada", conversa_id, {"searched_info": searched_info})
+        return True
+
+    def inserir_mensagem(self, conversa_id: int, tipo: str, mensagem: str) -> int:
+        cursor = self.conn.execute(
+            """
+            INSERT INTO mensagens (conversa_id, tipo, mensagem, respondida)
+            VALUES (?, ?, ?, FALSE)
+            """,
+            (conversa_id, tipo, mensagem),
+        )
+        self._registrar_evento("mensagem_inserida", conversa_id, {
+            "mensagem_id": cursor.lastrowid,
+            "tipo": tipo,
+            "mensagem": mensagem,
+        })
+        return cursor.lastrowid
+
+    def marcar_respondidas(self, conversa_id: int, tipo: str) -> int:
+        cursor = self.conn.execute(
+            """
+            UPDATE mensagens
+            SET respondida = TRUE
+            WHERE conversa_id = ?
+            AND tipo = ?
+            AND respondida = FALSE
+            """,
+            (conversa_id, tipo),
+        )
+        if cursor.rowcount:
+            self._registrar_evento("mensagens_respondidas", conversa_id, {"tipo": tipo, "quantidade": cursor.rowcount})
+        return cursor.rowcount
+
+    def mensagem_existe(self, conversa_id: int, mensagem: str, tipo: str) -> bool:
+        return self.conn.execute(
+            """
+            SELECT COUNT(*) FROM mensagens
+            WHERE conversa_id = ?
+            AND mensagem = ?
+            AND tipo = ?
+            """,
+            (conversa_id, mensagem, tipo),
+        ).fetchone()[0] > 0
+
+    def buscar_mensagens(self, email: str, tipo: str = None, conversa_id: int = None, anuncio_id: str = None,
+                         respondida: bool = None, searched_info: bool = None) -> List[Dict[str, Any]]:
+        query = """
+            SELECT
+                c.id as conversa_id,
+                c.email,
+                c.anuncio_id,
+                c.nome_vendedor,
+                c.titulo_anuncio,
+                c.preco_anuncio,
+                c.searched_info,
+                c.created_at as conversa_created_at,
+                c.updated_at as conversa_updated_at,
+                m.id as mensagem_id,
+                m.tipo,
+                m.mensagem,
+                m.respondida,
+                m.created_at as mensagem_created_at
+            FROM conversas c
+            JOIN mensagens m ON c.id = m.conversa_id
+            WHERE c.email = ?
+        """
+        params = [email]
+
+        # Adiciona filtros dinâmicos
+        if tipo:
+            query += " AND m.tipo = ?"
+            params.append(tipo)
+        if conversa_id:
+            query += " AND c.id = ?"
+            params.append(conversa_id)
+        if anuncio_id:
+            query += " AND c.anuncio_id = ?"
+            params.append(anuncio_id)
+        if respondida is not None:
+            query += " AND m.respondida = ?"
+            params.append(respondida)
+        if searched_info is not None:
+            if searched_info:
+                query += " AND c.searched_info IS NOT NULL"
+            else:
+                query += " AND c.searched_info IS NULL"
+
+        # Ordena por data de criação da mensagem
+        query += " ORDER BY m.created_at ASC"
+
+        return [dict(row) for row in self.conn.execute(query, params).fetchall()]
+
+    def buscar_pendentes(self, email: str) -> List[Dict[str, Any]]:
+        # O resumo filtra as conversas pendentes sem varrer a tabela de mensagens
+        return [dict(row) for row in self.conn.execute(
+            """
+            SELECT r.conversa_id, r.email, r.anuncio_id,
+                   m.id AS mensagem_id, m.tipo, m.mensagem, m.respondida
+            FROM conversa_resumo r
+            JOIN mensagens m ON m.conversa_id = r.conversa_id
+            WHERE r.email = ?
+            AND r.pendente = TRUE
+            AND m.tipo = 'recebida'
+            AND m.respondida = FALSE
+            ORDER BY r.conversa_id, m.id
+            """,
+            (email,),
+        ).fetchall()]
+
+    def buscar_resumos(self, email: str, pendente: bool = None, anuncio_id: str = None) -> List[Dict[str, Any]]:
+        query = """
+            SELECT r.conversa_id, r.email, r.anuncio_id,
+                   c.nome_vendedor, c.titulo_anuncio, c.preco_anuncio,
+                   r.total_recebidas, r.total_enviadas, r.recebidas_pendentes,
+                   r.ultima_recebida, r.ultima_recebida_em,
+                   r.ultima_enviada, r.ultima_enviada_em,
+                   r.pendente, r.updated_at
+            FROM conversa_resumo r
+            JOIN conversas c ON c.id = r.conversa_id
+            WHERE r.email = ?
+        """
+        params = [email]
+        if pendente is not None:
+            query += " AND r.pendente = ?"
+            params.append(pendente)
+        if anuncio_id:
+            query += " AND r.anuncio_id = ?"
+            params.append(anuncio_id)
+        query += " ORDER BY COALESCE(r.ultima_recebida_em, r.updated_at) DESC"
+
+        resumos = []
+        for row in self.conn.execute(query, params).fetchall():
+            resumo = dict(row)
+            resumo["pendente"] = bool(resumo["pendente"])
+            resumos.append(resumo)
+        return resumos
+
+    def enfileirar_job(self, mensagem_id: int, conversa_id: int) -> None:
+        self.conn.execute(
+            "INSERT OR IGNORE INTO reply_jobs (mensagem_id, conversa_id) VALUES (?, ?)",
+            (mensagem_id, conversa_id),
+        )
+
+    def concluir_jobs_conversa(self, conversa_id: int) -> None:
+        self.conn.execute(
+            """
+            UPDATE reply_jobs
+            SET status = 'concluido',
+                lease_expira_em = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE conversa_id = ?
+            AND status != 'concluido'
+            """,
+            (conversa_id,),
+        )
+
+    def reservar_jobs(self, worker_id: str, limite: int, visibilidade: int, email: str = None) -> List[Dict[str, Any]]:
+        query = """
+            SELECT j.id
+            FROM reply_jobs j
+            JOIN conversas c ON c.id = j.conversa_id
+            WHERE ((j.status = 'pendente' AND j.disponivel_em <= CURRENT_TIMESTAMP)
+                OR (j.status = 'reservado' AND j.lease_expira_em <= CURRENT_TIMESTAMP))
+        """
+        params = []
+        if email:
+            query += " AND c.email = ?"
+            params.append(email)
+        query += " ORDER BY j.id LIMIT ?"
+        params.append(limite)
+
+        ids = [row["id"] for row in self.conn.execute(query, params).fetchall()]
+        if not ids:
+            return []
+
+        marcadores = ",".join("?" for _ in ids)
+        self.conn.execute(
+            f"""
+            UPDATE reply_jobs
+            SET status = 'reservado',
+                worker_id = ?,
+                lease_expira_em = datetime('now', ?),
+                tentativas = tentativas + 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id IN ({marcadores})
+            """,
+            [worker_id, f"+{visibilidade} seconds", *ids],
+        )
+
+        return [dict(row) for row in self.conn.execute(
+            f"""
+            SELECT j.id, j.mensagem_id, j.conversa_id, j.tentativas, j.lease_expira_em,
+                   c.email, c.anuncio_id, m.mensagem
+            FROM reply_jobs j
+            JOIN conversas c ON c.id = j.conversa_id
+            JOIN mensagens m ON m.id = j.mensagem_id
+            WHERE j.id IN ({marcadores})
+            ORDER BY j.id
+            """,
+            ids,
+        ).fetchall()]
+
+    def confirmar_job(self, job_id: int, worker_id: str) -> bool:
+        cursor = self.conn.execute(
+            """
+            UPDATE reply_jobs
+            SET status = 'concluido',
+                lease_expira_em = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND worker_id = ? AND status = 'reservado'
+            """,
+            (job_id, worker_id),
+        )
+        if cursor.rowcount > 0:
+            return True
+        return self.conn.execute(
+            "SELECT 1 FROM reply_jobs WHERE id = ? AND worker_id = ? AND status = 'concluido'",
+            (job_id, worker_id),
+        ).fetchone() is not None
+
+    def devolver_job(self, job_id: int, worker_id: str, atraso: int) -> bool:
+        cursor = self.conn.execute(
+            """
+            UPDATE reply_jobs
+            SET status = 'pendente',
+                worker_id = NULL,
+                lease_expira_em = NULL,
+                disponivel_em = datetime('now', ?),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND worker_id = ? AND status = 'reservado'
+            """,
+            (f"+{max(atraso, 0)} seconds", job_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def buscar_idempotencia(self, chave: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        registro = self.conn.execute(
+            "SELECT endpoint, resposta FROM idempotency_keys WHERE chave = ?",
+            (chave,),
+        ).fetchone()
+        if not registro:
+            return None
+        return registro["endpoint"], json.loads(registro["resposta"])
+
+    def guardar_idempotencia(self, chave: str, endpoint: str, resposta: Dict[str, Any], limite: int) -> None:
+        self.conn.execute(
+            "INSERT INTO idempotency_keys (chave, endpoint, resposta) VALUES (?, ?, ?)",
+            (chave, endpoint, json.dumps(resposta, ensure_ascii=False)),
+        )
+        self.conn.execute(
+            """
+            DELETE FROM idempotency_keys
+            WHERE id <= (SELECT id FROM idempotency_keys ORDER BY id DESC LIMIT 1 OFFSET ?)
+            """,
+            (limite,),
+        )
+
+    def buscar_eventos(self, depois_de: int, limite: int, email: str = None) -> List[Dict[str, Any]]:
+        query = "SELECT seq, tipo, email, anuncio_id, conversa_id, dados, created_at FROM eventos WHERE seq > ?"
+        params = [depois_de]
+        if email:
+            query += " AND email = ?"
+            params.append(email)
+        query += " ORDER BY seq LIMIT ?"
+        params.append(limite)
+
+        eventos = []
+        for row in self.conn.execute(query, params).fetchall():
+            evento = dict(row)
+            evento["dados"] = json.loads(evento["dados"]) if evento["dados"] else {}
+            eventos.append(evento)
+        return eventos
+
+
+class SQLiteStorage(Storage):
+    nome = "sqlite"
+
+    def __init__(self, conectar=get_db, pool_tamanho: Optional[int] = None):
+        self.conectar = conectar
+        # Conexões reaproveitadas entre transações; 0 abre e fecha uma por transação
+        if pool_tamanho is None:
+            pool_tamanho = int(os.getenv("DB_POOL_CONEXOES", "4"))
+        self.pool_tamanho = pool_tamanho
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+
+    def inicializar(self) -> None:
+        criar_tabelas()
+
+    def _obter_conexao(self) -> sqlite3.Connection:
+        if self.pool_tamanho <= 0:
+            return self.conectar()
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self.conectar(compartilhada=True)
+
+    def _devolver_conexao(self, conn: sqlite3.Connection, valida: bool = True) -> None:
+        if valida and self._pool.qsize() < self.pool_tamanho:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    @contextmanager
+    def transacao(self, escrita: bool = False) -> Iterator[SQLiteRepositorio]:
+        conn = self._obter_conexao()
+        valida = True
+        try:
+            # BEGIN IMMEDIATE reserva o lock de escrita logo no início, evitando
+            # que duas transações leiam o mesmo estado e depois disputem o commit
+            if escrita:
+                conn.execute("BEGIN IMMEDIATE")
+            yield SQLiteRepositorio(conn)
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                valida = False
+            raise
+        finally:
+            self._devolver_conexao(conn, valida)
+
+
+# ---------------------------------------------------------------------------
+# Memória
+# ---------------------------------------------------------------------------
+
+def _agora(deslocamento: int = 0) -> str:
+    """Timestamp UTC no mesmo formato do CURRENT_TIMESTAMP do SQLite"""
+    return (datetime.utcnow() + timedelta(seconds=deslocamento)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class _EstadoMemoria:
+    """Tabelas e índices do armazenamento em memória"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.conversas: Dict[int, Dict[str, Any]] = {}
+        self.conversa_por_chave: Dict[Tuple[str, str], int] = {}
+        self.conversas_por_email: Dict[str, List[int]] = {}
+        self.mensagens: Dict[int, Dict[str, Any]] = {}
+        self.mensagens_por_conversa: Dict[int, List[int]] = {}
+        self.resumos: Dict[int, Dict[str, Any]] = {}
+        self.jobs: Dict[int, Dict[str, Any]] = {}
+        self.job_por_mensagem: Dict[int, int] = {}
+        self.jobs_abertos: Dict[int, None] = {}
+        self.idempotencia: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.eventos: List[Dict[str, Any]] = []
+        self.sequencias: Dict[str, int] = {}
+
+    def proximo_id(self, tabela: str) -> int:
+        self.sequencias[tabela] = self.sequencias.get(tabela, 0) + 1
+        return self.sequencias[tabela]
+
+
+class MemoriaRepositorio(Repositorio):
+    """Repositório sobre dicionários; cada alteração regista como ser desfeita para o rollback"""
+
+    def __init__(self, estado: _EstadoMemoria):
+        self.estado = estado
+        self.desfazer: List = []
+
+    # Primitivas com registo de undo
+    def _inserir(self, tabela: dict, chave, valor) -> None:
+        tabela[chave] = valor
+        self.desfazer.append(lambda: tabela.pop(chave, None))
+
+    def _remover(self, tabela: dict, chave) -> None:
+        if chave in tabela:
+            valor = tabela.pop(chave)
+            self.desfazer.append(lambda: tabela.__setitem__(chave, valor))
+
+    def _anexar(self, lista: list, valor) -> None:
+        lista.append(valor)
+        self.desfazer.append(lista.pop)
+
+    def _alterar(self, registro: dict, **campos) -> None:
+        anteriores = {campo: registro.get(campo) for campo in campos}
+        registro.update(campos)
+        self.desfazer.append(lambda: registro.update(anteriores))
+
+    def rollback(self) -> None:
+        while self.desfazer:
+            self.desfazer.pop()()
+
+    def _registrar_evento(self, tipo: str, conversa_id: int, dados: Dict[str, Any]) -> None:
+        conversa = self.estado.conversas[conversa_id]
+        self._anexar(self.estado.eventos, {
+            "seq": self.estado.proximo_id("eventos"),
+            "tipo": tipo,
+            "email": conversa["email"],
+            "anuncio_id": conversa["anuncio_id"],
+            "conversa_id": conversa_id,
+            "dados": dados,
+            "created_at": _agora(),
+        })
+
+    def _atualizar_resumo(self, conversa_id: int, incrementos: Dict[str, int], **campos) -> None:
+        """Faz o papel dos triggers de conversa_resumo do SQLite"""
+        resumo = self.estado.resumos[conversa_id]
+        for chave, valor in incrementos.items():
+            campos[chave] = resumo[chave] + valor
+        pendentes = campos.get("recebidas_pendentes", resumo["recebidas_pendentes"])
+        self._alterar(resumo, **campos, pendente=pendentes > 0, updated_at=_agora())
+
+    # Conversas e informações do anúncio
+    def obter_conversa(self, email: str, anuncio_id: str) -> Optional[Dict[str, Any]]:
+        conversa_id = self.estado.conversa_por_chave.get((email, anuncio_id))
+        return dict(self.estado.conversas[conversa_id]) if conversa_id else None
+
+    def criar_conversa(self, email: str, anuncio_id: str) -> Tuple[int, bool]:
+        conversa_id = self.estado.conversa_por_chave.get((email, anuncio_id))
+        if conversa_id:
+            return conversa_id, False
+
+        conversa_id = self.estado.proximo_id("conversas")
+        agora = _agora()
+        self._inserir(self.estado.conversas, conversa_id, {
+            "id": conversa_id,
+            "email": email,
+            "anuncio_id": anuncio_id,
+            "nome_vendedor": None,
+            "titulo_anuncio": None,
+            "preco_anuncio": None,
+            "searched_info": None,
+            "created_at": agora,
+            "updated_at": agora,
+        })
+        self._inserir(self.estado.conversa_por_chave, (email, anuncio_id), conversa_id)
+        self._anexar(self.estado.conversas_por_email.setdefault(email, []), conversa_id)
+        self._inserir(self.estado.mensagens_por_conversa, conversa_id, [])
+        self._inserir(self.estado.resumos, conversa_id, {
+            "conversa_id": conversa_id,
+            "email": email,
+            "anuncio_id": anuncio_id,
+            "total_recebidas": 0,
+            "total_enviadas": 0,
+            "recebidas_pendentes": 0,
+            "ultima_recebida": None,
+            "ultima_recebida_em": None,
+            "ultima_enviada": None,
+            "ultima_enviada_em": None,
+            "pendente": False,
+            "updated_at": agora,
+        })
+        self._registrar_evento("conversa_criada", conversa_id, {})
+        return conversa_id, True
+
+    def tocar_conversa(self, conversa_id: int) -> None:
+        self._alterar(self.estado.conversas[conversa_id], updated_at=_agora())
+
+    def atualizar_info_anuncio(self, conversa_id: int, nome_vendedor: str, titulo_anuncio: str, preco_anuncio: str) -> bool:
+        conversa = self.estado.conversas.get(conversa_id)
+        if not conversa:
+            return False
+        self._alterar(conversa, nome_vendedor=nome_vendedor, titulo_anuncio=titulo_anuncio, preco_anuncio=preco_anuncio)
+        self._registrar_evento("info_anuncio_atualizada", conversa_id, {
+            "nome_vendedor": nome_vendedor,
+            "titulo_anuncio": titulo_anuncio,
+            "preco_anuncio": preco_anuncio,
+        })
+        return True
+
+    def definir_searched_info(self, conversa_id: int, searched_info: str) -> bool:
+        conversa = self.estado.conversas.get(conversa_id)
+        if not conversa:
+            return False
+        self._alterar(conversa, searched_info=searched_info, updated_at=_agora())
+        self._registrar_evento("searched_info_atualizada", conversa_id, {"searched_info": searched_info})
+        return True
+
+    # Mensagens
+    def inserir_mensagem(self, conversa_id: int, tipo: str, mensagem: str) -> int:
+        if tipo not in ("enviada", "recebida"):
+            raise ValueError(f"Tipo de mensagem inválido: {tipo}")
+        mensagem_id = self.estado.proximo_id("mensagens")
+        agora = _agora()
+        self._inserir(self.estado.mensagens, mensagem_id, {
+            "id": mensagem_id,
+            "conversa_id": conversa_id,
+            "tipo": tipo,
+            "mensagem": mensagem,
+            "respondida": False,
+            "created_at": agora,
+        })
+        self._anexar(self.estado.mensagens_por_conversa[conversa_id], mensagem_id)
+
+        if tipo == "recebida":
+            self._atualizar_resumo(conversa_id, {"total_recebidas": 1, "recebidas_pendentes": 1},
+                                   ultima_recebida=mensagem, ultima_recebida_em=agora)
+        else:
+            self._atualizar_resumo(conversa_id, {"total_enviadas": 1},
+                                   ultima_enviada=mensagem, ultima_enviada_em=agora)
+        self._registrar_evento("mensagem_inserida", conversa_id, {
+            "mensagem_id": mensagem_id,
+            "tipo": tipo,
+            "mensagem": mensagem,
+        })
+        return mensagem_id
+
+    def marcar_respondidas(self, conversa_id: int, tipo: str) -> int:
+        alteradas = 0
+        for mensagem_id in self.estado.mensagens_por_conversa.get(conversa_id, []):
+            msg = self.estado.mensagens[mensagem_id]
+            if msg["tipo"] == tipo and not msg["respondida"]:
+                self._alterar(msg, respondida=True)
+                alteradas += 1
+        if alteradas and tipo == "recebida":
+            self._atualizar_resumo(conversa_id, {"recebidas_pendentes": -alteradas})
+        if alteradas:
+            self._registrar_evento("mensagens_respondidas", conversa_id, {"tipo": tipo, "quantidade": alteradas})
+        return alteradas
+
+    def mensagem_existe(self, conversa_id: int, mensagem: str, tipo: str) -> bool:
+        return any(
+            self.estado.mensagens[mensagem_id]["mensagem"] == mensagem
+            and self.estado.mensagens[mensagem_id]["tipo"] == tipo
+            for mensagem_id in self.estado.mensagens_por_conversa.get(conversa_id, [])
+        )
+
+    def buscar_mensagens(self, email: str, tipo: str = None, conversa_id: int = None, anuncio_id: str = None,
+                         respondida: bool = None, searched_info: bool = None) -> List[Dict[str, Any]]:
+        linhas = []
+        for cid in self.estado.conversas_por_email.get(email, []):
+            conversa = self.estado.conversas[cid]
+            if conversa_id and cid != conversa_id:
+                continue
+            if anuncio_id and conversa["anuncio_id"] != anuncio_id:
+                continue
+            if searched_info is not None and (conversa["searched_info"] is not None) != searched_info:
+                continue
+            for mensagem_id in self.estado.mensagens_por_conversa[cid]:
+                msg = self.estado.mensagens[mensagem_id]
+                if tipo and msg["tipo"] != tipo:
+                    continue
+                if respondida is not None and msg["respondida"] != respondida:
+                    continue
+                linhas.append({
+                    "conversa_id": cid,
+                    "email": conversa["email"],
+                    "anuncio_id": conversa["anuncio_id"],
+                    "nome_vendedor": conversa["nome_vendedor"],
+                    "titulo_anuncio": conversa["titulo_anuncio"],
+                    "preco_anuncio": conversa["preco_anuncio"],
+                    "searched_info": conversa["searched_info"],
+                    "conversa_created_at": conversa["created_at"],
+                    "conversa_updated_at": conversa["updated_at"],
+                    "mensagem_id": mensagem_id,
+                    "tipo": msg["tipo"],
+                    "mensagem": msg["mensagem"],
+                    "respondida": msg["respondida"],
+                    "mensagem_created_at": msg["created_at"],
+                })
+        linhas.sort(key=lambda linha: (linha["mensagem_created_at"], linha["mensagem_id"]))
+        return linhas
+
+    def buscar_pendentes(self, email: str) -> List[Dict[str, Any]]:
+        linhas = []
+        for cid in self.estado.conversas_por_email.get(email, []):
+            resumo = self.estado.resumos[cid]
+            if not resumo["pendente"]:
+                continue
+            for mensagem_id in self.estado.mensagens_por_conversa[cid]:
+                msg = self.estado.mensagens[mensagem_id]
+                if msg["tipo"] == "recebida" and not msg["respondida"]:
+                    linhas.append({
+                        "conversa_id": cid,
+                        "email": resumo["email"],
+                        "anuncio_id": resumo["anuncio_id"],
+                        "mensagem_id": mensagem_id,
+                        "tipo": msg["tipo"],
+                        "mensagem": msg["mensagem"],
+                        "respondida": msg["respondida"],
+                    })
+        return linhas
+
+    def buscar_resumos(self, email: str, pendente: bool = None, anuncio_id: str = None) -> List[Dict[str, Any]]:
+        resumos = []
+        for cid in self.estado.conversas_por_email.get(email, []):
+            resumo = self.estado.resumos[cid]
+            if pendente is not None and resumo["pendente"] != pendente:
+                continue
+            if anuncio_id and resumo["anuncio_id"] != anuncio_id:
+                continue
+            conversa = self.estado.conversas[cid]
+            resumos.append({
+                **resumo,
+                "nome_vendedor": conversa["nome_vendedor"],
+                "titulo_anuncio": conversa["titulo_anuncio"],
+                "preco_anuncio": conversa["preco_anuncio"],
+            })
+        resumos.sort(key=lambda r: r["ultima_recebida_em"] or r["updated_at"], reverse=True)
+        return resumos
+
+    # Fila de respostas
+    def enfileirar_job(self, mensagem_id: int, conversa_id: int) -> None:
+        if mensagem_id in self.estado.job_por_mensagem:
+            return
+        job_id = self.estado.proximo_id("reply_jobs")
+        agora = _agora()
+        self._inserir(self.estado.jobs, job_id, {
+            "id": job_id,
+            "mensagem_id": mensagem_id,
+            "conversa_id": conversa_id,
+            "status": "pendente",
+            "worker_id": None,
+            "lease_expira_em": None,
+            "disponivel_em": agora,
+            "tentativas": 0,
+            "created_at": agora,
+            "updated_at": agora,
+        })
+        self._inserir(self.estado.job_por_mensagem, mensagem_id, job_id)
+        self._inserir(self.estado.jobs_abertos, job_id, None)
+
+    def concluir_jobs_conversa(self, conversa_id: int) -> None:
+        for job_id in list(self.estado.jobs_abertos):
+            job = self.estado.jobs[job_id]
+            if job["conversa_id"] == conversa_id:
+                self._alterar(job, status="concluido", lease_expira_em=None, updated_at=_agora())
+                self._remover(self.estado.jobs_abertos, job_id)
+
+    def reservar_jobs(self, worker_id: str, limite: int, visibilidade: int, email: str = None) -> List[Dict[str, Any]]:
+        agora = _agora()
+        reservados = []
+        for job_id in sorted(self.estado.jobs_abertos):
+            if len(reservados) >= limite:
+                break
+            job = self.estado.jobs[job_id]
+            disponivel = (
+                (job["status"] == "pendente" and job["disponivel_em"] <= agora)
+                or (job["status"] == "reservado" and job["lease_expira_em"] <= agora)
+            )
+            conversa = self.estado.conversas[job["conversa_id"]]
+            if not disponivel or (email and conversa["email"] != email):
+                continue
+            self._alterar(job, status="reservado", worker_id=worker_id, lease_expira_em=_agora(visibilidade),
+                          tentativas=job["tentativas"] + 1, updated_at=agora)
+            reservados.append({
+                "id": job_id,
+                "mensagem_id": job["mensagem_id"],
+                "conversa_id": job["conversa_id"],
+                "tentativas": job["tentativas"],
+                "lease_expira_em": job["lease_expira_em"],
+                "email": conversa["email"],
+                "anuncio_id": conversa["anuncio_id"],
+                "mensagem": self.estado.mensagens[job["mensagem_id"]]["mensagem"],
+            })
+        return reservados
+
+    def _job_reservado_por(self, job_id: int, worker_id: str) -> Optional[Dict[str, Any]]:
+        job = self.estado.jobs.get(job_id)
+        if job and job["status"] == "reservado" and job["worker_id"] == worker_id:
+            return job
+        return None
+
+    def confirmar_job(self, job_id: int, worker_id: str) -> bool:
+        job = self._job_reservado_por(job_id, worker_id)
+        if not job:
+            concluido = self.estado.jobs.get(job_id)
+            return bool(concluido and concluido["status"] == "concluido" and concluido["worker_id"] == worker_id)
+        self._alterar(job, status="concluido", lease_expira_em=None, updated_at=_agora())
+        self._remover(self.estado.jobs_abertos, job_id)
+        return True
+
+    def devolver_job(self, job_id: int, worker_id: str, atraso: int) -> bool:
+        job = self._job_reservado_por(job_id, worker_id)
+        if not job:
+            return False
+        self._alterar(job, status="pendente", worker_id=None, lease_expira_em=None,
+                      disponivel_em=_agora(max(atraso, 0)), updated_at=_agora())
+        return True
+
+    # Idempotência
+    def buscar_idempotencia(self, chave: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        return self.estado.idempotencia.get(chave)
+
+    def guardar_idempotencia(self, chave: str, endpoint: str, resposta: Dict[str, Any], limite: int) -> None:
+        self._inserir(self.estado.idempotencia, chave, (endpoint, json.loads(json.dumps(resposta))))
+        # Dicionários preservam a ordem de inserção: as primeiras chaves são as mais antigas
+        while len(self.estado.idempotencia) > limite:
+            self._remover(self.estado.idempotencia, next(iter(self.estado.idempotencia)))
+
+    def buscar_eventos(self, depois_de: int, limite: int, email: str = None) -> List[Dict[str, Any]]:
+        # A lista está ordenada por seq: a busca binária encontra o ponto de partida
+        inicio = bisect.bisect_right(self.estado.eventos, depois_de, key=lambda evento: evento["seq"])
+        eventos = []
+        for evento in self.estado.eventos[inicio:]:
+            if len(eventos) >= limite:
+                break
+            if email and evento["email"] != email:
+                continue
+            eventos.append(dict(evento))
+        return eventos
+
+
+class MemoriaStorage(Storage):
+    """Armazenamento volátil para testes e benchmarks; transações são serializadas por um lock"""
+
+    nome = "memoria"
+
+    def __init__(self):
+        self.estado = _EstadoMemoria()
+
+    def inicializar(self) -> None:
+        pass
+
+    @contextmanager
+    def transacao(self, escrita: bool = False) -> Iterator[MemoriaRepositorio]:
+        with self.estado.lock:
+            repositorio = MemoriaRepositorio(self.estado)
+            try:
+                yield repositorio
+            except BaseException:
+                repositorio.rollback()
+                raise
+
+
+# ---------------------------------------------------------------------------
+# Seleção do backend
+# ---------------------------------------------------------------------------
+
+BACKENDS = {
+    SQLiteStorage.nome: SQLiteStorage,
+    MemoriaStorage.nome: MemoriaStorage,
+}
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Retorna o backend configurado em DB_BACKEND (sqlite por padrão)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                nome = os.getenv("DB_BACKEND", SQLiteStorage.nome)
+                if nome not in BACKENDS:
+                    raise ValueError(f"DB_BACKEND inválido: {nome}. Opções: {', '.join(BACKENDS)}")
+                logger.info(f"Usando armazenamento '{nome}'")
+                _storage = BACKENDS[nome]()
+    return _storage
@@ -1,9 +1,51 @@
+import os
+import socket
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool
+from urllib3.connection import HTTPConnection
 from langflow.custom import Component
 from langflow.io import MessageTextInput, Output
 from langflow.schema import Data
 
+# O Langflow carrega este arquivo sozinho, então o adapter de socket Unix fica aqui
+class _ConexaoUnix(HTTPConnection):
+    def __init__(self, *args, caminho_uds, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.caminho_uds = caminho_uds
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        sock.connect(self.caminho_uds)
+        return sock
+
+class _PoolUnix(HTTPConnectionPool):
+    ConnectionCls = _ConexaoUnix
+
+class _UnixSocketAdapter(HTTPAdapter):
+    def __init__(self, caminho_uds):
+        self.caminho_uds = caminho_uds
+        self.pools = {}
+        super().__init__(max_retries=0)
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self.get_connection(request.url)
+
+    def get_connection(self, url, proxies=None):
+        partes = requests.utils.urlparse(url)
+        chave = (partes.hostname, partes.port)
+        if chave not in self.pools:
+            self.pools[chave] = _PoolUnix(partes.hostname, partes.port, caminho_uds=self.caminho_uds)
+        return self.pools[chave]
+
+    def close(self):
+        super().close()
+        for pool in self.pools.values():
+            pool.close()
+
 class FastAPIClient(Component):
     display_name = "FastAPI Client"
     description = "Componente para acessar APIs do FastAPI e interagir com a DB"
@@ -80,6 +122,20 @@ class FastAPIClient(Component):
             value="",
             tool_mode=True
         ),
+        MessageTextInput(
+            name="base_url",
+            display_name="URL da API",
+            info="URL base da API FastAPI",
+            value="http://localhost:8000",
+            advanced=True
+        ),
+        MessageTextInput(
+            name="uds_path",
+            display_name="Socket Unix da API",
+            info="Caminho do socket Unix da API (opcional; usa API_UDS se vazio). Quando definido, as requisições não passam por TCP",
+            value="",
+            advanced=True
+        ),
         MessageTextInput(
             name="searched_info_filter",
             display_name="Filtrar por Informações",
@@ -100,7 +156,8 @@ class FastAPIClient(Component):
     def process_inputs(self) -> Data:
         try:
             # Configuração base
-            base_url = "http://localhost:8000"
+            base_url = (self.base_url or "http://localhost:8000").rstrip("/")
+            uds_path = self.uds_path or os.getenv("API_UDS", "")
             headers = {"Content-Type": "application/json"}
 
             # Validação da ação
@@ -188,10 +245,13 @@ class FastAPIClient(Component):
             if data:
                 print(f"Dados: {data}")
 
-            if method == "GET":
-                response = requests.get(url, params=params, headers=headers)
-            else:
-                response = requests.post(url, params=params, json=data, headers=headers)
+            with requests.Session() as session:
+                if uds_path:
+                    session.mount(f"{base_url}/", _UnixSocketAdapter(uds_path))
+                if method == "GET":
+                    response = session.get(url, params=params, headers=headers)
+                else:
+                    response = session.post(url, params=params, json=data, headers=headers)
 
             # Log da resposta para debug
             print(f"Status code: {response.status_code}")
@@ -1,189 +1,423 @@
+import hashlib
 import logging
 import requests
-import time
+import uuid
 from typing import Dict, Any, Optional
 
 from config import CREDENTIALS
+from .transport import HTTPTransport
+from .resilience import RetryPolicy, FalhaTransitoria, circuitos, criar_politica
+from .bloom import FiltroMensagens
 
 logger = logging.getLogger(__name__)
 
+def chave_mensagem(anuncio_id: str, tipo: str, texto: str, posicao: int) -> str:
+    """Idempotency-Key da mensagem: a mesma mensagem na mesma posição do chat gera sempre a mesma chave"""
+    bruto = "\x1f".join([CREDENTIALS["username"], anuncio_id, tipo, str(posicao), texto])
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
 class APIManager:
-    def __init__(self, api_url: str):
+    def __init__(self, api_url: str, transport: Optional[HTTPTransport] = None, filtro: Optional[FiltroMensagens] = None):
         self.api_url = api_url
+        self.transport = transport or HTTPTransport()
+        # Mensagens já gravadas, por anúncio: evita perguntar à API sobre cada uma
+        self.filtro = filtro
+        self.politica = criar_politica("api")
+        # Reservar jobs não é repetido: uma resposta perdida deixaria jobs presos até o lease expirar
+        self.politica_sem_repeticao = RetryPolicy(max_tentativas=1)
         logger.info(f"API URL configurada: {self.api_url}")
 
+    def _requisitar(self, metodo: str, endpoint: str, descricao: str, caminho: Optional[str] = None,
+                    politica: Optional[RetryPolicy] = None, **kwargs) -> requests.Response:
+        """Faz a requisição com a política de novas tentativas e o circuito do endpoint.
+
+        Status 429 e 5xx são repetidos; as demais respostas são devolvidas para o
+        chamador interpretar. Levanta CircuitOpenError ou TentativasEsgotadas.
+        """
+        url = f"{self.api_url}{caminho or endpoint}"
+
+        def tentar(timeout):
+            response = self.transport.request(metodo, url, timeout=timeout, **kwargs)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise FalhaTransitoria(f"status {response.status_code}: {response.text}")
+            return response
+
+        return (politica or self.politica).executar(
+            tentar, descricao, circuitos.obter(f"{self.api_url}{endpoint}"), timeout=10
+        )
+
     def verificar_mensagem_existe(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
         """Verifica se uma mensagem já existe na DB antes de enviá-la para a API"""
-        max_tentativas = 3
-        for tentativa in range(max_tentativas):
-            try:
-                response = requests.get(
-                    f"{self.api_url}/mensagem-existe",
-                    params={
-                        "email": CREDENTIALS["username"],
-                        "anuncio_id": anuncio_id,
-                        "mensagem": mensagem,
-                        "tipo": tipo
-                    },
-                    timeout=10
-                )
-                if response.status_code == 200:
-                    return response.json().get("existe", False)
-                elif response.status_code == 404:
-                    logger.warning("Endpoint de verificação de mensagem não encontrado")
-                    return False
-                else:
-                    logger.error(f"Erro ao verificar mensagem na API: {response.text}")
-                    if tentativa < max_tentativas - 1:
-                        time.sleep(2)
-            except requests.exceptions.Timeout:
-                logger.error(f"Timeout ao verificar mensagem (tentativa {tentativa + 1})")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-            except requests.exceptions.ConnectionError:
-                logger.error(f"Erro de conexão ao verificar mensagem (tentativa {tentativa + 1})")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-            except Exception as e:
-                logger.error(f"Tentativa {tentativa + 1} falhou: {e}")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-        return False
+        if self.filtro is None:
+            return self._consultar_mensagem_existe(anuncio_id, mensagem, tipo)
+        if self._mensagem_conhecida(anuncio_id, mensagem, tipo):
+            return True
+
+        # Ausente no filtro (ou falso positivo): pode ter sido gravada por outro processo
+        existe = self._consultar_mensagem_existe(anuncio_id, mensagem, tipo)
+        if existe:
+            self.filtro.adicionar(anuncio_id, tipo, mensagem)
+        return existe
+
+    def _mensagem_conhecida(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
+        """True se o filtro garante que a mensagem já está gravada; acertos sorteados
+        para auditoria são conferidos em /mensagem-existe
+        """
+        if self.filtro is None:
+            return False
+        estado = self.filtro.avaliar(anuncio_id, tipo, mensagem)
+        if estado != "auditar":
+            return estado == "conhecida"
+        existe = self._consultar_mensagem_existe(anuncio_id, mensagem, tipo)
+        self.filtro.concluir_auditoria(anuncio_id, tipo, mensagem, existe)
+        return existe
+
+    def _consultar_mensagem_existe(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
+        """Pergunta à API se a mensagem existe"""
+        try:
+            response = self._requisitar(
+                "GET", "/mensagem-existe", "verificar mensagem",
+                params={
+                    "email": CREDENTIALS["username"],
+                    "anuncio_id": anuncio_id,
+                    "mensagem": mensagem,
+                    "tipo": tipo
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erro ao verificar mensagem na API: {e}")
+            return False
+        if response.status_code == 200:
+            return response.json().get("existe", False)
+        elif response.status_code == 404:
+            logger.warning("Endpoint de verificação de mensagem não encontrado")
+            return False
+        else:
+            logger.error(f"Erro ao verificar mensagem na API: {response.text}")
+            return False
 
     def enviar_mensagem_para_api(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
         """Envia uma mensagem extraída pelo scraper para a API FastAPI"""
-        max_tentativas = 3
-        for tentativa in range(max_tentativas):
-            try:
-                payload = {"mensagem": mensagem}
-                response = requests.post(
-                    f"{self.api_url}/receber-mensagem",
-                    json=payload,
-                    params={
-                        "email": CREDENTIALS["username"],
-                        "anuncio_id": anuncio_id,
-                        "tipo": tipo
-                    },
-                    timeout=10
-                )
-                if response.status_code == 200:
-                    logger.info(f"Mensagem {tipo} registrada na API: {mensagem}")
-                    return True
-                elif response.status_code == 404:
-                    logger.warning("Endpoint de envio de mensagem não encontrado")
-                    return False
-                else:
-                    logger.error(f"Erro ao registrar mensagem na API: {response.text}")
-                    if tentativa < max_tentativas - 1:
-                        time.sleep(2)
-            except requests.exceptions.Timeout:
-                logger.error(f"Timeout ao enviar mensagem (tentativa {tentativa + 1})")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-            except requests.exceptions.ConnectionError:
-                logger.error(f"Erro de conexão ao enviar mensagem (tentativa {tentativa + 1})")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-            except Exception as e:
-                logger.error(f"Tentativa {tentativa + 1} falhou: {e}")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-        return False
+        # A mesma chave em todas as tentativas evita gravar a mensagem duas vezes
+        # quando um timeout acontece depois de a API já ter feito o commit
+        return self._gravar_mensagem(anuncio_id, mensagem, tipo, str(uuid.uuid4())) is not None
+
+    def _gravar_mensagem(self, anuncio_id: str, mensagem: str, tipo: str, chave_idempotencia: str) -> Optional[bool]:
+        """Grava a mensagem com a chave dada; True se foi inserida, False se a API já tinha, None se falhou"""
+        try:
+            response = self._requisitar(
+                "POST", "/receber-mensagem", "enviar mensagem",
+                json={"mensagem": mensagem},
+                params={
+                    "email": CREDENTIALS["username"],
+                    "anuncio_id": anuncio_id,
+                    "tipo": tipo
+                },
+                headers={"Idempotency-Key": chave_idempotencia}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagem para a API: {e}")
+            return None
+        if response.status_code == 200:
+            inserida = response.json().get("inserida", True)
+            if inserida:
+                logger.info(f"Mensagem {tipo} registrada na API: {mensagem}")
+            if self.filtro is not None:
+                self.filtro.adicionar(anuncio_id, tipo, mensagem)
+            return inserida
+        elif response.status_code == 404:
+            logger.warning("Endpoint de envio de mensagem não encontrado")
+            return None
+        else:
+            logger.error(f"Erro ao registrar mensagem na API: {response.text}")
+            return None
 
     def buscar_respostas_pendentes(self):
         """ Busca conversas com mensagens recebidas não respondidas na API """
         try:
-            response = requests.get(
-                f"{self.api_url}/conversas/pendentes",
-                params={"email": CREDENTIALS["username"]},
-                timeout=10
+            response = self._requisitar(
+                "GET", "/conversas/pendentes", "buscar conversas pendentes",
+                params={"email": CREDENTIALS["username"]}
             )
-            if response.status_code == 200:
-                return response.json().get("conversas_pendentes", [])
-            elif response.status_code == 404:
-                logger.warning("Endpoint de conversas pendentes não encontrado")
-                return []
-            else:
-                logger.error(f"Erro ao buscar conversas pendentes: {response.text}")
-                return []
-        except requests.exceptions.Timeout:
-            logger.error("Timeout ao buscar conversas pendentes")
-            return []
-        except requests.exceptions.ConnectionError:
-            logger.error("Erro de conexão ao buscar conversas pendentes")
-            return []
         except Exception as e:
             logger.error(f"Erro ao buscar conversas pendentes: {e}")
             return []
+        if response.status_code == 200:
+            return response.json().get("conversas_pendentes", [])
+        elif response.status_code == 404:
+            logger.warning("Endpoint de conversas pendentes não encontrado")
+            return []
+        else:
+            logger.error(f"Erro ao buscar conversas pendentes: {response.text}")
+            return []
+
+    def criar_conversa(self, anuncio_id: str) -> bool:
+        """Cria a conversa do anúncio na API (não faz nada se ela já existir)"""
+        try:
+            response = self._requisitar(
+                "POST", "/criar-conversa", "criar conversa",
+                params={
+                    "email": CREDENTIALS["username"],
+                    "anuncio_id": anuncio_id
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erro ao criar conversa na API: {e}")
+            return False
+        if response.status_code == 200:
+            return True
+        else:
+            logger.error(f"Erro ao criar conversa: {response.text}")
+            return False
 
     def enviar_info_anuncio_para_api(self, anuncio_id: str, nome_vendedor: str, titulo_anuncio: str, preco_anuncio: str) -> bool:
         """Envia informações do anúncio para a API"""
         try:
-            response = requests.post(
-                f"{self.api_url}/atualizar-info-anuncio",
+            response = self._requisitar(
+                "POST", "/atualizar-info-anuncio", "atualizar informações do anúncio",
                 params={
                     "email": CREDENTIALS["username"],
                     "anuncio_id": anuncio_id,
                     "nome_vendedor": nome_vendedor,
                     "titulo_anuncio": titulo_anuncio,
                     "preco_anuncio": preco_anuncio
-                },
-                timeout=10
+                }
             )
-            if response.status_code == 200:
-                logger.info(f"Informações do anúncio {anuncio_id} atualizadas com sucesso")
-                return True
-            else:
-                logger.error(f"Erro ao atualizar informações do anúncio: {response.text}")
-                return False
         except Exception as e:
             logger.error(f"Erro ao enviar informações do anúncio para a API: {e}")
             return False
+        if response.status_code == 200:
+            logger.info(f"Informações do anúncio {anuncio_id} atualizadas com sucesso")
+            return True
+        else:
+            logger.error(f"Erro ao atualizar informações do anúncio: {response.text}")
+            return False
 
     def atualizar_searched_info(self, anuncio_id: str, searched_info: str) -> bool:
         """Atualiza o campo searched_info do anúncio na API"""
         try:
-            response = requests.post(
-                f"{self.api_url}/atualizar-searched-info",
+            response = self._requisitar(
+                "POST", "/atualizar-searched-info", "atualizar searched_info",
                 params={
                     "email": CREDENTIALS["username"],
                     "anuncio_id": anuncio_id,
                     "searched_info": searched_info
-                },
-                timeout=10
+                }
             )
-            if response.status_code == 200:
-                logger.info(f"Campo searched_info do anúncio {anuncio_id} atualizado com sucesso")
-                return True
-            elif response.status_code == 404:
-                logger.warning(f"Conversa não encontrada para o anúncio {anuncio_id}")
-                return False
-            else:
-                logger.error(f"Erro ao atualizar searched_info do anúncio: {response.text}")
-                return False
         except Exception as e:
             logger.error(f"Erro ao enviar searched_info para a API: {e}")
             return False
+        if response.status_code == 200:
+            logger.info(f"Campo searched_info do anúncio {anuncio_id} atualizado com sucesso")
+            return True
+        elif response.status_code == 404:
+            logger.warning(f"Conversa não encontrada para o anúncio {anuncio_id}")
+            return False
+        else:
+            logger.error(f"Erro ao atualizar searched_info do anúncio: {response.text}")
+            return False
 
     def buscar_info_anuncio(self, anuncio_id: str) -> Optional[Dict[str, Any]]:
         """Busca informações do anúncio na API"""
         try:
-            response = requests.get(
-                f"{self.api_url}/info-anuncio",
+            response = self._requisitar(
+                "GET", "/info-anuncio", "buscar informações do anúncio",
                 params={
                     "email": CREDENTIALS["username"],
                     "anuncio_id": anuncio_id
-                },
-                timeout=10
+                }
             )
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                logger.warning(f"Informações do anúncio {anuncio_id} não encontradas")
-                return None
-            else:
-                logger.error(f"Erro ao buscar informações do anúncio: {response.text}")
-                return None
         except Exception as e:
             logger.error(f"Erro ao buscar informações do anúncio na API: {e}")
-            return None 
\ No newline at end of file
+            return None
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 404:
+            logger.warning(f"Informações do anúncio {anuncio_id} não encontradas")
+            return None
+        else:
+            logger.error(f"Erro ao buscar informações do anúncio: {response.text}")
+            return None
+
+    def sincronizar_aba(self, dados: Dict[str, Any]) -> None:
+        """Registra na API a conversa, as informações do anúncio e as mensagens extraídas de uma aba"""
+        anuncio_id = dados["anuncio_id"]
+
+        # Criar a conversa primeiro
+        if not self.criar_conversa(anuncio_id):
+            return
+
+        self.enviar_info_anuncio_para_api(
+            anuncio_id=anuncio_id,
+            nome_vendedor=dados["nome_vendedor"],
+            titulo_anuncio=dados["titulo_anuncio"],
+            preco_anuncio=dados["preco_anuncio"]
+        )
+
+        mensagens = dados["mensagens"]
+        if not mensagens:
+            logger.info(f"Nenhuma mensagem encontrada para o anúncio {anuncio_id}")
+            return
+
+        # As mensagens de um anúncio são enviadas em ordem: a API usa a ordem de
+        # chegada para marcar quais recebidas já foram respondidas. Cada uma vai
+        # direto com uma chave determinística; a API ignora as que já tem, então
+        # não há consulta prévia de existência (só a auditoria sorteada do filtro)
+        logger.info(f"Processando {len(mensagens)} mensagens para o anúncio {anuncio_id}")
+        for posicao, msg in enumerate(mensagens):
+            try:
+                texto = msg['texto']
+                tipo = msg['tipo']
+
+                if self._mensagem_conhecida(anuncio_id, texto, tipo):
+                    logger.info(f"Mensagem já registrada na API: {texto}")
+                    continue
+
+                inserida = self._gravar_mensagem(anuncio_id, texto, tipo, chave_mensagem(anuncio_id, tipo, texto, posicao))
+                if inserida is None:
+                    logger.error(f"Falha ao registrar mensagem {tipo}: {texto}")
+                    continue
+                if inserida:
+                    logger.info(f"Mensagem {tipo} registrada com sucesso: {texto}")
+                else:
+                    logger.info(f"Mensagem já registrada na API: {texto}")
+            except Exception as e:
+                logger.error(f"Erro ao processar mensagem: {e}")
+
+    def sincronizar_lote(self, itens: list) -> Optional[list]:
+        """Envia um lote de abas do outbox; retorna o resultado por item ou None se o lote falhou"""
+        try:
+            response = self._requisitar(
+                "POST", "/sincronizar-lote", f"sincronizar lote de {len(itens)} itens",
+                json={"itens": itens},
+                params={"email": CREDENTIALS["username"]}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar lote na API: {e}")
+            return None
+        if response.status_code != 200:
+            logger.error(f"Erro ao sincronizar lote: {response.text}")
+            return None
+
+        resultados = response.json().get("resultados", [])
+        if self.filtro is not None:
+            # Depois de um item confirmado, todas as mensagens dele estão gravadas
+            confirmados = {r.get("chave") for r in resultados if r.get("status") == "ok"}
+            for item in itens:
+                if item["chave"] in confirmados:
+                    for msg in item["mensagens"]:
+                        self.filtro.adicionar(item["anuncio_id"], msg["tipo"], msg["texto"])
+        return resultados
+
+    def buscar_mensagens(self, anuncio_id: Optional[str] = None) -> list:
+        """Busca as conversas do usuário com todas as mensagens"""
+        params = {"email": CREDENTIALS["username"]}
+        if anuncio_id:
+            params["anuncio_id"] = anuncio_id
+        try:
+            response = self._requisitar("GET", "/mensagens", "buscar mensagens", params=params)
+        except Exception as e:
+            logger.error(f"Erro ao buscar mensagens na API: {e}")
+            return []
+        if response.status_code == 200:
+            return response.json().get("conversas", [])
+        else:
+            logger.error(f"Erro ao buscar mensagens: {response.text}")
+            return []
+
+    def carregar_filtro_mensagens(self) -> None:
+        """Prepara o filtro de mensagens: do disco (retomando o feed de eventos) ou do zero pela API"""
+        if self.filtro is None:
+            return
+        if not self.filtro.carregar():
+            logger.info("Populando o filtro de mensagens a partir da API...")
+            for conversa in self.buscar_mensagens():
+                for msg in conversa["mensagens"]:
+                    self.filtro.adicionar(conversa["anuncio_id"], msg["tipo"], msg["mensagem"])
+
+        # Incorpora o que foi gravado desde o último seq conhecido
+        while True:
+            lote = self.buscar_eventos(after=self.filtro.ultimo_seq, limite=1000)
+            self.filtro.incorporar_eventos(lote["eventos"], lote["ultimo_seq"])
+            if len(lote["eventos"]) < 1000:
+                break
+
+        self.filtro.salvar()
+        estatisticas = self.filtro.estatisticas()
+        logger.info(f"Filtro de mensagens pronto: {estatisticas['mensagens']} mensagens em {estatisticas['anuncios']} anúncios")
+
+    def reservar_jobs(self, worker_id: str, limite: int, visibilidade: int) -> list:
+        """Reserva jobs de resposta pendentes para este worker"""
+        try:
+            response = self._requisitar(
+                "POST", "/jobs/claim", "reservar jobs",
+                politica=self.politica_sem_repeticao,
+                params={
+                    "email": CREDENTIALS["username"],
+                    "worker_id": worker_id,
+                    "limite": limite,
+                    "visibilidade": visibilidade
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erro ao reservar jobs na API: {e}")
+            return []
+        if response.status_code == 200:
+            return response.json().get("jobs", [])
+        else:
+            logger.error(f"Erro ao reservar jobs: {response.text}")
+            return []
+
+    def confirmar_job(self, job_id: int, worker_id: str) -> bool:
+        """Marca um job reservado como concluído"""
+        try:
+            response = self._requisitar(
+                "POST", "/jobs/ack", f"confirmar job {job_id}",
+                caminho=f"/jobs/{job_id}/ack",
+                params={"worker_id": worker_id}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao confirmar job {job_id} na API: {e}")
+            return False
+        if response.status_code == 200:
+            return True
+        else:
+            logger.error(f"Erro ao confirmar job {job_id}: {response.text}")
+            return False
+
+    def devolver_job(self, job_id: int, worker_id: str, atraso: int = 0) -> bool:
+        """Devolve um job reservado à fila para ser processado novamente"""
+        try:
+            response = self._requisitar(
+                "POST", "/jobs/nack", f"devolver job {job_id}",
+                caminho=f"/jobs/{job_id}/nack",
+                params={"worker_id": worker_id, "atraso": atraso}
+            )
+        except Exception as e:
+            logger.error(f"Erro ao devolver job {job_id} na API: {e}")
+            return False
+        if response.status_code == 200:
+            return True
+        else:
+            logger.error(f"Erro ao devolver job {job_id}: {response.text}")
+            return False
+
+    def buscar_eventos(self, after: int = 0, limite: int = 100) -> Dict[str, Any]:
+        """Busca os eventos posteriores a `after`; retorna os eventos e o último seq lido"""
+        try:
+            response = self._requisitar(
+                "GET", "/eventos", "buscar eventos",
+                params={
+                    "email": CREDENTIALS["username"],
+                    "after": after,
+                    "limite": limite
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erro ao buscar eventos na API: {e}")
+            return {"eventos": [], "ultimo_seq": after}
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.error(f"Erro ao buscar eventos: {response.text}")
+            return {"eventos": [], "ultimo_seq": after}
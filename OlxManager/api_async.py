@@ -0,0 +1,372 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import uuid
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import httpx
+
+from config import CREDENTIALS
+from .resilience import RetryPolicy, FalhaTransitoria, circuitos, criar_politica
+from .api import chave_mensagem
+from .bloom import FiltroMensagens
+from .deadline import limitar_timeout
+
+logger = logging.getLogger(__name__)
+
+class LoopAssincrono:
+    """Event loop rodando em uma thread própria.
+
+    Permite que o código síncrono (thread do navegador) submeta corrotinas do
+    AsyncAPIManager e continue trabalhando enquanto as requisições acontecem.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._executar, name="api-async", daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submeter(self, coro: Awaitable) -> Future:
+        """Agenda a corrotina no loop e retorna um Future sem bloquear.
+
+        A corrotina roda com as variáveis de contexto de quem submeteu, então o
+        orçamento de tempo atual vale também para as chamadas feitas no loop.
+        """
+        return asyncio.run_coroutine_threadsafe(self._no_contexto(coro, contextvars.copy_context()), self.loop)
+
+    @staticmethod
+    async def _no_contexto(coro: Awaitable, contexto: contextvars.Context) -> Any:
+        # Cada task tem sua própria cópia de contexto; basta repor nela os valores do chamador
+        for variavel, valor in contexto.items():
+            variavel.set(valor)
+        return await coro
+
+    def executar(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Agenda a corrotina e espera o resultado"""
+        return self.submeter(coro).result(timeout)
+
+    def parar(self):
+        """Encerra o loop e aguarda a thread terminar"""
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self.loop.close()
+
+
+class AsyncAPIManager:
+    """Versão asyncio do APIManager, com os mesmos métodos e um cliente HTTP com pool.
+
+    O cliente httpx é criado na primeira chamada, dentro do loop que vai usá-lo.
+    """
+
+    def __init__(self, api_url: str, max_conexoes: int = 16, max_keepalive: int = 16, max_concorrencia: int = 10, uds: Optional[str] = None,
+                 filtro: Optional[FiltroMensagens] = None):
+        self.api_url = api_url
+        # O mesmo filtro de mensagens do APIManager síncrono (é thread-safe)
+        self.filtro = filtro
+        self.uds = uds
+        self.max_conexoes = max_conexoes
+        self.max_keepalive = max_keepalive
+        self.max_concorrencia = max_concorrencia
+        self._client: Optional[httpx.AsyncClient] = None
+        self.politica = criar_politica("api")
+        self.politica_sem_repeticao = RetryPolicy(max_tentativas=1)
+        # Serializa a sincronização de um mesmo anúncio entre ciclos
+        self._locks_anuncio: Dict[str, asyncio.Lock] = {}
+        logger.info(f"API assíncrona configurada: {self.api_url} (conexões: {max_conexoes}, concorrência: {max_concorrencia})")
+
+    def _cliente(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limites = httpx.Limits(
+                max_connections=self.max_conexoes,
+                max_keepalive_connections=self.max_keepalive
+            )
+            self._client = httpx.AsyncClient(
+                base_url=self.api_url,
+                limits=limites,
+                # Com uds as conexões vão pelo socket Unix; o Host continua o de api_url
+                transport=httpx.AsyncHTTPTransport(uds=self.uds, limits=limites) if self.uds else None,
+                timeout=10
+            )
+        return self._client
+
+    async def _requisitar(self, metodo: str, endpoint: str, descricao: str, caminho: Optional[str] = None,
+                          politica: Optional[RetryPolicy] = None, **kwargs) -> Optional[httpx.Response]:
+        """Executa a requisição com a política de novas tentativas; retorna a resposta 200/404 ou None.
+
+        Usa os mesmos circuitos do APIManager síncrono, então um endpoint fora do ar
+        falha rápido nos dois.
+        """
+        async def tentar(timeout):
+            timeout = limitar_timeout(timeout, f"{metodo} {caminho or endpoint}")
+            response = await self._cliente().request(metodo, caminho or endpoint, timeout=timeout, **kwargs)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise FalhaTransitoria(f"status {response.status_code}: {response.text}")
+            return response
+
+        try:
+            response = await (politica or self.politica).executar_async(
+                tentar, descricao, circuitos.obter(f"{self.api_url}{endpoint}"), timeout=10
+            )
+        except Exception as e:
+            logger.error(f"Erro ao {descricao}: {e}")
+            return None
+        if response.status_code in (200, 404):
+            return response
+        logger.error(f"Erro ao {descricao}: {response.text}")
+        return None
+
+    async def verificar_mensagem_existe(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
+        """Verifica se uma mensagem já existe na DB antes de enviá-la para a API"""
+        if self.filtro is None:
+            return await self._consultar_mensagem_existe(anuncio_id, mensagem, tipo)
+        if await self._mensagem_conhecida(anuncio_id, mensagem, tipo):
+            return True
+
+        existe = await self._consultar_mensagem_existe(anuncio_id, mensagem, tipo)
+        if existe:
+            self.filtro.adicionar(anuncio_id, tipo, mensagem)
+        return existe
+
+    async def _mensagem_conhecida(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
+        """Versão asyncio de APIManager._mensagem_conhecida"""
+        if self.filtro is None:
+            return False
+        estado = self.filtro.avaliar(anuncio_id, tipo, mensagem)
+        if estado != "auditar":
+            return estado == "conhecida"
+        existe = await self._consultar_mensagem_existe(anuncio_id, mensagem, tipo)
+        self.filtro.concluir_auditoria(anuncio_id, tipo, mensagem, existe)
+        return existe
+
+    async def _consultar_mensagem_existe(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
+        """Pergunta à API se a mensagem existe"""
+        response = await self._requisitar(
+            "GET", "/mensagem-existe", "verificar mensagem",
+            params={
+                "email": CREDENTIALS["username"],
+                "anuncio_id": anuncio_id,
+                "mensagem": mensagem,
+                "tipo": tipo
+            }
+        )
+        if response is None:
+            return False
+        if response.status_code == 404:
+            logger.warning("Endpoint de verificação de mensagem não encontrado")
+            return False
+        return response.json().get("existe", False)
+
+    async def enviar_mensagem_para_api(self, anuncio_id: str, mensagem: str, tipo: str) -> bool:
+        """Envia uma mensagem extraída pelo scraper para a API FastAPI"""
+        return await self._gravar_mensagem(anuncio_id, mensagem, tipo, str(uuid.uuid4())) is not None
+
+    async def _gravar_mensagem(self, anuncio_id: str, mensagem: str, tipo: str, chave_idempotencia: str) -> Optional[bool]:
+        """Grava a mensagem com a chave dada; True se foi inserida, False se a API já tinha, None se falhou"""
+        response = await self._requisitar(
+            "POST", "/receber-mensagem", "enviar mensagem",
+            json={"mensagem": mensagem},
+            params={
+                "email": CREDENTIALS["username"],
+                "anuncio_id": anuncio_id,
+                "tipo": tipo
+            },
+            headers={"Idempotency-Key": chave_idempotencia}
+        )
+        if response is None:
+            return None
+        if response.status_code == 404:
+            logger.warning("Endpoint de envio de mensagem não encontrado")
+            return None
+        inserida = response.json().get("inserida", True)
+        if inserida:
+            logger.info(f"Mensagem {tipo} registrada na API: {mensagem}")
+        if self.filtro is not None:
+            self.filtro.adicionar(anuncio_id, tipo, mensagem)
+        return inserida
+
+    async def buscar_respostas_pendentes(self) -> list:
+        """ Busca conversas com mensagens recebidas não respondidas na API """
+        response = await self._requisitar(
+            "GET", "/conversas/pendentes", "buscar conversas pendentes",
+            params={"email": CREDENTIALS["username"]}
+        )
+        if response is None or response.status_code == 404:
+            return []
+        return response.json().get("conversas_pendentes", [])
+
+    async def criar_conversa(self, anuncio_id: str) -> bool:
+        """Cria a conversa do anúncio na API (não faz nada se ela já existir)"""
+        response = await self._requisitar(
+            "POST", "/criar-conversa", "criar conversa",
+            params={"email": CREDENTIALS["username"], "anuncio_id": anuncio_id}
+        )
+        return response is not None and response.status_code == 200
+
+    async def enviar_info_anuncio_para_api(self, anuncio_id: str, nome_vendedor: str, titulo_anuncio: str, preco_anuncio: str) -> bool:
+        """Envia informações do anúncio para a API"""
+        response = await self._requisitar(
+            "POST", "/atualizar-info-anuncio", "atualizar informações do anúncio",
+            params={
+                "email": CREDENTIALS["username"],
+                "anuncio_id": anuncio_id,
+                "nome_vendedor": nome_vendedor,
+                "titulo_anuncio": titulo_anuncio,
+                "preco_anuncio": preco_anuncio
+            }
+        )
+        if response is None or response.status_code != 200:
+            return False
+        logger.info(f"Informações do anúncio {anuncio_id} atualizadas com sucesso")
+        return True
+
+    async def atualizar_searched_info(self, anuncio_id: str, searched_info: str) -> bool:
+        """Atualiza o campo searched_info do anúncio na API"""
+        response = await self._requisitar(
+            "POST", "/atualizar-searched-info", "atualizar searched_info do anúncio",
+            params={
+                "email": CREDENTIALS["username"],
+                "anuncio_id": anuncio_id,
+                "searched_info": searched_info
+            }
+        )
+        if response is None:
+            return False
+        if response.status_code == 404:
+            logger.warning(f"Conversa não encontrada para o anúncio {anuncio_id}")
+            return False
+        logger.info(f"Campo searched_info do anúncio {anuncio_id} atualizado com sucesso")
+        return True
+
+    async def buscar_info_anuncio(self, anuncio_id: str) -> Optional[Dict[str, Any]]:
+        """Busca informações do anúncio na API"""
+        response = await self._requisitar(
+            "GET", "/info-anuncio", "buscar informações do anúncio",
+            params={"email": CREDENTIALS["username"], "anuncio_id": anuncio_id}
+        )
+        if response is None:
+            return None
+        if response.status_code == 404:
+            logger.warning(f"Informações do anúncio {anuncio_id} não encontradas")
+            return None
+        return response.json()
+
+    async def reservar_jobs(self, worker_id: str, limite: int, visibilidade: int) -> list:
+        """Reserva jobs de resposta pendentes para este worker"""
+        response = await self._requisitar(
+            "POST", "/jobs/claim", "reservar jobs",
+            politica=self.politica_sem_repeticao,
+            params={
+                "email": CREDENTIALS["username"],
+                "worker_id": worker_id,
+                "limite": limite,
+                "visibilidade": visibilidade
+            }
+        )
+        if response is None or response.status_code != 200:
+            return []
+        return response.json().get("jobs", [])
+
+    async def confirmar_job(self, job_id: int, worker_id: str) -> bool:
+        """Marca um job reservado como concluído"""
+        response = await self._requisitar(
+            "POST", "/jobs/ack", f"confirmar job {job_id}",
+            caminho=f"/jobs/{job_id}/ack",
+            params={"worker_id": worker_id}
+        )
+        return response is not None and response.status_code == 200
+
+    async def devolver_job(self, job_id: int, worker_id: str, atraso: int = 0) -> bool:
+        """Devolve um job reservado à fila para ser processado novamente"""
+        response = await self._requisitar(
+            "POST", "/jobs/nack", f"devolver job {job_id}",
+            caminho=f"/jobs/{job_id}/nack",
+            params={"worker_id": worker_id, "atraso": atraso}
+        )
+        return response is not None and response.status_code == 200
+
+    async def buscar_eventos(self, after: int = 0, limite: int = 100) -> Dict[str, Any]:
+        """Busca os eventos posteriores a `after`; retorna os eventos e o último seq lido"""
+        response = await self._requisitar(
+            "GET", "/eventos", "buscar eventos",
+            params={"email": CREDENTIALS["username"], "after": after, "limite": limite}
+        )
+        if response is None or response.status_code != 200:
+            return {"eventos": [], "ultimo_seq": after}
+        return response.json()
+
+    async def sincronizar_aba(self, dados: Dict[str, Any]) -> bool:
+        """Registra na API a conversa, as informações do anúncio e as mensagens extraídas de uma aba"""
+        anuncio_id = dados["anuncio_id"]
+        lock = self._locks_anuncio.setdefault(anuncio_id, asyncio.Lock())
+        async with lock:
+            if not await self.criar_conversa(anuncio_id):
+                return False
+
+            await self.enviar_info_anuncio_para_api(
+                anuncio_id=anuncio_id,
+                nome_vendedor=dados["nome_vendedor"],
+                titulo_anuncio=dados["titulo_anuncio"],
+                preco_anuncio=dados["preco_anuncio"]
+            )
+
+            mensagens = dados["mensagens"]
+            if not mensagens:
+                logger.info(f"Nenhuma mensagem encontrada para o anúncio {anuncio_id}")
+                return True
+
+            # Dentro de um anúncio a ordem importa; a concorrência fica entre anúncios.
+            # Cada mensagem vai direto com chave determinística, sem consulta prévia
+            logger.info(f"Processando {len(mensagens)} mensagens para o anúncio {anuncio_id}")
+            sucesso = True
+            for posicao, msg in enumerate(mensagens):
+                texto = msg['texto']
+                tipo = msg['tipo']
+
+                if await self._mensagem_conhecida(anuncio_id, texto, tipo):
+                    logger.info(f"Mensagem já registrada na API: {texto}")
+                    continue
+
+                inserida = await self._gravar_mensagem(anuncio_id, texto, tipo, chave_mensagem(anuncio_id, tipo, texto, posicao))
+                if inserida is None:
+                    logger.error(f"Falha ao registrar mensagem {tipo}: {texto}")
+                    sucesso = False
+                    continue
+                if inserida:
+                    logger.info(f"Mensagem {tipo} registrada com sucesso: {texto}")
+                else:
+                    logger.info(f"Mensagem já registrada na API: {texto}")
+            return sucesso
+
+    async def mapear(self, funcao: Callable[[Any], Awaitable], itens: Iterable, max_concorrencia: Optional[int] = None) -> List[Any]:
+        """Aplica `funcao` a todos os itens com no máximo `max_concorrencia` em andamento.
+
+        Os resultados voltam na ordem dos itens; exceções são devolvidas no lugar do resultado.
+        """
+        semaforo = asyncio.Semaphore(max_concorrencia or self.max_concorrencia)
+
+        async def limitado(item):
+            async with semaforo:
+                return await funcao(item)
+
+        return await asyncio.gather(*(limitado(item) for item in itens), return_exceptions=True)
+
+    async def sincronizar_abas(self, abas: List[Dict[str, Any]], max_concorrencia: Optional[int] = None) -> int:
+        """Sincroniza várias abas em paralelo; retorna quantas foram sincronizadas sem falhas"""
+        resultados = await self.mapear(self.sincronizar_aba, abas, max_concorrencia)
+        for dados, resultado in zip(abas, resultados):
+            if isinstance(resultado, Exception):
+                logger.error(f"Erro ao sincronizar anúncio {dados.get('anuncio_id')}: {resultado}")
+        return sum(1 for resultado in resultados if resultado is True)
+
+    async def fechar(self):
+        """Fecha as conexões do cliente"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
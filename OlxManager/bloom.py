@@ -0,0 +1,249 @@
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class FiltroBloom:
+    """Bloom filter escalável: quando a camada atual enche, uma nova e maior é criada.
+
+    Cada camada nova tem o dobro da capacidade e metade da taxa de falso positivo,
+    então a taxa total fica abaixo de taxa_fp mesmo sem saber o tamanho final.
+    """
+
+    def __init__(self, capacidade: int = 64, taxa_fp: float = 1e-6, camadas: Optional[List[Dict[str, Any]]] = None):
+        self.capacidade = capacidade
+        self.taxa_fp = taxa_fp
+        self.camadas = camadas if camadas is not None else []
+        if not self.camadas:
+            self._nova_camada(capacidade, taxa_fp / 2)
+
+    def _nova_camada(self, capacidade: int, taxa_fp: float):
+        bits = max(8, math.ceil(-capacidade * math.log(taxa_fp) / (math.log(2) ** 2)))
+        hashes = max(1, round(bits / capacidade * math.log(2)))
+        self.camadas.append({
+            "bits": bits,
+            "hashes": hashes,
+            "capacidade": capacidade,
+            "taxa_fp": taxa_fp,
+            "itens": 0,
+            "dados": bytearray((bits + 7) // 8),
+        })
+
+    @staticmethod
+    def _hashes(chave: str):
+        digest = hashlib.blake2b(chave.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    @staticmethod
+    def _posicoes(camada: Dict[str, Any], h1: int, h2: int):
+        # Double hashing "aprimorado" (termo cúbico): sem ele as k posições se
+        # correlacionam quando h2 e o tamanho da camada têm divisores em comum
+        bits = camada["bits"]
+        return ((h1 + i * h2 + (i ** 3 - i) // 6) % bits for i in range(camada["hashes"]))
+
+    def __contains__(self, chave: str) -> bool:
+        h1, h2 = self._hashes(chave)
+        for camada in self.camadas:
+            dados = camada["dados"]
+            if all(dados[p >> 3] & (1 << (p & 7)) for p in self._posicoes(camada, h1, h2)):
+                return True
+        return False
+
+    def adicionar(self, chave: str) -> bool:
+        """Adiciona a chave; retorna False se ela (provavelmente) já estava no filtro"""
+        if chave in self:
+            return False
+        camada = self.camadas[-1]
+        if camada["itens"] >= camada["capacidade"]:
+            self._nova_camada(camada["capacidade"] * 2, camada["taxa_fp"] / 2)
+            camada = self.camadas[-1]
+        h1, h2 = self._hashes(chave)
+        dados = camada["dados"]
+        for p in self._posicoes(camada, h1, h2):
+            dados[p >> 3] |= 1 << (p & 7)
+        camada["itens"] += 1
+        return True
+
+    @property
+    def itens(self) -> int:
+        return sum(camada["itens"] for camada in self.camadas)
+
+    def taxa_fp_estimada(self) -> float:
+        """Probabilidade de falso positivo pela ocupação atual: 1 - Π(1 - (1 - e^(-kn/m))^k)"""
+        acerto = 1.0
+        for camada in self.camadas:
+            k, m, n = camada["hashes"], camada["bits"], camada["itens"]
+            acerto *= 1 - (1 - math.exp(-k * n / m)) ** k
+        return 1 - acerto
+
+    def para_dict(self) -> Dict[str, Any]:
+        return {
+            "capacidade": self.capacidade,
+            "taxa_fp": self.taxa_fp,
+            "camadas": [
+                {**camada, "dados": base64.b64encode(bytes(camada["dados"])).decode("ascii")}
+                for camada in self.camadas
+            ],
+        }
+
+    @classmethod
+    def de_dict(cls, dados: Dict[str, Any]) -> "FiltroBloom":
+        camadas = [
+            {**camada, "dados": bytearray(base64.b64decode(camada["dados"]))}
+            for camada in dados["camadas"]
+        ]
+        return cls(dados["capacidade"], dados["taxa_fp"], camadas)
+
+
+class FiltroMensagens:
+    """Um FiltroBloom por anúncio com as impressões (tipo + texto) das mensagens já gravadas.
+
+    Um "não" do filtro é definitivo para o que este cliente já viu; um "sim" é
+    provável. O APIManager responde os "sim" localmente e só consulta a API nos
+    "não" (a mensagem pode ter sido gravada por outro processo). Uma fração dos
+    "sim" é auditada na API para medir a taxa real de falso positivo.
+    """
+
+    def __init__(self, caminho: str, capacidade_inicial: int = 64, taxa_fp: float = 1e-6, taxa_auditoria: float = 0.01):
+        self.caminho = caminho
+        self.capacidade_inicial = capacidade_inicial
+        self.taxa_fp = taxa_fp
+        self.taxa_auditoria = taxa_auditoria
+        self.filtros: Dict[str, FiltroBloom] = {}
+        # Último seq do feed /eventos já incorporado; permite retomar de onde parou
+        self.ultimo_seq = 0
+        self._alterado = False
+        self._lock = threading.Lock()
+
+        self.consultas = 0
+        self.evitadas = 0
+        self.auditorias = 0
+        self.falsos_positivos = 0
+
+    @staticmethod
+    def _chave(tipo: str, mensagem: str) -> str:
+        return f"{tipo}\x1f{mensagem}"
+
+    def contem(self, anuncio_id: str, tipo: str, mensagem: str) -> bool:
+        with self._lock:
+            self.consultas += 1
+            filtro = self.filtros.get(anuncio_id)
+            return filtro is not None and self._chave(tipo, mensagem) in filtro
+
+    def adicionar(self, anuncio_id: str, tipo: str, mensagem: str) -> None:
+        with self._lock:
+            filtro = self.filtros.get(anuncio_id)
+            if filtro is None:
+                filtro = self.filtros[anuncio_id] = FiltroBloom(self.capacidade_inicial, self.taxa_fp)
+            if filtro.adicionar(self._chave(tipo, mensagem)):
+                self._alterado = True
+
+    def sortear_auditoria(self) -> bool:
+        """Decide se um acerto do filtro deve ser conferido na API mesmo assim"""
+        return random.random() < self.taxa_auditoria
+
+    def avaliar(self, anuncio_id: str, tipo: str, mensagem: str) -> str:
+        """"conhecida" (acerto aceito sem perguntar à API), "auditar" (acerto sorteado
+        para conferir em /mensagem-existe) ou "ausente"
+        """
+        if not self.contem(anuncio_id, tipo, mensagem):
+            return "ausente"
+        if not self.sortear_auditoria():
+            self.registrar_acerto(auditado=False)
+            return "conhecida"
+        return "auditar"
+
+    def concluir_auditoria(self, anuncio_id: str, tipo: str, mensagem: str, existe: bool) -> None:
+        """Registra o resultado da conferência de um acerto sorteado por `avaliar`"""
+        self.registrar_acerto(auditado=True, existe=existe)
+        if not existe:
+            logger.warning(f"Falso positivo do filtro de mensagens no anúncio {anuncio_id}: {mensagem}")
+
+    def registrar_acerto(self, auditado: bool, existe: bool = True) -> None:
+        with self._lock:
+            if not auditado:
+                self.evitadas += 1
+                return
+            self.auditorias += 1
+            if not existe:
+                self.falsos_positivos += 1
+
+    def incorporar_eventos(self, eventos: List[Dict[str, Any]], ultimo_seq: int) -> int:
+        """Adiciona as mensagens dos eventos `mensagem_inserida`; retorna quantas"""
+        adicionadas = 0
+        for evento in eventos:
+            if evento.get("tipo") != "mensagem_inserida":
+                continue
+            dados = evento.get("dados") or {}
+            if isinstance(dados, str):
+                dados = json.loads(dados)
+            self.adicionar(evento["anuncio_id"], dados["tipo"], dados["mensagem"])
+            adicionadas += 1
+        with self._lock:
+            if ultimo_seq > self.ultimo_seq:
+                self.ultimo_seq = ultimo_seq
+                self._alterado = True
+        return adicionadas
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            itens = sum(filtro.itens for filtro in self.filtros.values())
+            # Média ponderada pelo número de mensagens de cada anúncio
+            estimada = (
+                sum(filtro.taxa_fp_estimada() * filtro.itens for filtro in self.filtros.values()) / itens
+                if itens else 0.0
+            )
+            return {
+                "anuncios": len(self.filtros),
+                "mensagens": itens,
+                "consultas": self.consultas,
+                "evitadas": self.evitadas,
+                "auditorias": self.auditorias,
+                "falsos_positivos": self.falsos_positivos,
+                "taxa_fp_estimada": estimada,
+                "taxa_fp_auditada": self.falsos_positivos / self.auditorias if self.auditorias else 0.0,
+            }
+
+    def carregar(self) -> bool:
+        """Carrega o filtro salvo; retorna False se não houver arquivo válido"""
+        if not os.path.exists(self.caminho):
+            return False
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            with self._lock:
+                self.filtros = {anuncio_id: FiltroBloom.de_dict(filtro) for anuncio_id, filtro in dados["filtros"].items()}
+                self.ultimo_seq = dados.get("ultimo_seq", 0)
+                self._alterado = False
+            logger.info(f"Filtro de mensagens carregado: {len(self.filtros)} anúncios, seq {self.ultimo_seq}")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao carregar filtro de mensagens: {e}")
+            return False
+
+    def salvar(self) -> None:
+        """Grava o filtro em disco se ele mudou (escrita atômica via arquivo temporário)"""
+        with self._lock:
+            if not self._alterado:
+                return
+            dados = {
+                "ultimo_seq": self.ultimo_seq,
+                "filtros": {anuncio_id: filtro.para_dict() for anuncio_id, filtro in self.filtros.items()},
+            }
+            self._alterado = False
+        try:
+            temporario = f"{self.caminho}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(dados, f)
+            os.replace(temporario, self.caminho)
+            logger.debug(f"Filtro de mensagens salvo em {self.caminho}")
+        except Exception as e:
+            self._alterado = True
+            logger.error(f"Erro ao salvar filtro de mensagens: {e}")
@@ -1,25 +1,212 @@
+import json
 import logging
 import time
-import requests
 import os
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 import undetected_chromedriver as uc
-from typing import Optional
+from typing import Optional, Dict, Any, Callable, List
 
-from config import BROWSER_OPTIONS, TIMEOUTS, CREDENTIALS, URLS
+from config import BROWSER_OPTIONS, TIMEOUTS, CREDENTIALS, URLS, PRAZOS, EXTRACAO, PRONTIDAO, ABERTURA_ABAS, PERFIL_LEVE, SESSAO, POOL_ABAS, CAPTURA_REDE
+from .resilience import FalhaTransitoria, circuitos, criar_politica
+from .deadline import orcamento, restante, DeadlineExcedido
+from .prontidao import Prontidao
+from .captura_rede import CapturaRede, LogDesempenho
+from .cdp_paralelo import ExtratorParalelo
+from .pool_abas import PoolAbas
 
 logger = logging.getLogger(__name__)
 
+# Devolve todas as mensagens do chat numa única ida ao navegador, já na ordem do
+# DOM (querySelectorAll percorre o documento em ordem, igual à ordem de exibição)
+JS_EXTRAIR_MENSAGENS = """
+const lista = document.querySelector('[data-testid="messages-list-container"]') || document;
+const spans = lista.querySelectorAll(
+    '[data-testid="received-message"] [data-testid="message"] span, ' +
+    '[data-testid="sent-message"] [data-testid="message"] span'
+);
+const mensagens = [];
+spans.forEach((span, indice) => {
+    const texto = (span.innerText || span.textContent || '').trim();
+    if (!texto) return;
+    mensagens.push({
+        tipo: span.closest('[data-testid="received-message"]') ? 'recebida' : 'enviada',
+        texto: texto,
+        indice: indice
+    });
+});
+return mensagens;
+"""
+
+# Tempo de carregamento e memória JS da aba atual, numa única chamada
+JS_MEDIR_ABA = """
+const navegacao = performance.getEntriesByType('navigation')[0];
+return {
+    carregamento_ms: navegacao && navegacao.loadEventEnd > 0 ? navegacao.loadEventEnd - navegacao.startTime : null,
+    memoria_bytes: performance.memory ? performance.memory.usedJSHeapSize : null
+};
+"""
+
+# Estado da sessão na página de favoritos: logado (lista de favoritos), deslogado
+# (botão de login) ou null enquanto a página não mostrou nenhum dos dois
+JS_ESTADO_SESSAO = """
+const xpath = (caminho) => document.evaluate(caminho, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+const favoritos = document.querySelector('a.css-1tqlkj0, [data-testid="observed-page-link"], [data-testid="favorites-item"]');
+const botaoLogin = xpath(arguments[0]);
+return {
+    logado: favoritos ? true : (botaoLogin ? false : null),
+    banner_cookies: document.getElementById('onetrust-accept-btn-handler') !== null
+};
+"""
+
+# Caixa de entrada do OLX: uma entrada por conversa, com indicador de não lida
+# e prévia da última mensagem
+SELETORES_CAIXA_ENTRADA = {
+    "lista": '[data-testid="conversations-list"]',
+    "vazia": '[data-testid="conversations-empty"]',
+    "item": '[data-testid="conversations-list"] [data-testid="conversation"]',
+    "link": 'a[href]',
+    "nao_lida": '[data-testid="unread-indicator"], [data-testid="unread-counter"]',
+    "previa": '[data-testid="last-message"]',
+}
+
+# Lê todas as conversas da caixa de entrada numa única chamada; null enquanto a
+# lista não carregou
+JS_LER_CAIXA_ENTRADA = """
+const sel = arguments[0];
+if (!document.querySelector(sel.lista) && !document.querySelector(sel.vazia)) return null;
+return Array.from(document.querySelectorAll(sel.item)).map(item => {
+    const link = item.matches('a[href]') ? item : (item.querySelector(sel.link) || item.closest('a[href]'));
+    const href = link ? link.href : '';
+    const id = item.getAttribute('data-ad-id')
+        || (link && link.getAttribute('data-ad-id'))
+        || (href.match(/[?&]ad[-_]?id=(\\d+)/i) || [])[1]
+        || null;
+    const previa = item.querySelector(sel.previa);
+    return {
+        anuncio_id: id,
+        link: href,
+        nao_lida: item.querySelector(sel.nao_lida) !== null,
+        previa: previa ? (previa.innerText || previa.textContent || '').trim() : ''
+    };
+});
+"""
+
+XPATH_BOTAO_LOGIN = '//*[@id="mainContent"]/div/div[2]/section/div/div/button'
+
+# Mensagens enviadas no chat; o envio é confirmado quando a contagem muda
+SELETOR_ENVIADAS = '[data-testid="sent-message"]'
+
+# Campos lidos pelo JS_EXTRAIR_CAMPOS: nome -> (seletor CSS, todos os elementos?)
+CAMPOS_ANUNCIO = {
+    "anuncio_id": ('[data-testid="ad-details-id"]', False),
+    "nome_vendedor": ('[data-testid="username"]', False),
+    "titulo_anuncio": ('[data-testid="ad-details-title"]', False),
+    "preco_anuncio": ('[data-testid="ad-details-price"]', False),
+}
+
+CAMPOS_INFO = {
+    "titulo": ("h1.css-1soizd2", False),
+    "preco": ("h3.css-46itwz", False),
+    "descricao": ("div.css-g5mtbi", False),
+    "caracteristicas": ("div.css-1wws9er", True),
+    "localizacao": ("p.css-1wws9er", False),
+    "data_publicacao": ("span.css-19yf5ek", False),
+}
+
+# Lê todos os campos numa única ida ao navegador. Recebe {nome: [seletor, todos]}
+# e devolve {nome: {presente, valor}}; um campo ausente não espera nada
+JS_EXTRAIR_CAMPOS = """
+const campos = arguments[0];
+const texto = (el) => (el.innerText || el.textContent || '').trim();
+const resultado = {};
+for (const [nome, [seletor, todos]] of Object.entries(campos)) {
+    if (todos) {
+        const valores = Array.from(document.querySelectorAll(seletor)).map(texto).filter(Boolean);
+        resultado[nome] = {presente: valores.length > 0, valor: valores};
+    } else {
+        const el = document.querySelector(seletor);
+        resultado[nome] = {presente: el !== null, valor: el ? texto(el) : ''};
+    }
+}
+return resultado;
+"""
+
+# Extração completa de uma aba avaliada pelo ExtratorParalelo: espera o anúncio e
+# o chat aparecerem (sem idas e voltas ao Python) e lê campos e mensagens
+JS_EXTRAIR_ABA = """
+(async () => {
+    const campos = %(campos)s;
+    const limite = Date.now() + %(timeout_ms)d;
+    const seletores = [campos.anuncio_id[0], '[data-testid="messages-list-container"]'];
+    while (seletores.some(seletor => !document.querySelector(seletor))) {
+        if (Date.now() > limite) return {pronta: false};
+        await new Promise(resolver => setTimeout(resolver, 100));
+    }
+    const lerCampos = function () { %(ler_campos)s };
+    const lerMensagens = function () { %(ler_mensagens)s };
+    return {pronta: true, campos: lerCampos(campos), mensagens: lerMensagens()};
+})()
+"""
+
 class BrowserManager:
     def __init__(self, api_manager):
         self.driver = None
         self.wait = None
         self.api = api_manager
+        self.politica = criar_politica("olx")
+        self.log_desempenho = LogDesempenho(lambda: self.driver)
+        self.prontidao = Prontidao(lambda: self.driver, PRONTIDAO["intervalo"], self.log_desempenho)
+        # Mensagens do chat lidas do tráfego de rede (CDP) em vez do DOM
+        self.captura = CapturaRede(
+            self.log_desempenho,
+            lambda: self.driver,
+            CAPTURA_REDE["padroes_url"],
+            CAPTURA_REDE["campos"],
+            CAPTURA_REDE["meu_usuario"]
+        ) if CAPTURA_REDE["ativo"] else None
+        # Extração de todas as abas ao mesmo tempo por sessões CDP (criado ao iniciar o navegador)
+        self.extrator: Optional[ExtratorParalelo] = None
+        self._expressao_extracao = JS_EXTRAIR_ABA % {
+            "campos": json.dumps({nome: list(definicao) for nome, definicao in CAMPOS_ANUNCIO.items()}),
+            "timeout_ms": TIMEOUTS["element_wait"] * 1000,
+            "ler_campos": JS_EXTRAIR_CAMPOS,
+            "ler_mensagens": JS_EXTRAIR_MENSAGENS,
+        }
+        self.pool = PoolAbas(self, POOL_ABAS["maximo"], POOL_ABAS["janela_atividade"])
+        # Destino dos dados extraídos de cada aba; o OlxScraper pode trocá-lo
+        # por um despacho para o AsyncAPIManager
+        self.sincronizar: Callable[[Dict[str, Any]], Any] = api_manager.sincronizar_aba
+        self.modo_extracao = EXTRACAO["modo"]
+        # anuncio_id -> handle da aba, e handle -> URL aberta nela; evitam
+        # percorrer todas as abas (um switch_to.window por aba) para achar um anúncio
+        self.abas_anuncios: Dict[str, str] = {}
+        self.urls_abas: Dict[str, str] = {}
+        # Se as abas podem ser criadas por Target.createTarget (None: ainda não testado)
+        self._abas_cdp: Optional[bool] = None
+        self.perfil = BROWSER_OPTIONS["perfil"]
+        self._medicoes_abas: List[Dict[str, Any]] = []
+        # Última mensagem extraída de cada anúncio (e do link de onde a aba foi aberta),
+        # comparada com a prévia da caixa de entrada
+        self.ultimas_mensagens: Dict[str, str] = {}
+        # Aba própria da caixa de entrada; a primeira aba continua nos favoritos
+        self.aba_caixa_entrada: Optional[str] = None
+        self.conversas_caixa_entrada = 0
+        self.conversas_nao_lidas = 0
+        self.abas_visitadas = 0
+        # Instante (monotonic) da primeira aba extraída nesta execução
+        self.primeira_extracao_em: Optional[float] = None
+        self._abas_extraidas = 0
+        self._tempo_extracao_total = 0.0
+        self._tempo_extracao_max = 0.0
+
+    def _esperar(self, condicao, timeout: Optional[float] = None, ponto: str = "elemento"):
+        """Espera a condição com o timeout limitado ao orçamento de tempo atual"""
+        return self.prontidao.elemento(ponto, condicao, timeout)
 
     def iniciar_navegador(self):
         """Inicia o navegador com as configurações especificadas"""
@@ -29,7 +216,14 @@ class BrowserManager:
             # Configuração do ChromeDriver com undetected-chromedriver
             options = uc.ChromeOptions()
             options.add_argument('--no-sandbox')
-            options.add_argument('--window-size=1920,1080')
+            leve = self.perfil == "leve"
+            if leve:
+                options.add_argument(f'--window-size={PERFIL_LEVE["largura"]},{PERFIL_LEVE["altura"]}')
+                options.add_argument('--blink-settings=imagesEnabled=false')
+                regras = ", ".join(f"MAP {dominio} ~NOTFOUND" for dominio in PERFIL_LEVE["bloquear_dominios"])
+                options.add_argument(f'--host-resolver-rules={regras}')
+            else:
+                options.add_argument('--window-size=1920,1080')
             options.add_argument('--disable-blink-features=AutomationControlled')
             options.add_argument('--disable-extensions')
             options.add_argument('--disable-infobars')
@@ -40,14 +234,29 @@ class BrowserManager:
             options.add_argument('--disable-translate')
             options.add_argument('--disable-web-security')
             options.add_argument('--ignore-certificate-errors')
-            options.add_argument('--start-maximized')
+            if not leve:
+                options.add_argument('--start-maximized')
+            if EXTRACAO["paralela"]:
+                # Abas em segundo plano não podem ter timers e renderização estrangulados
+                options.add_argument('--disable-background-timer-throttling')
+                options.add_argument('--disable-backgrounding-occluded-windows')
+                options.add_argument('--disable-renderer-backgrounding')
+            # Eventos Network do CDP no log de performance, usados para esperar a rede ociosa
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
             
+            # Perfil persistente: cookies, localStorage e consentimento sobrevivem entre execuções
+            if SESSAO["modo"] == "perfil":
+                os.makedirs(SESSAO["perfil_dir"], exist_ok=True)
+
+            # O headless do undetected_chromedriver usa --headless=new e corrige o user agent
             self.driver = uc.Chrome(
                 options=options,
+                user_data_dir=os.path.abspath(SESSAO["perfil_dir"]) if SESSAO["modo"] == "perfil" else None,
                 version_main=134,
                 use_subprocess=True,
                 suppress_welcome=True,
-                log_level=3
+                log_level=3,
+                headless=leve and PERFIL_LEVE["headless"]
             )
             
             # Configuração do timeout
@@ -58,8 +267,17 @@ class BrowserManager:
             self.driver.execute_cdp_cmd('Network.setUserAgentOverride', {
                 "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36'
             })
+            if leve:
+                self._bloquear_recursos()
+            if EXTRACAO["paralela"]:
+                endereco = self.driver.capabilities.get("goog:chromeOptions", {}).get("debuggerAddress")
+                if endereco:
+                    self.extrator = ExtratorParalelo(endereco, EXTRACAO["max_abas_paralelas"], PRAZOS["aba"])
+                    logger.info(f"Extração paralela pelo DevTools em {endereco}")
+                else:
+                    logger.warning("Endereço do DevTools indisponível; extração paralela desativada")
             
-            logger.info("Navegador iniciado com sucesso")
+            logger.info(f"Navegador iniciado com sucesso (perfil {self.perfil})")
             return True
         except Exception as e:
             logger.error(f"Erro ao iniciar o navegador: {e}")
@@ -71,8 +289,9 @@ class BrowserManager:
         for attempt in range(TIMEOUTS["max_retries"]):
             try:
                 logger.info(f"Tentativa {attempt + 1} de aceitar cookies...")
-                cookie_button = self.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, '//*[@id="onetrust-accept-btn-handler"]'))
+                cookie_button = self._esperar(
+                    EC.element_to_be_clickable((By.XPATH, '//*[@id="onetrust-accept-btn-handler"]')),
+                    ponto="botão de cookies"
                 )
                 cookie_button.click()
                 logger.info("Cookies aceitos com sucesso")
@@ -80,7 +299,7 @@ class BrowserManager:
             except TimeoutException:
                 logger.warning(f"Tentativa {attempt + 1} de aceitar cookies falhou")
                 if attempt < TIMEOUTS["max_retries"] - 1:
-                    time.sleep(TIMEOUTS["retry_delay"])
+                    self.prontidao.documento_pronto("nova tentativa de cookies", TIMEOUTS["retry_delay"])
             except Exception as e:
                 logger.error(f"Erro ao aceitar cookies: {e}")
                 return False
@@ -96,22 +315,28 @@ class BrowserManager:
                 
                 # Clicar no botão de login
                 logger.info("Procurando botão de login...")
-                login_button = self.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, '//*[@id="mainContent"]/div/div[2]/section/div/div/button'))
+                login_button = self._esperar(
+                    EC.element_to_be_clickable((By.XPATH, XPATH_BOTAO_LOGIN))
                 )
                 login_button.click()
 
                 # Preencher campos de login
                 logger.info("Preenchendo campos de login...")
-                username_field = self.wait.until(
+                username_field = self._esperar(
                     EC.presence_of_element_located((By.XPATH, '//*[@id="username"]'))
                 )
-                password_field = self.wait.until(
+                password_field = self._esperar(
                     EC.presence_of_element_located((By.XPATH, '//*[@id="password"]'))
                 )
 
                 username_field.send_keys(CREDENTIALS["username"])
-                time.sleep(1)
+                # O formulário pode reagir à digitação; segue quando o valor estiver no campo
+                self.prontidao.esperar(
+                    "usuário digitado",
+                    lambda driver: username_field.get_attribute("value") == CREDENTIALS["username"],
+                    timeout=TIMEOUTS["retry_delay"],
+                    obrigatorio=False
+                )
                 password_field.send_keys(CREDENTIALS["password"])
                 password_field.send_keys(Keys.RETURN)
                 
@@ -120,7 +345,7 @@ class BrowserManager:
             except TimeoutException:
                 logger.warning(f"Tentativa {attempt + 1} de login falhou")
                 if attempt < TIMEOUTS["max_retries"] - 1:
-                    time.sleep(TIMEOUTS["retry_delay"])
+                    self.prontidao.documento_pronto("nova tentativa de login", TIMEOUTS["retry_delay"])
             except Exception as e:
                 logger.error(f"Erro no login: {e}")
                 return False
@@ -132,7 +357,8 @@ class BrowserManager:
         try:
             # Aguarda a página carregar completamente
             logger.info("Aguardando carregamento da página de favoritos...")
-            time.sleep(5)  # Pequena pausa para garantir carregamento
+            self.prontidao.documento_pronto("página de favoritos")
+            self.prontidao.rede_ociosa("favoritos carregados")
             
             # Tenta diferentes seletores para encontrar os favoritos
             seletores = [
@@ -148,7 +374,7 @@ class BrowserManager:
                 try:
                     logger.info(f"Tentando encontrar favoritos com seletor: {seletor}")
                     # Aguarda até que pelo menos um elemento seja encontrado
-                    favoritos = self.wait.until(
+                    favoritos = self._esperar(
                         EC.presence_of_all_elements_located(seletor)
                     )
                     if favoritos:
@@ -222,42 +448,270 @@ class BrowserManager:
                 pass
             return []
 
-    def abrir_anuncios_em_abas(self, links):
-        """Abre os anúncios em novas abas e espera o carregamento"""
+    def abrir_anuncios_em_abas(self, links) -> Dict[str, str]:
+        """Abre os anúncios em novas abas, várias carregando ao mesmo tempo, e retorna {link: handle}.
+
+        Até ABERTURA_ABAS["max_em_andamento"] abas carregam juntas; a cada aba
+        pronta, o próximo link é aberto.
+        """
         # Guarda a aba principal
         aba_principal = self.driver.current_window_handle
         logger.info(f"Abrindo {len(links)} anúncios em novas abas...")
         
-        for link in links:
+        fila = list(links)
+        carregando: Dict[str, str] = {}
+        abertas: Dict[str, str] = {}
+        inicio = time.perf_counter()
+
+        def rodada(driver):
+            # Completa as vagas de abas carregando
+            while fila and len(carregando) < ABERTURA_ABAS["max_em_andamento"]:
+                link = fila.pop(0)
+                try:
+                    logger.info(f"Abrindo: {link}")
+                    carregando[self._criar_aba(link)] = link
+                except Exception as e:
+                    logger.error(f"Erro ao abrir o link {link}: {e}")
+
+            # Confere, sem esperar, quais abas terminaram de carregar
+            for aba, link in list(carregando.items()):
+                try:
+                    driver.switch_to.window(aba)
+                    pronta = driver.execute_script("return document.readyState") == "complete"
+                except WebDriverException as e:
+                    logger.error(f"Erro ao carregar o link {link}: {e}")
+                    del carregando[aba]
+                    continue
+                if pronta:
+                    abertas[link] = aba
+                    del carregando[aba]
+                    self._medir_aba()
+            return not fila and not carregando
+
+        try:
+            if not self.prontidao.esperar("abrir abas", rodada, ABERTURA_ABAS["timeout"], obrigatorio=False):
+                # As que não carregaram a tempo continuam carregando; a extração espera por elas
+                logger.warning(f"{len(carregando)} abas ainda carregando e {len(fila)} não abertas após {ABERTURA_ABAS['timeout']}s")
+                abertas.update({link: aba for aba, link in carregando.items()})
+        finally:
+            # Volta para a aba principal
             try:
-                logger.info(f"Abrindo: {link}")
-                
-                # Abre nova aba
-                self.driver.execute_script(f"window.open('{link}', '_blank');")
-                time.sleep(2)  # Espera a aba abrir
-                
-                # Muda para a nova aba
-                self.driver.switch_to.window(self.driver.window_handles[-1])
-                
-                # Espera a página carregar
-                logger.info("Aguardando carregamento da página...")
-                self.wait.until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-                
-                # Volta para a aba principal
                 self.driver.switch_to.window(aba_principal)
-                logger.info("Aba aberta com sucesso")
-                
-            except Exception as e:
-                logger.error(f"Erro ao abrir o link: {e}")
+            except WebDriverException:
+                pass
+
+        logger.info(f"{len(abertas)}/{len(links)} abas abertas em {time.perf_counter() - inicio:.1f}s")
+        medidas = self.estatisticas_abas()
+        logger.info(
+            f"Perfil {self.perfil}: carregamento médio {medidas['carregamento_medio_ms']} ms, "
+            f"memória JS média {medidas['memoria_media_mb']} MB por aba"
+        )
+        return abertas
+
+    def _bloquear_recursos(self):
+        """Bloqueia imagens, mídia e fontes na aba atual (o CDP aplica o bloqueio por aba)"""
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": PERFIL_LEVE["bloquear_urls"]})
+
+    def _navegar_leve(self, aba: str, url: str):
+        """Aplica o bloqueio na aba vazia recém-criada e só então navega, sem esperar o carregamento"""
+        self.driver.switch_to.window(aba)
+        self._bloquear_recursos()
+        self.driver.execute_cdp_cmd("Page.navigate", {"url": url})
+
+    def _medir_aba(self):
+        """Guarda o tempo de carregamento e a memória JS da aba atual"""
+        try:
+            medida = self.driver.execute_script(JS_MEDIR_ABA)
+        except WebDriverException as e:
+            logger.debug(f"Não foi possível medir a aba: {e}")
+            return
+        if isinstance(medida, dict):
+            self._medicoes_abas.append(medida)
+
+    def estatisticas_abas(self) -> Dict[str, Any]:
+        """Perfil do navegador, tempo médio de carregamento e memória JS média por aba"""
+        carregamentos = [m["carregamento_ms"] for m in self._medicoes_abas if m.get("carregamento_ms") is not None]
+        memorias = [m["memoria_bytes"] for m in self._medicoes_abas if m.get("memoria_bytes") is not None]
+        return {
+            "perfil": self.perfil,
+            "abas": len(self._medicoes_abas),
+            "carregamento_medio_ms": round(sum(carregamentos) / len(carregamentos), 1) if carregamentos else 0.0,
+            "memoria_media_mb": round(sum(memorias) / len(memorias) / 2 ** 20, 1) if memorias else 0.0,
+        }
+
+    def _criar_aba(self, url: str) -> str:
+        """Abre a URL numa nova aba sem trocar de aba nem esperar o carregamento; retorna o handle"""
+        if self._abas_cdp is not False:
+            try:
+                # No perfil leve a aba nasce vazia para receber o bloqueio antes de navegar
+                destino = "about:blank" if self.perfil == "leve" else url
+                aba = self.driver.execute_cdp_cmd("Target.createTarget", {"url": destino, "background": True})["targetId"]
+                if self._abas_cdp is None:
+                    # O handle do ChromeDriver é o targetId do CDP; confere uma vez
+                    self._abas_cdp = aba in self.driver.window_handles
+                    if not self._abas_cdp:
+                        logger.info("Handles não correspondem aos targets do CDP; abrindo abas com window.open")
+                        self.driver.execute_cdp_cmd("Target.closeTarget", {"targetId": aba})
+                if self._abas_cdp:
+                    self.urls_abas[aba] = url
+                    if destino != url:
+                        self._navegar_leve(aba, url)
+                    return aba
+            except WebDriverException as e:
+                logger.info(f"Target.createTarget indisponível, abrindo abas com window.open: {e}")
+                self._abas_cdp = False
+        return self._abrir_aba(url)
+
+    def _abrir_aba(self, url: str) -> str:
+        """Abre a URL numa nova aba e retorna o handle dela, já registrado em urls_abas"""
+        antes = set(self.driver.window_handles)
+        leve = self.perfil == "leve"
+        self.driver.execute_script("window.open(arguments[0], '_blank');", "about:blank" if leve else url)
+        aba = self.prontidao.nova_aba("abrir aba", antes)
+        self.urls_abas[aba] = url
+        if leve:
+            atual = self.driver.current_window_handle
+            self._navegar_leve(aba, url)
+            self.driver.switch_to.window(atual)
+        return aba
+
+    def _registrar_aba(self, anuncio_id: str, aba: str):
+        self.abas_anuncios[anuncio_id] = aba
+
+    def _localizar_aba(self, anuncio_id: str) -> Optional[str]:
+        """Handle da aba aberta do anúncio, ou None; não muda a aba ativa.
+
+        Consulta o registro e confirma que o handle ainda existe; sem registro,
+        procura o anúncio nas URLs das abas abertas por este BrowserManager.
+        """
+        vivas = set(self.driver.window_handles)
+        aba = self.abas_anuncios.get(anuncio_id)
+        if aba is not None:
+            if aba in vivas:
+                return aba
+            logger.info(f"Aba do anúncio {anuncio_id} foi fechada")
+            del self.abas_anuncios[anuncio_id]
+
+        # Descarta as abas que não existem mais
+        for handle in list(self.urls_abas):
+            if handle not in vivas:
+                del self.urls_abas[handle]
+        for handle, url in self.urls_abas.items():
+            if anuncio_id in url:
+                self._registrar_aba(anuncio_id, handle)
+                return handle
+        return None
+
+    def restaurar_sessao(self) -> bool:
+        """No modo "cookies", carrega no navegador os cookies e o localStorage salvos"""
+        if SESSAO["modo"] != "cookies" or not os.path.exists(SESSAO["arquivo"]):
+            return False
+        try:
+            with open(SESSAO["arquivo"], "r", encoding="utf-8") as f:
+                sessao = json.load(f)
+            # Cookies só podem ser definidos estando no domínio deles
+            self.driver.get(URLS["base_url"])
+            for cookie in sessao.get("cookies", []):
+                if cookie.get("sameSite") not in ("Strict", "Lax", "None"):
+                    cookie.pop("sameSite", None)
                 try:
-                    self.driver.switch_to.window(aba_principal)
-                except:
-                    pass
+                    self.driver.add_cookie(cookie)
+                except WebDriverException as e:
+                    logger.debug(f"Cookie {cookie.get('name')} ignorado: {e}")
+            self.driver.execute_script(
+                "for (const [chave, valor] of Object.entries(arguments[0])) localStorage.setItem(chave, valor);",
+                sessao.get("local_storage", {})
+            )
+            logger.info(f"Sessão restaurada de {SESSAO['arquivo']} ({len(sessao.get('cookies', []))} cookies)")
+            return True
+        except Exception as e:
+            logger.warning(f"Não foi possível restaurar a sessão salva: {e}")
+            return False
+
+    def verificar_sessao(self) -> Dict[str, Any]:
+        """Estado da sessão na página de favoritos já aberta: {"logado": bool, "banner_cookies": bool}.
+
+        "logado" é False também quando a página não mostrou nem os favoritos nem o
+        botão de login dentro de SESSAO["timeout_verificacao"].
+        """
+        def decidido(driver):
+            estado = driver.execute_script(JS_ESTADO_SESSAO, XPATH_BOTAO_LOGIN)
+            return estado if estado["logado"] is not None else False
+
+        estado = self.prontidao.esperar("verificar sessão", decidido, SESSAO["timeout_verificacao"], obrigatorio=False)
+        if not estado:
+            return {"logado": False, "banner_cookies": True}
+        return estado
+
+    def salvar_sessao(self):
+        """No modo "cookies", grava os cookies e o localStorage do OLX (escrita atômica)"""
+        if SESSAO["modo"] != "cookies" or not self.driver:
+            return
+        try:
+            sessao = {
+                "cookies": self.driver.get_cookies(),
+                "local_storage": self.driver.execute_script(
+                    "const dados = {}; for (let i = 0; i < localStorage.length; i++) {"
+                    " const chave = localStorage.key(i); dados[chave] = localStorage.getItem(chave); } return dados;"
+                ),
+            }
+            temporario = f"{SESSAO['arquivo']}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(sessao, f)
+            os.replace(temporario, SESSAO["arquivo"])
+            logger.info(f"Sessão salva em {SESSAO['arquivo']}")
+        except Exception as e:
+            logger.error(f"Erro ao salvar a sessão: {e}")
+
+    def entrar(self) -> Optional[bool]:
+        """Abre os favoritos reaproveitando a sessão salva ou fazendo login.
+
+        Retorna True se a sessão anterior ainda valia, False depois de um login
+        novo e None se não foi possível entrar.
+        """
+        self.restaurar_sessao()
+
+        logger.info("Acessando página de favoritos...")
+        self.driver.get(URLS["favorites"])
+
+        sessao = self.verificar_sessao()
+        if sessao["logado"]:
+            logger.info("Sessão anterior ainda válida; pulando cookies e login")
+            return True
+
+        if sessao["banner_cookies"] and not self.aceitar_cookies():
+            logger.error("Falha ao aceitar cookies")
+            return None
+        if not self.login():
+            logger.error("Falha no login")
+            return None
+        # login() volta assim que a senha é enviada; só grava os cookies depois
+        # que os favoritos aparecem como logado, senão seriam os de antes do login
+        if not self._confirmar_login():
+            logger.error("Login não confirmado na página de favoritos")
+            return None
+        self.salvar_sessao()
+        return False
+
+    def _confirmar_login(self) -> bool:
+        """Espera a página de favoritos mostrar a sessão logada depois do login"""
+        def logado(driver):
+            try:
+                return driver.execute_script(JS_ESTADO_SESSAO, XPATH_BOTAO_LOGIN)["logado"] is True
+            except WebDriverException:
+                return False  # Página ainda navegando depois do envio do formulário
+
+        if self.prontidao.esperar("confirmar login", logado, SESSAO["timeout_verificacao"], obrigatorio=False):
+            return True
+        # O OLX pode ter redirecionado para outra página depois do login
+        self.driver.get(URLS["favorites"])
+        return bool(self.verificar_sessao()["logado"])
 
     def finalizar(self):
         """Finaliza a execução e limpa recursos"""
+        self.abas_anuncios.clear()
+        self.urls_abas.clear()
         if self.driver:
             try:
                 logger.info("Fechando navegador...")
@@ -267,27 +721,34 @@ class BrowserManager:
                 logger.error(f"Erro ao fechar o navegador: {e}")
 
     def reabrir_anuncio(self, anuncio_id: str) -> bool:
-        """Reabre a aba de um anúncio específico se ela não estiver disponível"""
+        """Reabre a aba de um anúncio específico se ela não estiver disponível.
+
+        Só reabre anúncios cujo link dos favoritos é conhecido; sem ele retorna False.
+        """
         try:
             # Verifica se a aba já está aberta
-            abas = self.driver.window_handles
-            for aba in abas[1:]:  # Pula a primeira aba (favoritos)
+            aba = self._localizar_aba(anuncio_id)
+            if aba is not None:
+                logger.info(f"Anúncio {anuncio_id} já está aberto em uma aba")
                 self.driver.switch_to.window(aba)
-                if anuncio_id in self.driver.current_url:
-                    logger.info(f"Anúncio {anuncio_id} já está aberto em uma aba")
-                    return True
+                return True
             
             # Se não estiver aberto, tenta reabrir
+            url = self.pool.link_do_anuncio(anuncio_id)
+            if url is None:
+                logger.error(f"Link do anúncio {anuncio_id} desconhecido; não é possível reabri-lo")
+                return False
             logger.info(f"Tentando reabrir anúncio {anuncio_id}...")
-            url = f"https://www.olx.com.br/item/{anuncio_id}"
-            self.driver.execute_script(f"window.open('{url}', '_blank');")
-            time.sleep(2)
+            self.pool.garantir_vaga()
+            aba = self._abrir_aba(url)
+            self._registrar_aba(anuncio_id, aba)
+            self.pool.registrar_reabertura(aba, url)
             
             # Muda para a nova aba
-            self.driver.switch_to.window(self.driver.window_handles[-1])
+            self.driver.switch_to.window(aba)
             
             # Espera a página carregar
-            self.wait.until(
+            self._esperar(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             
@@ -300,185 +761,87 @@ class BrowserManager:
 
     def enviar_mensagem_olx(self, anuncio_id: str, mensagem: str) -> bool:
         """Envia a mensagem de resposta no OLX"""
-        max_tentativas = 3
-        for tentativa in range(max_tentativas):
-            try:
-                # Encontrar a aba correta do anúncio
-                abas = self.driver.window_handles
-                encontrou_aba = False
-                
-                for aba in abas[1:]:  # Pula a primeira aba (favoritos)
-                    self.driver.switch_to.window(aba)
-                    if anuncio_id in self.driver.current_url:
-                        logger.info(f"Anúncio {anuncio_id} encontrado na aba")
-                        encontrou_aba = True
-                        break
-                
+        def tentar():
+            # Encontrar a aba correta do anúncio
+            aba = self._localizar_aba(anuncio_id)
+            if aba is not None:
+                logger.info(f"Anúncio {anuncio_id} encontrado na aba")
+                self.driver.switch_to.window(aba)
+                self.pool.tocar(aba)
+            else:
                 # Se não encontrou a aba, tenta reabrir
-                if not encontrou_aba:
-                    logger.info(f"Anúncio {anuncio_id} não encontrado nas abas abertas, tentando reabrir...")
-                    if not self.reabrir_anuncio(anuncio_id):
-                        logger.error(f"Não foi possível reabrir o anúncio {anuncio_id}")
-                        if tentativa < max_tentativas - 1:
-                            time.sleep(2)
-                        continue
-                
-                # Encontrar e preencher campo de mensagem
-                logger.info("Procurando campo de mensagem...")
-                campo_mensagem = self.wait.until(
-                    EC.presence_of_element_located((By.NAME, "message.text"))
-                )
+                logger.info(f"Anúncio {anuncio_id} não encontrado nas abas abertas, tentando reabrir...")
+                if self.pool.link_do_anuncio(anuncio_id) is None:
+                    # Sem o link dos favoritos não há o que reabrir; repetir não adianta
+                    logger.error(f"Anúncio {anuncio_id} fora dos favoritos conhecidos; mensagem não enviada")
+                    return False
+                if not self.reabrir_anuncio(anuncio_id):
+                    raise FalhaTransitoria(f"não foi possível reabrir o anúncio {anuncio_id}")
+            
+            # Encontrar e preencher campo de mensagem
+            logger.info("Procurando campo de mensagem...")
+            campo_mensagem = self._esperar(
+                EC.presence_of_element_located((By.NAME, "message.text")),
+                ponto="campo de mensagem"
+            )
 
-                # Limpar campo e enviar mensagem
-                logger.info("Enviando mensagem...")
-                campo_mensagem.clear()
-                campo_mensagem.send_keys(mensagem)
-                campo_mensagem.send_keys(Keys.RETURN)
-                
-                # Verificar se a mensagem foi enviada
-                time.sleep(2)  # Pequena pausa para garantir o envio
-                logger.info(f"Mensagem enviada com sucesso: {mensagem}")
-                return True
+            # Limpar campo e enviar mensagem
+            logger.info("Enviando mensagem...")
+            enviadas = self.driver.execute_script(
+                "return document.querySelectorAll(arguments[0]).length", SELETOR_ENVIADAS
+            )
+            campo_mensagem.clear()
+            campo_mensagem.send_keys(mensagem)
+            campo_mensagem.send_keys(Keys.RETURN)
+            
+            # Verificar se a mensagem foi enviada: ela aparece no chat como uma enviada a mais
+            if not self.prontidao.contagem_muda("confirmar envio", SELETOR_ENVIADAS, enviadas, PRONTIDAO["timeout_envio"]):
+                # Não reenvia: a mensagem pode ter saído sem aparecer a tempo
+                logger.warning(f"Envio não confirmado no chat em {PRONTIDAO['timeout_envio']}s")
+            logger.info(f"Mensagem enviada com sucesso: {mensagem}")
+            return True
 
-            except TimeoutException:
-                logger.error(f"Timeout ao tentar enviar mensagem (tentativa {tentativa + 1})")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-            except Exception as e:
-                logger.error(f"Erro ao enviar mensagem no OLX (tentativa {tentativa + 1}): {e}")
-                if tentativa < max_tentativas - 1:
-                    time.sleep(2)
-        
-        return False
+        try:
+            return self.politica.executar(
+                tentar, f"enviar mensagem no anúncio {anuncio_id}", circuitos.obter("olx enviar-mensagem")
+            )
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagem no OLX: {e}")
+            return False
+
+    def extrair_mensagens_vendedor(self, abas_alvo: Optional[List[str]] = None):
+        """ Extrai mensagens de vendedores e envia para a API
 
-    def extrair_mensagens_vendedor(self):
-        """ Extrai mensagens de vendedores e envia para a API """
+        Sem `abas_alvo`, visita todas as abas de anúncios abertas.
+        """
         try:
             abas = self.driver.window_handles
-            for aba in abas[1:]:  # Pula a primeira aba (favoritos)
+            # Pula a primeira aba (favoritos) e a da caixa de entrada
+            alvo = [aba for aba in abas[1:] if aba != self.aba_caixa_entrada] if abas_alvo is None else abas_alvo
+            self.abas_visitadas = 0
+            if self.extrator is not None and alvo:
+                # Abas que falharem no caminho paralelo são lidas uma a uma logo abaixo
+                alvo = self._extrair_em_paralelo(alvo)
+            for aba in alvo:
                 try:
+                    self.abas_visitadas += 1
                     self.driver.switch_to.window(aba)
-                    time.sleep(2)  # Pequena pausa para garantir carregamento
-                    
-                    # Extrair informações do anúncio e vendedor
-                    try:
-                        # ID do anúncio
-                        elemento_id = self.wait.until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="ad-details-id"]'))
-                        )
-                        anuncio_id = elemento_id.text.replace("ID: ", "").strip()
-                        
-                        # Nome do vendedor
-                        nome_vendedor = self.wait.until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="username"]'))
-                        ).text.strip()
-                        
-                        # Título do anúncio
-                        titulo_anuncio = self.wait.until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="ad-details-title"]'))
-                        ).text.strip()
-                        
-                        # Preço do anúncio
-                        preco_anuncio = self.wait.until(
-                            EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="ad-details-price"]'))
-                        ).text.strip()
-                        
-                        logger.info(f"Informações extraídas - ID: {anuncio_id}, Vendedor: {nome_vendedor}, Título: {titulo_anuncio}, Preço: {preco_anuncio}")
-                        
-                        # Criar a conversa primeiro
-                        criar_response = requests.post(
-                            f"{URLS['api']}/criar-conversa",
-                            params={
-                                "email": CREDENTIALS["username"],
-                                "anuncio_id": anuncio_id
-                            },
-                            timeout=10
-                        )
-                        
-                        if criar_response.status_code != 200:
-                            logger.error(f"Erro ao criar conversa: {criar_response.text}")
-                            continue
-                        
-                        # Enviar informações para a API
-                        self.api.enviar_info_anuncio_para_api(
-                            anuncio_id=anuncio_id,
-                            nome_vendedor=nome_vendedor,
-                            titulo_anuncio=titulo_anuncio,
-                            preco_anuncio=preco_anuncio
-                        )
-                        
-                    except Exception as e:
-                        logger.error(f"Erro ao extrair informações do anúncio: {e}")
-                        continue
-
-                    # Esperar até que o elemento das mensagens esteja presente
-                    logger.info("Aguardando carregamento das mensagens...")
-                    self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="messages-list-container"]')))
+                    self.prontidao.documento_pronto("aba pronta para extração")
 
-                    # Buscar todas as mensagens (recebidas e enviadas)
-                    logger.info("Buscando mensagens recebidas e enviadas...")
-                    mensagens_recebidas = self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="received-message"] [data-testid="message"] span')
-                    mensagens_enviadas = self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="sent-message"] [data-testid="message"] span')
-                    
-                    if not mensagens_recebidas and not mensagens_enviadas:
-                        logger.info(f"Nenhuma mensagem encontrada para o anúncio {anuncio_id}")
+                    inicio = time.perf_counter()
+                    with orcamento(f"extração da aba {aba}", PRAZOS["aba"]):
+                        dados = self._extrair_dados_aba()
+                    if dados is None:
                         continue
+                    self._concluir_extracao(aba, dados, time.perf_counter() - inicio)
 
-                    # Criar lista de todas as mensagens com seus tipos
-                    todas_mensagens = []
-                    
-                    # Adicionar mensagens recebidas
-                    for msg in mensagens_recebidas:
-                        try:
-                            texto = msg.text.strip()
-                            if texto:
-                                todas_mensagens.append({
-                                    'texto': texto,
-                                    'tipo': 'recebida',
-                                    'elemento': msg
-                                })
-                                logger.debug(f"Mensagem recebida encontrada: {texto}")
-                        except Exception as e:
-                            logger.error(f"Erro ao processar mensagem recebida: {e}")
-
-                    # Adicionar mensagens enviadas
-                    for msg in mensagens_enviadas:
-                        try:
-                            texto = msg.text.strip()
-                            if texto:
-                                todas_mensagens.append({
-                                    'texto': texto,
-                                    'tipo': 'enviada',
-                                    'elemento': msg
-                                })
-                                logger.debug(f"Mensagem enviada encontrada: {texto}")
-                        except Exception as e:
-                            logger.error(f"Erro ao processar mensagem enviada: {e}")
-
-                    # Ordenar mensagens por posição no DOM (ordem de recebimento)
-                    todas_mensagens.sort(key=lambda x: self.driver.execute_script(
-                        "return arguments[0].getBoundingClientRect().top;", 
-                        x['elemento']
-                    ))
-
-                    # Enviar todas as mensagens para a API
-                    logger.info(f"Processando {len(todas_mensagens)} mensagens para o anúncio {anuncio_id}")
-                    for msg in todas_mensagens:
-                        try:
-                            texto = msg['texto']
-                            tipo = msg['tipo']
-                            
-                            # Verificar se a mensagem já existe antes de enviar
-                            if not self.api.verificar_mensagem_existe(anuncio_id, texto, tipo):
-                                if self.api.enviar_mensagem_para_api(anuncio_id, texto, tipo):
-                                    logger.info(f"Mensagem {tipo} registrada com sucesso: {texto}")
-                                else:
-                                    logger.error(f"Falha ao registrar mensagem {tipo}: {texto}")
-                            else:
-                                logger.info(f"Mensagem já registrada na API: {texto}")
-                        except Exception as e:
-                            logger.error(f"Erro ao processar mensagem: {e}")
-
+                except DeadlineExcedido as e:
+                    # Sem prazo no ciclo, as abas restantes ficam para o próximo
+                    sobra = restante()
+                    if sobra is not None and sobra <= 0:
+                        logger.warning(f"Prazo esgotado; extração interrompida na aba {aba}: {e}")
+                        break
+                    logger.warning(f"Aba {aba} ignorada neste ciclo: {e}")
                 except Exception as e:
                     logger.error(f"Erro ao processar aba: {e}")
                     continue
@@ -491,6 +854,325 @@ class BrowserManager:
         except Exception as e:
             logger.error(f"Erro ao buscar mensagens novas: {e}") 
 
+    def _concluir_extracao(self, aba: str, dados: Dict[str, Any], duracao: float):
+        """Registra a aba extraída e envia os dados para sincronização"""
+        self._registrar_tempo_extracao(duracao, len(dados["mensagens"]))
+        self._registrar_aba(dados["anuncio_id"], aba)
+        self.pool.observar_extracao(aba, dados)
+        if dados["mensagens"]:
+            ultima = dados["mensagens"][-1]["texto"]
+            self.ultimas_mensagens[dados["anuncio_id"]] = ultima
+            # Conversas da caixa de entrada sem anuncio_id são reconhecidas pelo link
+            link = self.urls_abas.get(aba)
+            if link:
+                self.ultimas_mensagens[link] = ultima
+
+        # O envio para a API pode ser síncrono (APIManager) ou despachado
+        # para o loop assíncrono pelo OlxScraper, sem bloquear a extração
+        self.sincronizar(dados)
+
+    def _extrair_em_paralelo(self, abas: List[str]) -> List[str]:
+        """Extrai todas as abas ao mesmo tempo por sessões CDP próprias; retorna as que falharam"""
+        inicio = time.perf_counter()
+        try:
+            resultados = self.extrator.executar(abas, self._expressao_extracao)
+        except DeadlineExcedido:
+            raise
+        except Exception as e:
+            logger.error(f"Extração paralela indisponível, lendo as abas uma a uma: {e}")
+            return abas
+
+        # Abas sem target no DevTools nem chegaram a ser visitadas aqui
+        sem_alvo = [aba for aba in abas if aba not in resultados]
+        falhas = []
+        for aba, (duracao, resultado) in resultados.items():
+            if isinstance(resultado, Exception) or not resultado or not resultado.get("pronta"):
+                logger.warning(f"Aba {aba} não extraída em paralelo: {resultado if isinstance(resultado, Exception) else 'não carregou'}")
+                falhas.append(aba)
+                continue
+            self.abas_visitadas += 1
+            dados = self._dados_do_anuncio(resultado["campos"])
+            if dados is None:
+                continue
+            dados["mensagens"] = [{'texto': msg['texto'], 'tipo': msg['tipo']} for msg in resultado["mensagens"]]
+            try:
+                self._concluir_extracao(aba, dados, duracao)
+            except Exception as e:
+                logger.error(f"Erro ao processar aba: {e}")
+
+        logger.info(f"{len(resultados) - len(falhas)}/{len(abas)} abas extraídas em paralelo em {time.perf_counter() - inicio:.2f}s")
+        # As falhas são lidas (e contadas) de novo pelo caminho sequencial
+        return sem_alvo + falhas
+
+    def ler_caixa_entrada(self) -> Optional[List[Dict[str, Any]]]:
+        """Lê as conversas na aba própria da caixa de entrada; None se não carregou"""
+        try:
+            if self.aba_caixa_entrada in self.driver.window_handles:
+                self.driver.switch_to.window(self.aba_caixa_entrada)
+                self.driver.get(URLS["inbox"])
+            else:
+                self.aba_caixa_entrada = self._abrir_aba(URLS["inbox"])
+                # Não é aba de anúncio: fica fora da busca por URL
+                self.urls_abas.pop(self.aba_caixa_entrada, None)
+                self.driver.switch_to.window(self.aba_caixa_entrada)
+            return self.prontidao.esperar(
+                "caixa de entrada",
+                lambda driver: driver.execute_script(JS_LER_CAIXA_ENTRADA, SELETORES_CAIXA_ENTRADA),
+                obrigatorio=False
+            )
+        except Exception as e:
+            logger.error(f"Erro ao ler a caixa de entrada: {e}")
+            return None
+        finally:
+            try:
+                self.driver.switch_to.window(self.driver.window_handles[0])
+            except WebDriverException:
+                pass
+
+    @staticmethod
+    def _chave_conversa(conversa: Dict[str, Any]) -> Optional[str]:
+        """anuncio_id da conversa ou, se a caixa de entrada não o mostrou, o link dela"""
+        return conversa["anuncio_id"] or conversa["link"] or None
+
+    def _conversa_mudou(self, conversa: Dict[str, Any]) -> bool:
+        """Não lida, ou com prévia diferente da última mensagem extraída (lida em outro lugar)"""
+        if conversa["nao_lida"]:
+            return True
+        chave = self._chave_conversa(conversa)
+        if chave is None:
+            return False
+        ultima = self.ultimas_mensagens.get(chave)
+        # A prévia costuma vir truncada com reticências
+        previa = conversa["previa"].rstrip("…").rstrip(".").strip()
+        return bool(previa) and (ultima is None or not ultima.startswith(previa))
+
+    def extrair_nao_lidas(self):
+        """Extrai só as conversas que mudaram segundo a caixa de entrada.
+
+        Anúncios abertos que ainda não foram extraídos nenhuma vez também são
+        visitados, para aprender o anuncio_id de cada aba. Se a caixa de entrada
+        não carregar, todas as abas são visitadas como no modo normal.
+        """
+        conversas = self.ler_caixa_entrada()
+        if conversas is None:
+            logger.warning("Caixa de entrada indisponível; visitando todas as abas")
+            self.extrair_mensagens_vendedor()
+            return
+
+        mudaram = [conversa for conversa in conversas if self._conversa_mudou(conversa)]
+        self.conversas_caixa_entrada = len(conversas)
+        self.conversas_nao_lidas = len(mudaram)
+        logger.info(f"Caixa de entrada: {len(mudaram)} de {len(conversas)} conversas com mensagens novas")
+
+        alvo = []
+        conhecidas = set(self.abas_anuncios.values())
+        for aba in self.pool.abertas:
+            if aba not in conhecidas:
+                alvo.append(aba)
+
+        for conversa in mudaram:
+            aba = self._abrir_conversa(conversa)
+            if aba is not None and aba not in alvo:
+                alvo.append(aba)
+
+        if alvo:
+            self.extrair_mensagens_vendedor(alvo)
+        else:
+            self.abas_visitadas = 0
+
+    def _abrir_conversa(self, conversa: Dict[str, Any]) -> Optional[str]:
+        """Deixa a aba do anúncio da conversa aberta e atualizada; retorna o handle"""
+        anuncio_id = conversa["anuncio_id"]
+        try:
+            aba = self._localizar_aba(anuncio_id) if anuncio_id else self._aba_do_link(conversa["link"])
+            if aba is not None:
+                # A aba já aberta pode não ter recebido a mensagem nova
+                self.driver.switch_to.window(aba)
+                self.driver.refresh()
+                return aba
+
+            link = (anuncio_id and self.pool.link_do_anuncio(anuncio_id)) or conversa["link"]
+            if not link:
+                logger.warning(f"Conversa sem anúncio identificável na caixa de entrada: {conversa['previa']}")
+                return None
+            self.pool.garantir_vaga()
+            aba = self._abrir_aba(link)
+            self.pool.registrar_reabertura(aba, link)
+            if anuncio_id:
+                self._registrar_aba(anuncio_id, aba)
+            return aba
+        except Exception as e:
+            logger.error(f"Erro ao abrir a conversa do anúncio {anuncio_id}: {e}")
+            return None
+
+    def _aba_do_link(self, link: str) -> Optional[str]:
+        """Handle de uma aba viva aberta a partir de `link`, ou None"""
+        if not link:
+            return None
+        vivas = set(self.driver.window_handles)
+        for aba, url in list(self.urls_abas.items()) + list(self.pool.abertas.items()):
+            if url == link and aba in vivas:
+                return aba
+        return None
+
+    @staticmethod
+    def _dados_do_anuncio(campos: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Monta os dados da aba a partir dos CAMPOS_ANUNCIO lidos; None sem o ID do anúncio"""
+        if not campos["anuncio_id"]["presente"]:
+            logger.error("ID do anúncio não encontrado na aba")
+            return None
+        for nome, campo in campos.items():
+            if not campo["presente"]:
+                logger.warning(f"Campo '{nome}' não encontrado na aba")
+
+        anuncio_id = campos["anuncio_id"]["valor"].replace("ID: ", "").strip()
+        nome_vendedor = campos["nome_vendedor"]["valor"]
+        titulo_anuncio = campos["titulo_anuncio"]["valor"]
+        preco_anuncio = campos["preco_anuncio"]["valor"]
+        logger.info(f"Informações extraídas - ID: {anuncio_id}, Vendedor: {nome_vendedor}, Título: {titulo_anuncio}, Preço: {preco_anuncio}")
+
+        return {
+            "anuncio_id": anuncio_id,
+            "nome_vendedor": nome_vendedor,
+            "titulo_anuncio": titulo_anuncio,
+            "preco_anuncio": preco_anuncio,
+            "mensagens": []
+        }
+
+    def _extrair_dados_aba(self) -> Optional[Dict[str, Any]]:
+        """Extrai as informações do anúncio e as mensagens da aba atual, sem chamar a API"""
+        # Extrair informações do anúncio e vendedor
+        try:
+            # O ID marca que a página do anúncio carregou; o resto vem numa única chamada
+            self._esperar(
+                EC.presence_of_element_located((By.CSS_SELECTOR, CAMPOS_ANUNCIO["anuncio_id"][0])),
+                ponto="dados do anúncio"
+            )
+            campos = self._extrair_campos(CAMPOS_ANUNCIO)
+        except Exception as e:
+            logger.error(f"Erro ao extrair informações do anúncio: {e}")
+            return None
+
+        dados = self._dados_do_anuncio(campos)
+        if dados is None:
+            return None
+
+        # Com a captura de rede, as mensagens já chegaram em JSON com id e data
+        if self.captura:
+            mensagens = self.captura.mensagens_da_aba(self.driver.current_window_handle)
+            if mensagens is not None:
+                logger.info(f"{len(mensagens)} mensagens obtidas do tráfego de rede")
+                dados["mensagens"] = mensagens
+                return dados
+            logger.debug("Nada capturado da rede para esta aba; lendo o DOM")
+
+        # Esperar até que o elemento das mensagens esteja presente
+        logger.info("Aguardando carregamento das mensagens...")
+        self._esperar(
+            EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="messages-list-container"]')),
+            ponto="lista de mensagens"
+        )
+
+        # Buscar todas as mensagens (recebidas e enviadas)
+        logger.info("Buscando mensagens recebidas e enviadas...")
+        if self.modo_extracao == "script":
+            mensagens = self._extrair_mensagens_script()
+            if mensagens is None:
+                logger.warning("Extração por script falhou, usando a extração por elementos")
+                mensagens = self._extrair_mensagens_elementos()
+        else:
+            mensagens = self._extrair_mensagens_elementos()
+
+        dados["mensagens"] = mensagens
+        return dados
+
+    def _extrair_campos(self, campos: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Lê os campos da aba atual com um único execute_script (JS_EXTRAIR_CAMPOS)"""
+        return self.driver.execute_script(
+            JS_EXTRAIR_CAMPOS, {nome: list(definicao) for nome, definicao in campos.items()}
+        )
+
+    def _extrair_mensagens_script(self) -> Optional[List[Dict[str, str]]]:
+        """Extrai as mensagens do chat com um único execute_script; None se o script falhar"""
+        try:
+            resultado = self.driver.execute_script(JS_EXTRAIR_MENSAGENS)
+        except WebDriverException as e:
+            logger.error(f"Erro ao executar o script de extração: {e}")
+            return None
+        if not isinstance(resultado, list):
+            return None
+
+        resultado.sort(key=lambda msg: msg["indice"])
+        mensagens = []
+        for msg in resultado:
+            logger.debug(f"Mensagem {msg['tipo']} encontrada: {msg['texto']}")
+            mensagens.append({'texto': msg['texto'], 'tipo': msg['tipo']})
+        return mensagens
+
+    def _extrair_mensagens_elementos(self) -> List[Dict[str, str]]:
+        """Extração antiga: um WebElement e uma chamada ao navegador por mensagem"""
+        mensagens_recebidas = self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="received-message"] [data-testid="message"] span')
+        mensagens_enviadas = self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="sent-message"] [data-testid="message"] span')
+        
+        if not mensagens_recebidas and not mensagens_enviadas:
+            return []
+
+        # Criar lista de todas as mensagens com seus tipos
+        todas_mensagens = []
+        
+        # Adicionar mensagens recebidas
+        for msg in mensagens_recebidas:
+            try:
+                texto = msg.text.strip()
+                if texto:
+                    todas_mensagens.append({
+                        'texto': texto,
+                        'tipo': 'recebida',
+                        'elemento': msg
+                    })
+                    logger.debug(f"Mensagem recebida encontrada: {texto}")
+            except Exception as e:
+                logger.error(f"Erro ao processar mensagem recebida: {e}")
+
+        # Adicionar mensagens enviadas
+        for msg in mensagens_enviadas:
+            try:
+                texto = msg.text.strip()
+                if texto:
+                    todas_mensagens.append({
+                        'texto': texto,
+                        'tipo': 'enviada',
+                        'elemento': msg
+                    })
+                    logger.debug(f"Mensagem enviada encontrada: {texto}")
+            except Exception as e:
+                logger.error(f"Erro ao processar mensagem enviada: {e}")
+
+        # Ordenar mensagens por posição no DOM (ordem de recebimento)
+        todas_mensagens.sort(key=lambda x: self.driver.execute_script(
+            "return arguments[0].getBoundingClientRect().top;", 
+            x['elemento']
+        ))
+
+        # Os elementos do Selenium não saem da thread do navegador
+        return [{'texto': msg['texto'], 'tipo': msg['tipo']} for msg in todas_mensagens]
+
+    def _registrar_tempo_extracao(self, duracao: float, mensagens: int):
+        self._abas_extraidas += 1
+        self._tempo_extracao_total += duracao
+        self._tempo_extracao_max = max(self._tempo_extracao_max, duracao)
+        if self.primeira_extracao_em is None:
+            self.primeira_extracao_em = time.monotonic()
+        logger.info(f"Aba extraída em {duracao * 1000:.0f} ms ({mensagens} mensagens, modo {self.modo_extracao})")
+
+    def estatisticas_extracao(self) -> Dict[str, Any]:
+        """Abas extraídas e tempo médio/máximo de extração por aba, em milissegundos"""
+        return {
+            "abas": self._abas_extraidas,
+            "media_ms": round(self._tempo_extracao_total / self._abas_extraidas * 1000, 1) if self._abas_extraidas else 0.0,
+            "max_ms": round(self._tempo_extracao_max * 1000, 1),
+        }
+
     def obter_searched_info(self, anuncio_id: str) -> Optional[str]:
         """Obtém informações detalhadas do anúncio"""
         try:
@@ -498,63 +1180,35 @@ class BrowserManager:
             aba_principal = self.driver.current_window_handle
             
             # Procura a aba do anúncio
-            for handle in self.driver.window_handles:
-                self.driver.switch_to.window(handle)
-                if anuncio_id in self.driver.current_url:
-                    break
+            aba = self._localizar_aba(anuncio_id)
+            if aba is None:
+                logger.warning(f"Aba do anúncio {anuncio_id} não está aberta")
+                return None
+            self.driver.switch_to.window(aba)
             
             # Aguarda carregamento da página
-            self.wait.until(
+            self._esperar(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             
             # Coleta informações do anúncio
+            campos = self._extrair_campos(CAMPOS_INFO)
+            rotulos = {
+                "titulo": "Título",
+                "preco": "Preço",
+                "descricao": "Descrição",
+                "localizacao": "Localização",
+                "data_publicacao": "Data de publicação",
+            }
             info = []
-            
-            # Título do anúncio
-            try:
-                titulo = self.driver.find_element(By.CSS_SELECTOR, "h1.css-1soizd2").text
-                info.append(f"Título: {titulo}")
-            except:
-                logger.warning("Não foi possível obter o título do anúncio")
-            
-            # Preço
-            try:
-                preco = self.driver.find_element(By.CSS_SELECTOR, "h3.css-46itwz").text
-                info.append(f"Preço: {preco}")
-            except:
-                logger.warning("Não foi possível obter o preço do anúncio")
-            
-            # Descrição
-            try:
-                descricao = self.driver.find_element(By.CSS_SELECTOR, "div.css-g5mtbi").text
-                info.append(f"Descrição: {descricao}")
-            except:
-                logger.warning("Não foi possível obter a descrição do anúncio")
-            
-            # Características
-            try:
-                caracteristicas = self.driver.find_elements(By.CSS_SELECTOR, "div.css-1wws9er")
-                if caracteristicas:
+            for nome, campo in campos.items():
+                if not campo["presente"]:
+                    logger.warning(f"Não foi possível obter o campo '{nome}' do anúncio")
+                elif nome == "caracteristicas":
                     info.append("Características:")
-                    for carac in caracteristicas:
-                        info.append(f"- {carac.text}")
-            except:
-                logger.warning("Não foi possível obter as características do anúncio")
-            
-            # Localização
-            try:
-                localizacao = self.driver.find_element(By.CSS_SELECTOR, "p.css-1wws9er").text
-                info.append(f"Localização: {localizacao}")
-            except:
-                logger.warning("Não foi possível obter a localização do anúncio")
-            
-            # Data de publicação
-            try:
-                data_pub = self.driver.find_element(By.CSS_SELECTOR, "span.css-19yf5ek").text
-                info.append(f"Data de publicação: {data_pub}")
-            except:
-                logger.warning("Não foi possível obter a data de publicação")
+                    info.extend(f"- {carac}" for carac in campo["valor"])
+                else:
+                    info.append(f"{rotulos[nome]}: {campo['valor']}")
             
             # Volta para a aba principal
             self.driver.switch_to.window(aba_principal)
@@ -0,0 +1,205 @@
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# Prefixo numérico dos frames socket.io / engine.io ("42[...]", "0{...}")
+_PREFIXO_FRAME = re.compile(r"^\d+")
+
+class LogDesempenho:
+    """Lê o log de performance do ChromeDriver (eventos do CDP) e reparte entre os interessados.
+
+    get_log("performance") esvazia o log a cada leitura; com vários leitores
+    (Prontidao, CapturaRede) cada um recebe sua própria fila de eventos. Cada
+    evento leva em "aba" o target de origem, que é o handle da janela.
+    """
+
+    def __init__(self, obter_driver: Callable[[], Any]):
+        self.obter_driver = obter_driver
+        self._filas: List[Deque[Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def assinar(self, maximo: int = 10000) -> Deque[Dict[str, Any]]:
+        """Retorna uma fila que passa a receber todos os eventos lidos daqui em diante"""
+        fila: Deque[Dict[str, Any]] = deque(maxlen=maximo)
+        with self._lock:
+            self._filas.append(fila)
+        return fila
+
+    def bombear(self) -> int:
+        """Lê os eventos acumulados no log e os distribui; levanta WebDriverException sem log"""
+        entradas = self.obter_driver().get_log("performance")
+        with self._lock:
+            for entrada in entradas:
+                conteudo = json.loads(entrada["message"])
+                evento = conteudo["message"]
+                evento["aba"] = conteudo.get("webview")
+                for fila in self._filas:
+                    fila.append(evento)
+        return len(entradas)
+
+
+class CapturaRede:
+    """Mensagens do chat decodificadas do tráfego de rede, sem ler o DOM.
+
+    Acompanha as respostas XHR/fetch e os frames de websocket cujas URLs casam
+    com `padroes_url`, decodifica o JSON e guarda, por aba, as mensagens com id e
+    data. Só aceita mensagens cujo autor dá para identificar (campo "minha" ou
+    `meu_usuario`): sem isso não há como separar enviadas de recebidas, e a aba
+    volta para a extração pelo DOM.
+    """
+
+    def __init__(self, log: LogDesempenho, obter_driver: Callable[[], Any], padroes_url: List[str],
+                 campos: Dict[str, List[str]], meu_usuario: str = ""):
+        self.obter_driver = obter_driver
+        self.log = log
+        self._fila = log.assinar()
+        self.padroes_url = [re.compile(padrao) for padrao in padroes_url]
+        self.campos = campos
+        self.meu_usuario = str(meu_usuario) if meu_usuario else ""
+
+        self._respostas: Dict[str, Optional[str]] = {}  # requestId -> aba
+        self._corpos_pendentes: Dict[Optional[str], List[str]] = {}
+        self._websockets: Set[str] = set()
+        self._mensagens: Dict[Optional[str], Dict[str, Dict[str, Any]]] = {}
+
+        self.payloads = 0
+        self.capturadas = 0
+        self.descartadas = 0
+
+    def _url_do_chat(self, url: str) -> bool:
+        return any(padrao.search(url) for padrao in self.padroes_url)
+
+    def processar_eventos(self):
+        """Consome os eventos de rede recebidos desde a última chamada"""
+        try:
+            self.log.bombear()
+        except WebDriverException as e:
+            logger.debug(f"Log de performance indisponível: {e}")
+        while self._fila:
+            evento = self._fila.popleft()
+            metodo = evento.get("method", "")
+            parametros = evento.get("params", {})
+            id_requisicao = parametros.get("requestId")
+            aba = evento.get("aba")
+
+            if metodo == "Network.responseReceived":
+                resposta = parametros.get("response", {})
+                if "json" in resposta.get("mimeType", "") and self._url_do_chat(resposta.get("url", "")):
+                    self._respostas[id_requisicao] = aba
+            elif metodo == "Network.loadingFinished" and id_requisicao in self._respostas:
+                self._corpos_pendentes.setdefault(self._respostas.pop(id_requisicao), []).append(id_requisicao)
+            elif metodo == "Network.loadingFailed":
+                self._respostas.pop(id_requisicao, None)
+            elif metodo == "Network.webSocketCreated" and self._url_do_chat(parametros.get("url", "")):
+                self._websockets.add(id_requisicao)
+            elif metodo == "Network.webSocketClosed":
+                self._websockets.discard(id_requisicao)
+            elif metodo in ("Network.webSocketFrameReceived", "Network.webSocketFrameSent") \
+                    and id_requisicao in self._websockets:
+                self._incorporar(aba, parametros.get("response", {}).get("payloadData", ""))
+
+    def mensagens_da_aba(self, aba: str) -> Optional[List[Dict[str, str]]]:
+        """Mensagens capturadas da aba, em ordem de data; None se nada foi capturado.
+
+        A aba precisa ser a atual: o corpo das respostas só pode ser pedido ao
+        target que fez a requisição.
+        """
+        self.processar_eventos()
+        driver = self.obter_driver()
+        for id_requisicao in self._corpos_pendentes.pop(aba, []):
+            try:
+                corpo = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": id_requisicao})
+            except WebDriverException as e:
+                logger.debug(f"Corpo da resposta {id_requisicao} indisponível: {e}")
+                continue
+            texto = corpo.get("body", "")
+            if corpo.get("base64Encoded"):
+                texto = base64.b64decode(texto).decode("utf-8", errors="replace")
+            self._incorporar(aba, texto)
+
+        mensagens = self._mensagens.get(aba)
+        if not mensagens:
+            return None
+        ordenadas = sorted(mensagens.values(), key=lambda msg: (msg["ordem"], msg["id"]))
+        return [{"texto": msg["texto"], "tipo": msg["tipo"]} for msg in ordenadas]
+
+    def esquecer(self, aba: str):
+        """Descarta o que foi capturado de uma aba fechada"""
+        self._mensagens.pop(aba, None)
+        self._corpos_pendentes.pop(aba, None)
+
+    def _incorporar(self, aba: Optional[str], payload: str):
+        texto = _PREFIXO_FRAME.sub("", payload.strip()) if payload else ""
+        if not texto:
+            return
+        try:
+            dados = json.loads(texto)
+        except ValueError:
+            return
+        self.payloads += 1
+        destino = self._mensagens.setdefault(aba, {})
+        for bruta in self._procurar_mensagens(dados):
+            mensagem = self._normalizar(bruta)
+            if mensagem is None:
+                self.descartadas += 1
+                continue
+            if mensagem["id"] not in destino:
+                self.capturadas += 1
+            destino[mensagem["id"]] = mensagem
+
+    def _valor(self, item: Dict[str, Any], campo: str) -> Any:
+        for chave in self.campos[campo]:
+            if chave in item and item[chave] is not None:
+                return item[chave]
+        return None
+
+    def _procurar_mensagens(self, dados: Any):
+        """Percorre o JSON e devolve os objetos com cara de mensagem (texto e data)"""
+        if isinstance(dados, dict):
+            if isinstance(self._valor(dados, "texto"), str) and self._valor(dados, "data") is not None:
+                yield dados
+                return
+            for valor in dados.values():
+                yield from self._procurar_mensagens(valor)
+        elif isinstance(dados, list):
+            for valor in dados:
+                yield from self._procurar_mensagens(valor)
+
+    def _normalizar(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        texto = self._valor(item, "texto").strip()
+        if not texto:
+            return None
+
+        minha = self._valor(item, "minha")
+        if minha is None and self.meu_usuario:
+            autor = self._valor(item, "autor")
+            if isinstance(autor, dict):
+                autor = autor.get("id")
+            if autor is not None:
+                minha = str(autor) == self.meu_usuario
+        if minha is None:
+            return None
+
+        data = self._valor(item, "data")
+        ordem = (0, float(data), "") if isinstance(data, (int, float)) else (1, 0.0, str(data))
+        identificador = self._valor(item, "id")
+        if identificador is None:
+            identificador = hashlib.sha1(f"{data}\x1f{texto}".encode("utf-8")).hexdigest()
+        return {
+            "id": str(identificador),
+            "texto": texto,
+            "tipo": "enviada" if minha else "recebida",
+            "ordem": ordem,
+        }
+
+    def estatisticas(self) -> Dict[str, int]:
+        return {"payloads": self.payloads, "capturadas": self.capturadas, "descartadas": self.descartadas}
@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import Any, Dict, List, Tuple
+
+import requests
+from websockets.asyncio.client import connect
+
+from .deadline import limitar_timeout
+
+logger = logging.getLogger(__name__)
+
+class ErroCDP(Exception):
+    """Comando do DevTools respondido com erro ou script que lançou exceção"""
+
+
+class ExtratorParalelo:
+    """Executa um script em várias abas ao mesmo tempo, sem trocar a aba do Selenium.
+
+    Cada aba (target "page" do Chrome, cujo id é o handle da janela) recebe sua
+    própria sessão CDP pelo websocket do DevTools. Antes do script, a aba ganha
+    foco emulado e é marcada como ativa, para o Chrome não estrangular os timers
+    de uma aba em segundo plano; assim uma varredura dura o tempo da aba mais
+    lenta e não a soma de todas.
+    """
+
+    def __init__(self, endereco_depuracao: str, max_alvos: int = 16, timeout: float = 30):
+        self.endereco_depuracao = endereco_depuracao
+        self.max_alvos = max_alvos
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+
+    def alvos(self) -> Dict[str, str]:
+        """{id do target: URL do websocket} das páginas abertas"""
+        resposta = requests.get(f"http://{self.endereco_depuracao}/json/list", timeout=5)
+        resposta.raise_for_status()
+        return {
+            alvo["id"]: alvo["webSocketDebuggerUrl"]
+            for alvo in resposta.json()
+            if alvo.get("type") == "page" and alvo.get("webSocketDebuggerUrl")
+        }
+
+    def executar(self, abas: List[str], expressao: str) -> Dict[str, Tuple[float, Any]]:
+        """Avalia `expressao` (pode ser uma Promise) em todas as abas.
+
+        Retorna {aba: (duração em segundos, valor)}; o valor é a exceção quando a
+        aba falhou, e abas sem target correspondente ficam de fora.
+        """
+        alvos = self.alvos()
+        faltando = [aba for aba in abas if aba not in alvos]
+        if faltando:
+            logger.warning(f"{len(faltando)} abas sem target no DevTools")
+        timeout = limitar_timeout(self.timeout, "extrair as abas em paralelo")
+        return asyncio.run(self._executar_todos(
+            {aba: alvos[aba] for aba in abas if aba in alvos}, expressao, timeout
+        ))
+
+    async def _executar_todos(self, alvos: Dict[str, str], expressao: str, timeout: float):
+        vagas = asyncio.Semaphore(self.max_alvos)
+        # Um prazo para a varredura inteira: quem espera vaga recebe só o que sobrou dele
+        prazo = time.monotonic() + timeout
+
+        async def executar_alvo(aba: str, url_ws: str):
+            async with vagas:
+                inicio = time.perf_counter()
+                sobra = prazo - time.monotonic()
+                try:
+                    if sobra <= 0:
+                        raise asyncio.TimeoutError(f"prazo da varredura esgotado antes da aba {aba}")
+                    valor = await asyncio.wait_for(self._avaliar(url_ws, expressao, sobra), sobra)
+                except Exception as e:
+                    valor = e
+                return aba, (time.perf_counter() - inicio, valor)
+
+        resultados = await asyncio.gather(*(executar_alvo(aba, url_ws) for aba, url_ws in alvos.items()))
+        return dict(resultados)
+
+    async def _avaliar(self, url_ws: str, expressao: str, timeout: float) -> Any:
+        async with connect(url_ws, max_size=None, open_timeout=timeout) as ws:
+            await self._comando(ws, "Emulation.setFocusEmulationEnabled", {"enabled": True})
+            try:
+                await self._comando(ws, "Page.setWebLifecycleState", {"state": "active"})
+            except ErroCDP:
+                pass  # Recusado quando a aba já está ativa
+            resposta = await self._comando(ws, "Runtime.evaluate", {
+                "expression": expressao,
+                "returnByValue": True,
+                "awaitPromise": True,
+                "timeout": int(timeout * 1000),
+            })
+            if "exceptionDetails" in resposta:
+                detalhes = resposta["exceptionDetails"]
+                raise ErroCDP(detalhes.get("exception", {}).get("description") or detalhes.get("text"))
+            return resposta["result"].get("value")
+
+    async def _comando(self, ws, metodo: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        identificador = next(self._ids)
+        await ws.send(json.dumps({"id": identificador, "method": metodo, "params": parametros}))
+        async for mensagem in ws:
+            resposta = json.loads(mensagem)
+            if resposta.get("id") != identificador:
+                continue  # Eventos do target, não interessam aqui
+            if "error" in resposta:
+                raise ErroCDP(f"{metodo}: {resposta['error'].get('message')}")
+            return resposta.get("result", {})
+        raise ErroCDP(f"{metodo}: conexão fechada sem resposta")
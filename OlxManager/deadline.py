@@ -0,0 +1,84 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExcedido(Exception):
+    """O orçamento de tempo do trabalho atual acabou antes da chamada"""
+
+
+class Orcamento:
+    """Prazo absoluto de um trabalho; um orçamento aninhado nunca passa do prazo do pai"""
+
+    def __init__(self, nome: str, segundos: float, pai: Optional["Orcamento"] = None):
+        self.nome = nome
+        self.segundos = segundos
+        self.inicio = time.monotonic()
+        self.limite = self.inicio + segundos
+        if pai is not None:
+            self.limite = min(self.limite, pai.limite)
+
+    def restante(self) -> float:
+        return self.limite - time.monotonic()
+
+    def esgotado(self) -> bool:
+        return self.restante() <= 0
+
+
+_atual: ContextVar[Optional[Orcamento]] = ContextVar("orcamento", default=None)
+
+
+@contextmanager
+def orcamento(nome: str, segundos: float) -> Iterator[Orcamento]:
+    """Define o orçamento de tempo do bloco para todas as chamadas feitas dentro dele.
+
+    Ao sair, registra no log se o bloco passou do prazo e por quanto.
+    """
+    atual = Orcamento(nome, segundos, _atual.get())
+    token = _atual.set(atual)
+    try:
+        yield atual
+    finally:
+        _atual.reset(token)
+        excesso = time.monotonic() - atual.limite
+        if excesso > 0:
+            logger.warning(f"'{nome}' excedeu o prazo em {excesso:.1f}s (orçamento de {segundos}s, duração {time.monotonic() - atual.inicio:.1f}s)")
+
+
+def atual() -> Optional[Orcamento]:
+    return _atual.get()
+
+
+def restante() -> Optional[float]:
+    """Segundos que restam no orçamento atual, ou None fora de um orçamento"""
+    orcamento_atual = _atual.get()
+    return orcamento_atual.restante() if orcamento_atual else None
+
+
+def verificar(descricao: str) -> None:
+    """Levanta DeadlineExcedido se o orçamento atual já acabou"""
+    orcamento_atual = _atual.get()
+    if orcamento_atual is not None and orcamento_atual.esgotado():
+        raise DeadlineExcedido(f"Prazo de '{orcamento_atual.nome}' esgotado antes de {descricao}")
+
+
+def limitar_timeout(timeout: Optional[float], descricao: str = "a chamada") -> Optional[float]:
+    """Limita o timeout de uma chamada ao que resta do orçamento.
+
+    Levanta DeadlineExcedido se não resta nada, em vez de fazer a chamada.
+    """
+    orcamento_atual = _atual.get()
+    if orcamento_atual is None:
+        return timeout
+    sobra = orcamento_atual.restante()
+    if sobra <= 0:
+        raise DeadlineExcedido(f"Prazo de '{orcamento_atual.nome}' esgotado antes de {descricao}")
+    if timeout is None:
+        return sobra
+    # requests aceita (conexão, leitura); os dois são limitados
+    if isinstance(timeout, tuple):
+        return tuple(min(valor, sobra) if valor is not None else sobra for valor in timeout)
+    return min(timeout, sobra)
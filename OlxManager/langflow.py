@@ -1,16 +1,19 @@
 import logging
-import time
-import requests
 import uuid
 from typing import Optional
 
 from config import URLS, CREDENTIALS
+from .transport import HTTPTransport
+from .resilience import FalhaTransitoria, circuitos, criar_politica
 
 logger = logging.getLogger(__name__)
 
 class LangflowManager:
-    def __init__(self):
+    def __init__(self, transport: Optional[HTTPTransport] = None):
         self.langflow_url = URLS["Langflow_URL"].replace("/predict/", "/run/")
+        self.transport = transport or HTTPTransport()
+        self.politica = criar_politica("langflow")
+        self.politica_api = criar_politica("api")
         logger.info(f"Langflow URL configurada: {self.langflow_url}")
 
     def obter_resposta(self, mensagem: str, anuncio_id: str, session_id: Optional[str] = None) -> Optional[str]:
@@ -32,12 +35,17 @@ class LangflowManager:
         try:
             # Buscar informações do anúncio
             logger.info(f"Buscando informações do anúncio {anuncio_id}")
-            response = requests.get(
-                f"{URLS['api']}/info-anuncio",
-                params={
-                    "email": CREDENTIALS["username"],
-                    "anuncio_id": anuncio_id
-                },
+            response = self.politica_api.executar(
+                lambda timeout: self.transport.get(
+                    f"{URLS['api']}/info-anuncio",
+                    params={
+                        "email": CREDENTIALS["username"],
+                        "anuncio_id": anuncio_id
+                    },
+                    timeout=timeout
+                ),
+                "buscar informações do anúncio",
+                circuitos.obter(f"{URLS['api']}/info-anuncio"),
                 timeout=10
             )
             
@@ -75,90 +83,75 @@ class LangflowManager:
                 }
             }
             
-            max_tentativas = 3
-            tempo_espera_base = 5  # Tempo base de espera em segundos
-            
-            for tentativa in range(max_tentativas):
-                try:
-                    response = requests.post(
-                        self.langflow_url, 
-                        json=payload,
-                        timeout=30,
-                        headers={
-                            "Content-Type": "application/json",
-                            "Accept": "application/json"
-                        }
-                    )
+            def tentar(timeout):
+                response = self.transport.post(
+                    self.langflow_url, 
+                    json=payload,
+                    timeout=timeout,
+                    headers={
+                        "Content-Type": "application/json",
+                        "Accept": "application/json"
+                    }
+                )
+                if response.status_code == 429:  # Rate limit: o backoff exponencial da política cuida da espera
+                    raise FalhaTransitoria("rate limit atingido")
+                if response.status_code != 200:
+                    raise FalhaTransitoria(f"status {response.status_code}: {response.text}")
+                return response.json()
 
-                    if response.status_code == 200:
-                        resposta_json = response.json()
-                        logger.debug(f"Resposta completa do Langflow: {resposta_json}")
-                        
-                        # Extração robusta da mensagem de resposta
-                        try:
-                            # Caminho principal baseado na estrutura do JSON fornecido
-                            if 'outputs' in resposta_json:
-                                for output in resposta_json['outputs']:
-                                    if 'outputs' in output:
-                                        for sub_output in output['outputs']:
-                                            if 'results' in sub_output:
-                                                results = sub_output['results']
-                                                if 'message' in results:
-                                                    message_data = results['message']
-                                                    if isinstance(message_data, dict):
-                                                        # Tenta obter o texto da resposta em vários caminhos possíveis
-                                                        if 'data' in message_data and 'text' in message_data['data']:
-                                                            return message_data['data']['text']
-                                                        elif 'text' in message_data:
-                                                            return message_data['text']
-                                                        elif 'message' in message_data:
-                                                            return message_data['message']
-                            
-                            # Fallback para caminhos alternativos
-                            if 'message' in resposta_json:
-                                if isinstance(resposta_json['message'], dict):
-                                    if 'text' in resposta_json['message']:
-                                        return resposta_json['message']['text']
-                                    elif 'data' in resposta_json['message'] and 'text' in resposta_json['message']['data']:
-                                        return resposta_json['message']['data']['text']
-                                elif isinstance(resposta_json['message'], str):
-                                    return resposta_json['message']
-                            
-                            # Último fallback: procura em toda a estrutura por um campo 'text'
-                            if 'text' in resposta_json:
-                                return resposta_json['text']
-                            
-                        except (KeyError, TypeError) as e:
-                            logger.warning(f"Erro ao extrair resposta: {e}")
-                        
-                        logger.warning("Nenhuma resposta válida encontrada no JSON retornado")
-                        return None
-                    elif response.status_code == 429:  # Rate limit
-                        tempo_espera = tempo_espera_base * (2 ** tentativa)  # Backoff exponencial
-                        logger.warning(f"Rate limit atingido. Aguardando {tempo_espera} segundos antes da próxima tentativa...")
-                        time.sleep(tempo_espera)
-                        continue
-                    else:
-                        logger.error(f"Erro na requisição ao Langflow (status {response.status_code}): {response.text}")
-                        if tentativa < max_tentativas - 1:
-                            time.sleep(tempo_espera_base)
-                        continue
-                        
-                except requests.exceptions.Timeout:
-                    logger.error(f"Timeout na tentativa {tentativa + 1}")
-                    if tentativa < max_tentativas - 1:
-                        time.sleep(tempo_espera_base)
-                except requests.exceptions.ConnectionError:
-                    logger.error(f"Erro de conexão na tentativa {tentativa + 1}")
-                    if tentativa < max_tentativas - 1:
-                        time.sleep(tempo_espera_base)
-                except Exception as e:
-                    logger.error(f"Erro inesperado na tentativa {tentativa + 1}: {e}")
-                    if tentativa < max_tentativas - 1:
-                        time.sleep(tempo_espera_base)
-            
-            return None
+            try:
+                resposta_json = self.politica.executar(
+                    tentar, "obter resposta do Langflow", circuitos.obter(self.langflow_url), timeout=30
+                )
+            except Exception as e:
+                logger.error(f"Erro na requisição ao Langflow: {e}")
+                return None
+
+            logger.debug(f"Resposta completa do Langflow: {resposta_json}")
+            return self._extrair_texto(resposta_json)
                 
         except Exception as e:
             logger.error(f"Erro inesperado ao obter resposta do Langflow: {e}")
-            return None 
\ No newline at end of file
+            return None
+
+    def _extrair_texto(self, resposta_json: dict) -> Optional[str]:
+        """Extrai o texto da resposta do Langflow"""
+        # Extração robusta da mensagem de resposta
+        try:
+            # Caminho principal baseado na estrutura do JSON fornecido
+            if 'outputs' in resposta_json:
+                for output in resposta_json['outputs']:
+                    if 'outputs' in output:
+                        for sub_output in output['outputs']:
+                            if 'results' in sub_output:
+                                results = sub_output['results']
+                                if 'message' in results:
+                                    message_data = results['message']
+                                    if isinstance(message_data, dict):
+                                        # Tenta obter o texto da resposta em vários caminhos possíveis
+                                        if 'data' in message_data and 'text' in message_data['data']:
+                                            return message_data['data']['text']
+                                        elif 'text' in message_data:
+                                            return message_data['text']
+                                        elif 'message' in message_data:
+                                            return message_data['message']
+            
+            # Fallback para caminhos alternativos
+            if 'message' in resposta_json:
+                if isinstance(resposta_json['message'], dict):
+                    if 'text' in resposta_json['message']:
+                        return resposta_json['message']['text']
+                    elif 'data' in resposta_json['message'] and 'text' in resposta_json['message']['data']:
+                        return resposta_json['message']['data']['text']
+                elif isinstance(resposta_json['message'], str):
+                    return resposta_json['message']
+            
+            # Último fallback: procura em toda a estrutura por um campo 'text'
+            if 'text' in resposta_json:
+                return resposta_json['text']
+            
+        except (KeyError, TypeError) as e:
+            logger.warning(f"Erro ao extrair resposta: {e}")
+        
+        logger.warning("Nenhuma resposta válida encontrada no JSON retornado")
+        return None
@@ -12,7 +12,41 @@ class MetricsManager:
             'erros': 0,
             'inicio_execucao': None,
             'ultima_verificacao': None,
-            'tempo_total_execucao': 0
+            'tempo_total_execucao': 0,
+            'http_requisicoes': 0,
+            'http_conexoes_abertas': 0,
+            'http_reuso_conexoes': 0.0,
+            'circuitos_abertos': 0,
+            'circuito_aberturas': 0,
+            'estado_circuitos': {},
+            'outbox_pendentes': 0,
+            'outbox_lag_segundos': 0.0,
+            'outbox_enviados': 0,
+            'outbox_falhas': 0,
+            'filtro_consultas': 0,
+            'filtro_consultas_evitadas': 0,
+            'filtro_taxa_fp_estimada': 0.0,
+            'filtro_taxa_fp_auditada': 0.0,
+            'abas_extraidas': 0,
+            'extracao_aba_media_ms': 0.0,
+            'extracao_aba_max_ms': 0.0,
+            'esperas': {},
+            'perfil_navegador': None,
+            'carregamento_aba_medio_ms': 0.0,
+            'memoria_aba_media_mb': 0.0,
+            'sessao_reutilizada': None,
+            'tempo_ate_primeira_extracao_s': 0.0,
+            'pool_abas_abertas': 0,
+            'pool_abas_ocupacao': 0.0,
+            'pool_abas_despejos': 0,
+            'pool_abas_reaberturas': 0,
+            'abas_visitadas_ciclo': 0,
+            'caixa_entrada_conversas': 0,
+            'caixa_entrada_nao_lidas': 0,
+            'captura_rede_mensagens': 0,
+            'captura_rede_descartadas': 0,
+            'navegadores_vivos': 0,
+            'navegadores_reatribuicoes': 0
         }
         logger.info("Métricas inicializadas")
 
@@ -31,6 +65,24 @@ class MetricsManager:
         except Exception as e:
             logger.error(f"Erro ao atualizar métricas: {e}")
 
+    def definir(self, tipo: str, valor: Any) -> None:
+        """Define o valor de uma métrica sem acumular (para medidas instantâneas)"""
+        if tipo in self.metricas:
+            self.metricas[tipo] = valor
+            logger.debug(f"Métrica '{tipo}' definida para {valor}")
+        else:
+            logger.warning(f"Tipo de métrica desconhecido: {tipo}")
+
+    def registrar_mudanca_circuito(self, nome: str, anterior: str, novo: str) -> None:
+        """Observador dos circuit breakers: conta aberturas e guarda o estado de cada circuito"""
+        estados = dict(self.metricas['estado_circuitos'])
+        estados[nome] = novo
+        self.metricas['estado_circuitos'] = estados
+        self.metricas['circuitos_abertos'] = sum(1 for estado in estados.values() if estado == 'aberto')
+        if novo == 'aberto':
+            self.metricas['circuito_aberturas'] += 1
+        logger.debug(f"Circuito '{nome}' mudou de {anterior} para {novo}")
+
     def log(self) -> None:
         """Registra as métricas atuais"""
         try:
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+class Outbox:
+    """Fila local e durável (SQLite) das abas extraídas pelo navegador.
+
+    O navegador só grava aqui; o OutboxFlusher envia os itens para a API em lote
+    e apaga os que a API confirmou. Um item só sai da fila depois da confirmação,
+    então uma queda da API ou do scraper no meio do envio apenas faz o item ser
+    reenviado (a API deduplica pela chave do item e pelo conteúdo das mensagens).
+    """
+
+    def __init__(self, caminho: str = "outbox.db"):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(caminho, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                chave TEXT NOT NULL UNIQUE,
+                anuncio_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pendente' CHECK(status IN ('pendente', 'falhou'))
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, seq);
+
+            -- Impressão do último conteúdo registrado por anúncio, para não
+            -- enfileirar de novo uma aba que não mudou desde o último ciclo
+            CREATE TABLE IF NOT EXISTS outbox_impressoes (
+                anuncio_id TEXT PRIMARY KEY,
+                impressao TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+        logger.info(f"Outbox aberto em {caminho} ({self.estatisticas()['pendentes']} itens pendentes)")
+
+    def registrar(self, dados: Dict[str, Any]) -> bool:
+        """Grava a aba extraída na fila; retorna False se ela não mudou desde o último registro"""
+        payload = json.dumps(dados, ensure_ascii=False, sort_keys=True)
+        impressao = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        anuncio_id = dados["anuncio_id"]
+
+        with self._lock:
+            atual = self.conn.execute(
+                "SELECT impressao FROM outbox_impressoes WHERE anuncio_id = ?", (anuncio_id,)
+            ).fetchone()
+            if atual and atual[0] == impressao:
+                return False
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO outbox (chave, anuncio_id, payload, criado_em) VALUES (?, ?, ?, ?)",
+                    (str(uuid.uuid4()), anuncio_id, payload, time.time())
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO outbox_impressoes (anuncio_id, impressao) VALUES (?, ?)",
+                    (anuncio_id, impressao)
+                )
+        logger.debug(f"Aba do anúncio {anuncio_id} registrada no outbox")
+        return True
+
+    def pendentes(self, limite: int) -> List[Dict[str, Any]]:
+        """Retorna os itens mais antigos ainda não confirmados, em ordem de chegada"""
+        with self._lock:
+            linhas = self.conn.execute(
+                "SELECT seq, chave, payload, tentativas FROM outbox WHERE status = 'pendente' ORDER BY seq LIMIT ?",
+                (limite,)
+            ).fetchall()
+        itens = []
+        for seq, chave, payload, tentativas in linhas:
+            item = json.loads(payload)
+            item["chave"] = chave
+            itens.append({"seq": seq, "tentativas": tentativas, "item": item})
+        return itens
+
+    def confirmar(self, seqs: List[int]) -> None:
+        """Remove da fila os itens que a API confirmou"""
+        if not seqs:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM outbox WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def registrar_falha(self, seq: int, anuncio_id: str, max_tentativas: int) -> None:
+        """Conta uma falha do item; depois de `max_tentativas` ele sai da fila e fica marcado como falhou"""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE outbox SET tentativas = tentativas + 1 WHERE seq = ?", (seq,))
+            tentativas = self.conn.execute("SELECT tentativas FROM outbox WHERE seq = ?", (seq,)).fetchone()
+            if tentativas and tentativas[0] >= max_tentativas:
+                self.conn.execute("UPDATE outbox SET status = 'falhou' WHERE seq = ?", (seq,))
+                # Esquece a impressão para que a próxima extração da aba volte para a fila
+                self.conn.execute("DELETE FROM outbox_impressoes WHERE anuncio_id = ?", (anuncio_id,))
+                logger.error(f"Item {seq} do anúncio {anuncio_id} desistido após {tentativas[0]} tentativas")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Itens pendentes, idade do mais antigo (atraso do envio) e itens desistidos"""
+        with self._lock:
+            pendentes, mais_antigo = self.conn.execute(
+                "SELECT COUNT(*), MIN(criado_em) FROM outbox WHERE status = 'pendente'"
+            ).fetchone()
+            falhas = self.conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'falhou'").fetchone()[0]
+        return {
+            "pendentes": pendentes,
+            "lag_segundos": round(time.time() - mais_antigo, 1) if mais_antigo else 0.0,
+            "falhas": falhas,
+        }
+
+    def fechar(self):
+        with self._lock:
+            self.conn.close()
+
+
+class OutboxFlusher:
+    """Thread que envia o outbox para a API em lotes.
+
+    Com a API fora do ar os envios falham (ou o circuito recusa na hora) e a
+    thread espera com backoff; a extração continua gravando no outbox.
+    """
+
+    def __init__(self, outbox: Outbox, api, lote: int = 50, intervalo: float = 2, max_tentativas: int = 10, espera_max: float = 60):
+        self.outbox = outbox
+        self.api = api
+        self.lote = lote
+        self.intervalo = intervalo
+        self.max_tentativas = max_tentativas
+        self.espera_max = espera_max
+        self.enviados = 0
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name="outbox-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"Flusher do outbox iniciado (lote: {self.lote}, intervalo: {self.intervalo}s)")
+
+    def disparar(self):
+        """Pede um envio imediato, sem esperar o intervalo"""
+        self._acordar.set()
+
+    def parar(self, timeout: float = 10):
+        """Para a thread depois de uma última tentativa de envio"""
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _executar(self):
+        espera = self.intervalo
+        while True:
+            try:
+                enviados = self.enviar_lote()
+            except Exception as e:
+                logger.error(f"Erro no flusher do outbox: {e}")
+                enviados = None
+
+            if self._parar.is_set():
+                return
+            if enviados is None:
+                # Falha no lote inteiro: espera cada vez mais até a API voltar
+                espera = min(self.espera_max, espera * 2)
+            else:
+                espera = self.intervalo
+                if enviados == self.lote:
+                    continue  # Ainda há fila: envia o próximo lote sem esperar
+            self._acordar.wait(espera)
+            self._acordar.clear()
+
+    def enviar_lote(self):
+        """Envia um lote; retorna quantos itens foram confirmados ou None se o lote falhou"""
+        pendentes = self.outbox.pendentes(self.lote)
+        if not pendentes:
+            return 0
+
+        resultados = self.api.sincronizar_lote([p["item"] for p in pendentes])
+        if resultados is None:
+            return None
+
+        por_chave = {r.get("chave"): r for r in resultados}
+        confirmados = []
+        for pendente in pendentes:
+            item = pendente["item"]
+            resultado = por_chave.get(item["chave"])
+            if resultado and resultado.get("status") == "ok":
+                confirmados.append(pendente["seq"])
+            else:
+                self.outbox.registrar_falha(pendente["seq"], item["anuncio_id"], self.max_tentativas)
+
+        self.outbox.confirmar(confirmados)
+        self.enviados += len(confirmados)
+        if confirmados:
+            logger.info(f"Outbox: {len(confirmados)}/{len(pendentes)} itens enviados para a API")
+        return len(confirmados)
@@ -0,0 +1,152 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+class PoolAbas:
+    """Limita o número de abas de anúncios abertas no navegador.
+
+    Cada ciclo escolhe até `maximo` anúncios para ficar com aba aberta: primeiro
+    os que tiveram mensagem nova do vendedor dentro de `janela_atividade`
+    (mais recentes primeiro), depois os que estão há mais tempo sem extração,
+    para que todos passem pelo pool em rodízio. Abas fora da escolha são
+    fechadas da menos usada para a mais usada; um anúncio fechado volta a ser
+    aberto sob demanda pelo reabrir_anuncio. Com `maximo` 0 o pool não limita nada.
+    """
+
+    def __init__(self, browser, maximo: int = 20, janela_atividade: float = 3600):
+        self.browser = browser
+        self.maximo = maximo
+        self.janela_atividade = janela_atividade
+        self.links: List[str] = []
+        # handle -> link, da aba usada há mais tempo para a usada mais recentemente
+        self.abertas: "OrderedDict[str, str]" = OrderedDict()
+        self.anuncios: Dict[str, str] = {}  # anuncio_id -> link
+        self._ultima_atividade: Dict[str, float] = {}
+        self._ultima_extracao: Dict[str, float] = {}
+        self._impressoes: Dict[str, tuple] = {}
+        self.despejos = 0
+        self.reaberturas = 0
+
+    @property
+    def limitado(self) -> bool:
+        return self.maximo > 0
+
+    def definir_links(self, links: List[str]):
+        self.links = list(links)
+
+    def adicionar(self, aba: str, link: str):
+        self.abertas[aba] = link
+        self.abertas.move_to_end(aba)
+
+    def tocar(self, aba: str):
+        """Marca a aba como usada agora (fim da fila de despejo)"""
+        if aba in self.abertas:
+            self.abertas.move_to_end(aba)
+
+    def link_do_anuncio(self, anuncio_id: str) -> Optional[str]:
+        return self.anuncios.get(anuncio_id)
+
+    def observar_extracao(self, aba: str, dados: Dict[str, Any]):
+        """Registra a extração da aba e se o vendedor mandou mensagem nova desde a anterior"""
+        link = self.abertas.get(aba) or self.browser.urls_abas.get(aba)
+        if link is None:
+            return
+        self.tocar(aba)
+        self.anuncios[dados["anuncio_id"]] = link
+        self._ultima_extracao[link] = time.monotonic()
+
+        mensagens = dados["mensagens"]
+        impressao = (len(mensagens), mensagens[-1]["texto"] if mensagens else None)
+        anterior = self._impressoes.get(link)
+        self._impressoes[link] = impressao
+        if anterior is not None and impressao != anterior and mensagens and mensagens[-1]["tipo"] == "recebida":
+            self._ultima_atividade[link] = time.monotonic()
+
+    def _prioridade(self, link: str):
+        agora = time.monotonic()
+        atividade = self._ultima_atividade.get(link)
+        ativo = atividade is not None and agora - atividade <= self.janela_atividade
+        # Ativos antes (mais recente primeiro); depois quem está há mais tempo sem extração
+        return (0, -atividade) if ativo else (1, self._ultima_extracao.get(link, 0.0))
+
+    def preparar_ciclo(self) -> Dict[str, str]:
+        """Fecha as abas que saem do rodízio e abre as que entram; retorna {link: handle} abertos"""
+        if not self.limitado:
+            faltando = [link for link in self.links if link not in self.abertas.values()]
+            if faltando:
+                for link, aba in self.browser.abrir_anuncios_em_abas(faltando).items():
+                    self.adicionar(aba, link)
+            return {link: aba for aba, link in self.abertas.items()}
+
+        self._descartar_fechadas()
+        escolhidos = set(sorted(self.links, key=self._prioridade)[:self.maximo])
+
+        # Despeja da menos usada para a mais usada até caber a nova escolha
+        abertos = set(self.abertas.values())
+        faltando = [link for link in self.links if link in escolhidos and link not in abertos]
+        for aba, link in list(self.abertas.items()):
+            if len(self.abertas) + len(faltando) <= self.maximo:
+                break
+            if link not in escolhidos:
+                self._despejar(aba)
+
+        if faltando:
+            for link, aba in self.browser.abrir_anuncios_em_abas(faltando).items():
+                self.adicionar(aba, link)
+        logger.info(f"Pool de abas: {len(self.abertas)}/{self.maximo} abertas ({len(faltando)} entraram no rodízio)")
+        return {link: aba for aba, link in self.abertas.items()}
+
+    def garantir_vaga(self, manter: Optional[str] = None):
+        """Antes de abrir uma aba sob demanda, despeja a menos usada se o pool estiver cheio"""
+        if not self.limitado:
+            return
+        self._descartar_fechadas()
+        for aba in list(self.abertas):
+            if len(self.abertas) < self.maximo:
+                break
+            if aba != manter:
+                self._despejar(aba)
+
+    def registrar_reabertura(self, aba: str, link: str):
+        self.reaberturas += 1
+        self.adicionar(aba, link)
+
+    def _despejar(self, aba: str):
+        link = self.abertas.pop(aba)
+        driver = self.browser.driver
+        try:
+            atual = driver.current_window_handle
+            driver.switch_to.window(aba)
+            driver.close()
+            # A aba principal (favoritos) nunca está no pool
+            driver.switch_to.window(atual if atual != aba else driver.window_handles[0])
+        except WebDriverException as e:
+            logger.warning(f"Erro ao fechar a aba de {link}: {e}")
+        self.browser.urls_abas.pop(aba, None)
+        if self.browser.captura:
+            self.browser.captura.esquecer(aba)
+        for anuncio_id, handle in list(self.browser.abas_anuncios.items()):
+            if handle == aba:
+                del self.browser.abas_anuncios[anuncio_id]
+        self.despejos += 1
+        logger.debug(f"Aba de {link} despejada do pool")
+
+    def _descartar_fechadas(self):
+        """Esquece abas que o navegador fechou por conta própria"""
+        vivas = set(self.browser.driver.window_handles)
+        for aba in [aba for aba in self.abertas if aba not in vivas]:
+            del self.abertas[aba]
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "abertas": len(self.abertas),
+            "maximo": self.maximo,
+            "ocupacao": round(len(self.abertas) / self.maximo, 2) if self.limitado else 1.0,
+            "despejos": self.despejos,
+            "reaberturas": self.reaberturas,
+        }
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from config import PRONTIDAO, TIMEOUTS
+from .deadline import limitar_timeout
+from .captura_rede import LogDesempenho
+
+logger = logging.getLogger(__name__)
+
+# Requisições que ficam abertas indefinidamente e nunca deixariam a rede ociosa
+TIPOS_IGNORADOS = {"WebSocket", "EventSource"}
+
+class Prontidao:
+    """Esperas por condições explícitas do navegador, no lugar de pausas fixas.
+
+    Toda espera tem timeout (limitado ao orçamento de tempo atual) e é
+    registrada pelo nome do ponto de chamada, para mostrar onde o ciclo
+    gasta tempo esperando.
+    """
+
+    def __init__(self, obter_driver: Callable[[], Any], intervalo: float = 0.1, log: Optional[LogDesempenho] = None):
+        self.obter_driver = obter_driver
+        self.intervalo = intervalo
+        # Log de performance (eventos Network do CDP); desligado se o driver não tiver
+        self.log = log or LogDesempenho(obter_driver)
+        self._eventos = self.log.assinar()
+        self.log_rede = True
+        self._tempos: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def esperar(self, ponto: str, condicao: Callable[[Any], Any], timeout: Optional[float] = None,
+                obrigatorio: bool = True) -> Any:
+        """Espera `condicao(driver)` ser verdadeira.
+
+        Se `obrigatorio`, um timeout levanta TimeoutException; senão a espera
+        retorna None e o chamador segue em frente.
+        """
+        timeout = limitar_timeout(timeout or TIMEOUTS["element_wait"], f"esperar {ponto}")
+        inicio = time.perf_counter()
+        try:
+            resultado = WebDriverWait(self.obter_driver(), timeout, poll_frequency=self.intervalo).until(condicao)
+        except TimeoutException:
+            self._registrar(ponto, time.perf_counter() - inicio, esgotou=True)
+            if obrigatorio:
+                raise
+            logger.debug(f"Espera '{ponto}' esgotou {timeout:.1f}s; seguindo")
+            return None
+        self._registrar(ponto, time.perf_counter() - inicio)
+        return resultado
+
+    def documento_pronto(self, ponto: str, timeout: Optional[float] = None) -> bool:
+        """Espera document.readyState == 'complete' na aba atual"""
+        return bool(self.esperar(
+            ponto,
+            lambda driver: driver.execute_script("return document.readyState") == "complete",
+            timeout,
+            obrigatorio=False
+        ))
+
+    def rede_ociosa(self, ponto: str, ociosidade: Optional[float] = None, timeout: Optional[float] = None) -> bool:
+        """Espera a aba atual ficar `ociosidade` segundos sem requisições em andamento.
+
+        Usa os eventos Network do CDP (log de performance do ChromeDriver); sem
+        eles, considera ociosa a página cuja lista de recursos carregados parou
+        de crescer.
+        """
+        ociosidade = PRONTIDAO["ociosidade_rede"] if ociosidade is None else ociosidade
+        pendentes: Set[str] = set()
+        estado = {"ultima_atividade": time.monotonic(), "recursos": -1}
+
+        def condicao(driver):
+            if self.log_rede:
+                try:
+                    self.log.bombear()
+                    atividade = self._consumir_eventos_rede(pendentes)
+                except WebDriverException as e:
+                    logger.info(f"Log de performance indisponível, usando a Resource Timing API: {e}")
+                    self.log_rede = False
+                    atividade = True
+            else:
+                recursos = driver.execute_script(
+                    "return document.readyState === 'complete' ? performance.getEntriesByType('resource').length : -1"
+                )
+                atividade = recursos < 0 or recursos != estado["recursos"]
+                estado["recursos"] = recursos
+            agora = time.monotonic()
+            if atividade:
+                estado["ultima_atividade"] = agora
+            return not pendentes and agora - estado["ultima_atividade"] >= ociosidade
+
+        return bool(self.esperar(ponto, condicao, timeout or PRONTIDAO["timeout_rede"], obrigatorio=False))
+
+    def _consumir_eventos_rede(self, pendentes: Set[str]) -> bool:
+        """Atualiza as requisições em andamento; retorna True se houve atividade de rede"""
+        atividade = False
+        while self._eventos:
+            mensagem = self._eventos.popleft()
+            metodo = mensagem.get("method", "")
+            parametros = mensagem.get("params", {})
+            if metodo == "Network.requestWillBeSent":
+                if parametros.get("type") not in TIPOS_IGNORADOS:
+                    pendentes.add(parametros["requestId"])
+            elif metodo in ("Network.loadingFinished", "Network.loadingFailed"):
+                pendentes.discard(parametros["requestId"])
+            else:
+                continue
+            atividade = True
+        return atividade
+
+    def elemento(self, ponto: str, condicao, timeout: Optional[float] = None):
+        """Espera uma expected_condition do Selenium (elemento presente, clicável...)"""
+        return self.esperar(ponto, condicao, timeout)
+
+    def contagem_muda(self, ponto: str, seletor: str, anterior: int, timeout: Optional[float] = None) -> bool:
+        """Espera o número de elementos de `seletor` ficar diferente de `anterior`"""
+        return bool(self.esperar(
+            ponto,
+            lambda driver: driver.execute_script("return document.querySelectorAll(arguments[0]).length", seletor) != anterior,
+            timeout,
+            obrigatorio=False
+        ))
+
+    def nova_aba(self, ponto: str, antes: Set[str], timeout: Optional[float] = None) -> str:
+        """Espera surgir um handle fora de `antes` e o retorna"""
+        def condicao(driver):
+            novas = [handle for handle in driver.window_handles if handle not in antes]
+            return novas[-1] if novas else False
+        return self.esperar(ponto, condicao, timeout)
+
+    def _registrar(self, ponto: str, duracao: float, esgotou: bool = False):
+        with self._lock:
+            tempos = self._tempos.setdefault(ponto, {"chamadas": 0, "total_s": 0.0, "max_s": 0.0, "timeouts": 0})
+            tempos["chamadas"] += 1
+            tempos["total_s"] += duracao
+            tempos["max_s"] = max(tempos["max_s"], duracao)
+            if esgotou:
+                tempos["timeouts"] += 1
+
+    def estatisticas(self) -> Dict[str, Dict[str, float]]:
+        """Tempo gasto esperando por ponto de chamada: chamadas, total, máximo e timeouts"""
+        with self._lock:
+            return {
+                ponto: {**tempos, "total_s": round(tempos["total_s"], 2), "max_s": round(tempos["max_s"], 2)}
+                for ponto, tempos in self._tempos.items()
+            }
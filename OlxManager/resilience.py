@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import RESILIENCIA
+from .deadline import DeadlineExcedido, restante, verificar
+
+logger = logging.getLogger(__name__)
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+class CircuitOpenError(Exception):
+    """Chamada recusada sem tentativa porque o circuito do endpoint está aberto"""
+
+    def __init__(self, nome: str, restante: float):
+        super().__init__(f"Circuito '{nome}' aberto (nova tentativa em {restante:.0f}s)")
+        self.nome = nome
+        self.restante = restante
+
+
+class FalhaTransitoria(Exception):
+    """Falha que vale uma nova tentativa (status 5xx, 429, aba não encontrada...)"""
+
+
+class TentativasEsgotadas(Exception):
+    """Todas as tentativas falharam ou o prazo da chamada acabou"""
+
+
+class CircuitBreaker:
+    """Circuit breaker de um endpoint.
+
+    Depois de `limite_falhas` falhas seguidas o circuito abre e as chamadas
+    falham na hora com CircuitOpenError. Passado `tempo_aberto`, uma única
+    chamada de teste é liberada (meio aberto): sucesso fecha o circuito,
+    falha abre de novo.
+    """
+
+    def __init__(self, nome: str, limite_falhas: int = 5, tempo_aberto: float = 30,
+                 observadores: Optional[List[Callable[[str, str, str], None]]] = None):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.observadores = observadores if observadores is not None else []
+        self.estado = FECHADO
+        self.falhas = 0
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def antes(self):
+        """Libera a chamada ou levanta CircuitOpenError"""
+        with self._lock:
+            if self.estado == FECHADO:
+                return
+            decorrido = time.monotonic() - self._aberto_em
+            if self.estado == ABERTO and decorrido >= self.tempo_aberto:
+                self._mudar_estado(MEIO_ABERTO)
+            if self.estado == MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return
+            raise CircuitOpenError(self.nome, max(0.0, self.tempo_aberto - decorrido))
+
+    def liberar_teste(self):
+        """Devolve a chamada de teste do meio aberto sem contar sucesso nem falha"""
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self._teste_em_andamento = False
+            if self.estado != FECHADO:
+                self._mudar_estado(FECHADO)
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._teste_em_andamento = False
+            if self.estado == MEIO_ABERTO or (self.estado == FECHADO and self.falhas >= self.limite_falhas):
+                self._aberto_em = time.monotonic()
+                self._mudar_estado(ABERTO)
+
+    def _mudar_estado(self, novo: str):
+        anterior, self.estado = self.estado, novo
+        nivel = logging.WARNING if novo == ABERTO else logging.INFO
+        logger.log(nivel, f"Circuito '{self.nome}': {anterior} -> {novo}")
+        for observador in self.observadores:
+            try:
+                observador(self.nome, anterior, novo)
+            except Exception as e:
+                logger.error(f"Erro ao notificar mudança do circuito '{self.nome}': {e}")
+
+
+class RegistroCircuitos:
+    """Um CircuitBreaker por endpoint, criado na primeira chamada"""
+
+    def __init__(self, limite_falhas: int = 5, tempo_aberto: float = 30):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.observadores: List[Callable[[str, str, str], None]] = []
+        self._circuitos: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def obter(self, nome: str) -> CircuitBreaker:
+        with self._lock:
+            if nome not in self._circuitos:
+                self._circuitos[nome] = CircuitBreaker(
+                    nome, self.limite_falhas, self.tempo_aberto, self.observadores
+                )
+            return self._circuitos[nome]
+
+    def observar(self, observador: Callable[[str, str, str], None]):
+        """Registra uma função chamada com (nome, estado_anterior, estado_novo)"""
+        self.observadores.append(observador)
+
+    def estados(self) -> Dict[str, str]:
+        with self._lock:
+            return {nome: circuito.estado for nome, circuito in self._circuitos.items()}
+
+
+class RetryPolicy:
+    """Novas tentativas com backoff exponencial, jitter e prazo total por chamada.
+
+    A espera da tentativa n é sorteada entre `espera * (1 - jitter)` e `espera`,
+    com `espera = min(espera_max, espera_base * 2 ** n)`. Nenhuma espera
+    ultrapassa o prazo: quando ele acaba a chamada desiste na hora.
+    """
+
+    def __init__(self, max_tentativas: int = 3, espera_base: float = 1.0, espera_max: float = 30.0,
+                 jitter: float = 0.5, prazo: Optional[float] = None):
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.jitter = jitter
+        self.prazo = prazo
+
+    def calcular_espera(self, tentativa: int) -> float:
+        espera = min(self.espera_max, self.espera_base * (2 ** tentativa))
+        return espera * (1 - self.jitter * random.random())
+
+    def _timeout(self, timeout: Optional[float], limite: Optional[float]) -> Optional[float]:
+        if limite is None:
+            return timeout
+        restante = max(0.1, limite - time.monotonic())
+        return restante if timeout is None else min(timeout, restante)
+
+    def _antes_da_tentativa(self, descricao: str, circuito: Optional[CircuitBreaker],
+                            timeout: Optional[float], limite: Optional[float]) -> tuple:
+        """Confere orçamento e circuito; retorna os argumentos da tentativa"""
+        verificar(descricao)
+        if circuito:
+            circuito.antes()
+        return () if timeout is None else (self._timeout(timeout, limite),)
+
+    def _classificar_falha(self, erro: Exception, tentativa: int, descricao: str,
+                           circuito: Optional[CircuitBreaker]) -> Exception:
+        """Relança o que não deve ser repetido; senão registra a falha e a retorna"""
+        if isinstance(erro, CircuitOpenError):
+            raise erro
+        if isinstance(erro, DeadlineExcedido):
+            # Prazo do trabalho esgotado não conta como falha do endpoint
+            if circuito:
+                circuito.liberar_teste()
+            raise erro
+        sobra = restante()
+        if sobra is not None and sobra <= 0:
+            # O timeout foi cortado pelo orçamento: a culpa não é do endpoint
+            if circuito:
+                circuito.liberar_teste()
+            raise DeadlineExcedido(f"Prazo esgotado durante {descricao}: {erro}") from erro
+        if circuito:
+            circuito.registrar_falha()
+        logger.warning(f"Falha ao {descricao} (tentativa {tentativa + 1}/{self.max_tentativas}): {erro}")
+        return erro
+
+    def _proxima_espera(self, tentativa: int, descricao: str, limite: Optional[float]) -> Optional[float]:
+        """Espera antes da próxima tentativa, ou None se não cabe mais nenhuma"""
+        if tentativa == self.max_tentativas - 1:
+            return None
+        espera = self.calcular_espera(tentativa)
+        if limite is not None and time.monotonic() + espera >= limite:
+            logger.warning(f"Prazo de {self.prazo}s esgotado ao {descricao}")
+            return None
+        sobra = restante()
+        if sobra is not None and espera >= sobra:
+            logger.warning(f"Orçamento do trabalho atual não comporta nova tentativa de {descricao}")
+            return None
+        return espera
+
+    def executar(self, funcao: Callable[..., Any], descricao: str,
+                 circuito: Optional[CircuitBreaker] = None, timeout: Optional[float] = None) -> Any:
+        """Executa `funcao` até ter sucesso, esgotar as tentativas ou o prazo.
+
+        Se `timeout` for informado, `funcao` o recebe como argumento, já limitado
+        ao tempo que resta do prazo. CircuitOpenError e DeadlineExcedido (orçamento
+        do trabalho atual esgotado) não são repetidos.
+        """
+        limite = time.monotonic() + self.prazo if self.prazo else None
+        ultima_falha: Optional[Exception] = None
+
+        for tentativa in range(self.max_tentativas):
+            argumentos = self._antes_da_tentativa(descricao, circuito, timeout, limite)
+            try:
+                resultado = funcao(*argumentos)
+            except Exception as e:
+                ultima_falha = self._classificar_falha(e, tentativa, descricao, circuito)
+            else:
+                if circuito:
+                    circuito.registrar_sucesso()
+                return resultado
+
+            espera = self._proxima_espera(tentativa, descricao, limite)
+            if espera is None:
+                break
+            time.sleep(espera)
+
+        raise TentativasEsgotadas(f"Não foi possível {descricao}: {ultima_falha}") from ultima_falha
+
+    async def executar_async(self, funcao: Callable[..., Awaitable], descricao: str,
+                             circuito: Optional[CircuitBreaker] = None, timeout: Optional[float] = None) -> Any:
+        """Versão asyncio de `executar`: só a espera entre tentativas muda"""
+        limite = time.monotonic() + self.prazo if self.prazo else None
+        ultima_falha: Optional[Exception] = None
+
+        for tentativa in range(self.max_tentativas):
+            argumentos = self._antes_da_tentativa(descricao, circuito, timeout, limite)
+            try:
+                resultado = await funcao(*argumentos)
+            except Exception as e:
+                ultima_falha = self._classificar_falha(e, tentativa, descricao, circuito)
+            else:
+                if circuito:
+                    circuito.registrar_sucesso()
+                return resultado
+
+            espera = self._proxima_espera(tentativa, descricao, limite)
+            if espera is None:
+                break
+            await asyncio.sleep(espera)
+
+        raise TentativasEsgotadas(f"Não foi possível {descricao}: {ultima_falha}") from ultima_falha
+
+
+def criar_politica(nome: str) -> RetryPolicy:
+    """Cria a RetryPolicy configurada em RESILIENCIA['politicas'][nome]"""
+    return RetryPolicy(**RESILIENCIA["politicas"][nome])
+
+
+# Circuitos compartilhados por todos os componentes do processo
+circuitos = RegistroCircuitos(**RESILIENCIA["circuito"])
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from datetime import datetime
 from typing import Optional
@@ -5,13 +6,22 @@ import uuid
 import requests
 import time
 import os
+import socket
+from concurrent.futures import wait as aguardar_futuros
 
 from .browser import BrowserManager
 from .cache import CacheManager
 from .api import APIManager
+from .api_async import AsyncAPIManager, LoopAssincrono
 from .langflow import LangflowManager
 from .metrics import MetricsManager
-from config import CREDENTIALS, URLS, LOGGING
+from .transport import HTTPTransport, EmbeddedTransport
+from .resilience import circuitos
+from .outbox import Outbox, OutboxFlusher
+from .bloom import FiltroMensagens
+from .deadline import orcamento, verificar, limitar_timeout, DeadlineExcedido
+from .workers import PoolNavegadores
+from config import CREDENTIALS, URLS, LOGGING, JOBS, HTTP_POOL, API_ASYNC, OUTBOX, TRANSPORTE_API, FILTRO_MENSAGENS, PRAZOS, EXTRACAO, NAVEGADORES
 
 # Configuração do logging
 os.makedirs('logs', exist_ok=True)
@@ -27,42 +37,141 @@ logger = logging.getLogger(__name__)
 class OlxScraper:
     def __init__(self):
         logger.info("Inicializando OlxScraper...")
-        self.api = APIManager(URLS["api"])
+        self.transport = HTTPTransport(**HTTP_POOL)
+        if URLS["api_uds"]:
+            self.transport.montar_uds(URLS["api"], URLS["api_uds"])
+        if TRANSPORTE_API["modo"] == "embutido":
+            # Chamadas para URLS["api"] viram chamadas locais; o resto segue pelo HTTP
+            self.transport = EmbeddedTransport(URLS["api"], self.transport)
+        self.filtro_mensagens = None
+        if FILTRO_MENSAGENS["ativo"]:
+            self.filtro_mensagens = FiltroMensagens(
+                FILTRO_MENSAGENS["caminho"],
+                capacidade_inicial=FILTRO_MENSAGENS["capacidade_inicial"],
+                taxa_fp=FILTRO_MENSAGENS["taxa_fp"],
+                taxa_auditoria=FILTRO_MENSAGENS["taxa_auditoria"]
+            )
+        self.api = APIManager(URLS["api"], self.transport, self.filtro_mensagens)
         self.browser = BrowserManager(self.api)
         self.cache = CacheManager()
-        self.langflow = LangflowManager()
+        self.langflow = LangflowManager(self.transport)
         self.metrics = MetricsManager()
-        logger.info("Métricas inicializadas")
+        circuitos.observar(self.metrics.registrar_mudanca_circuito)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        logger.info(f"Worker ID: {self.worker_id}")
+
+        # No modo assíncrono a thread do navegador só extrai; o envio das abas
+        # para a API roda no loop em paralelo
+        self.loop_async = None
+        self.api_async = None
+        self._sincronizacoes = []
+
+        # Com o outbox, a extração só grava em disco e o flusher envia em segundo plano
+        self.outbox = None
+        self.flusher = None
+        if OUTBOX["ativo"]:
+            self.outbox = Outbox(OUTBOX["caminho"])
+            self.flusher = OutboxFlusher(
+                self.outbox,
+                self.api,
+                lote=OUTBOX["lote"],
+                intervalo=OUTBOX["intervalo"],
+                max_tentativas=OUTBOX["max_tentativas"]
+            )
+            self.browser.sincronizar = self.outbox.registrar
+        elif API_ASYNC["ativo"]:
+            self.loop_async = LoopAssincrono()
+            self.api_async = AsyncAPIManager(
+                URLS["api"],
+                max_conexoes=API_ASYNC["max_conexoes"],
+                max_keepalive=API_ASYNC["max_conexoes"],
+                max_concorrencia=API_ASYNC["max_concorrencia"],
+                uds=URLS["api_uds"] or None,
+                filtro=self.filtro_mensagens
+            )
+            self._semaforo_abas = None
+            self.browser.sincronizar = self._despachar_sincronizacao
+
+        # Com vários navegadores, cada um roda em um processo e o self.browser
+        # local não abre Chrome; os dados dos workers seguem pelo mesmo sincronizar
+        self.navegadores = None
+        if NAVEGADORES["workers"] > 1:
+            self.navegadores = PoolNavegadores(
+                NAVEGADORES["workers"],
+                replicas=NAVEGADORES["replicas"],
+                timeout_inicio=NAVEGADORES["timeout_inicio"]
+            )
+            self.navegadores.sincronizar = self.browser.sincronizar
+
+    def _despachar_sincronizacao(self, dados):
+        """Agenda a sincronização da aba no loop assíncrono e retorna imediatamente"""
+        self._sincronizacoes.append(
+            self.loop_async.submeter(self._sincronizar_limitado(dados))
+        )
+
+    async def _sincronizar_limitado(self, dados):
+        # O semáforo é criado dentro do loop que vai usá-lo
+        if self._semaforo_abas is None:
+            self._semaforo_abas = asyncio.Semaphore(API_ASYNC["max_concorrencia"])
+        async with self._semaforo_abas:
+            return await self.api_async.sincronizar_aba(dados)
+
+    def _aguardar_sincronizacoes(self):
+        """Espera as abas despachadas chegarem à API antes de reservar os jobs"""
+        if not self._sincronizacoes:
+            return
+        concluidas, pendentes = aguardar_futuros(
+            self._sincronizacoes,
+            timeout=limitar_timeout(API_ASYNC["espera_sincronizacao"], "aguardar as sincronizações")
+        )
+        for futuro in concluidas:
+            if futuro.exception() is not None:
+                logger.error(f"Erro na sincronização assíncrona: {futuro.exception()}")
+                self.metrics.atualizar('erros')
+        if pendentes:
+            logger.warning(f"{len(pendentes)} sincronizações ainda em andamento; seguem para o próximo ciclo")
+        self._sincronizacoes = list(pendentes)
 
     def executar(self):
         """Executa o scraper completo"""
         try:
             logger.info("Iniciando execução do scraper...")
+            self._inicio = time.monotonic()
             
-            if not self.browser.iniciar_navegador():
-                logger.error("Falha ao iniciar o navegador")
-                return False
+            self.api.carregar_filtro_mensagens()
 
-            logger.info("Acessando página de favoritos...")
-            self.browser.driver.get(URLS["favorites"])
+            if self.flusher:
+                # Itens que ficaram no outbox da execução anterior já começam a ser enviados
+                self.flusher.iniciar()
 
-            if not self.browser.aceitar_cookies():
-                logger.error("Falha ao aceitar cookies")
-                return False
-                
-            if not self.browser.login():
-                logger.error("Falha no login")
-                return False
+            if self.navegadores:
+                links = self.navegadores.iniciar()
+                if links is None:
+                    logger.error("Falha ao iniciar os navegadores")
+                    return False
+            else:
+                if not self.browser.iniciar_navegador():
+                    logger.error("Falha ao iniciar o navegador")
+                    return False
 
-            # Coleta links e abre abas
-            logger.info("Coletando links dos anúncios...")
-            links = self.browser.append_links()
+                sessao = self.browser.entrar()
+                if sessao is None:
+                    return False
+                self.metrics.definir('sessao_reutilizada', sessao)
+
+                # Coleta links e abre abas
+                logger.info("Coletando links dos anúncios...")
+                links = self.browser.append_links()
             if not links:
                 logger.warning("Nenhum link encontrado para processar")
                 return True
 
             logger.info(f"Abrindo {len(links)} anúncios em abas...")
-            self.browser.abrir_anuncios_em_abas(links)
+            if self.navegadores:
+                self.navegadores.distribuir(links)
+            else:
+                self.browser.pool.definir_links(links)
+                self.browser.pool.preparar_ciclo()
             
             # Inicia ciclo de respostas
             logger.info("Iniciando ciclo de respostas...")
@@ -75,41 +184,135 @@ class OlxScraper:
             return False
         finally:
             logger.info("Finalizando execução...")
+            if self.navegadores:
+                self.navegadores.parar()
+            self.browser.salvar_sessao()
             self.browser.finalizar()
+            if self.flusher:
+                self.flusher.parar()
+                self.outbox.fechar()
+            if self.filtro_mensagens:
+                self.filtro_mensagens.salvar()
+            self.transport.fechar()
+            if self.loop_async:
+                try:
+                    self.loop_async.executar(self.api_async.fechar(), timeout=10)
+                except Exception as e:
+                    logger.error(f"Erro ao fechar a API assíncrona: {e}")
+                self.loop_async.parar()
             # Log final das métricas
             self.metrics.log()
 
+    def _responder_job(self, job):
+        """Gera a resposta de um job dentro do orçamento da conversa e confirma ou devolve o job"""
+        logger.info(f"Gerando resposta para: {job['mensagem']}")
+        
+        with orcamento(f"conversa do anúncio {job['anuncio_id']}", PRAZOS["conversa"]):
+            resposta = self.langflow.obter_resposta(job['mensagem'], job['anuncio_id'])
+        
+        if resposta:
+            logger.info(f"Resposta enviada: {resposta}")
+            self.api.confirmar_job(job['id'], self.worker_id)
+        else:
+            logger.warning(f"Falha ao gerar resposta")
+            self.metrics.atualizar('erros')
+            # Devolve o job para que outro ciclo (ou worker) tente novamente
+            self.api.devolver_job(job['id'], self.worker_id, JOBS["atraso_nack"])
+
+    def _registrar_metricas_navegador(self):
+        """Métricas de extração, esperas, pool e abas do navegador local"""
+        extracao = self.browser.estatisticas_extracao()
+        self.metrics.definir('abas_extraidas', extracao['abas'])
+        self.metrics.definir('extracao_aba_media_ms', extracao['media_ms'])
+        self.metrics.definir('extracao_aba_max_ms', extracao['max_ms'])
+        self.metrics.definir('esperas', self.browser.prontidao.estatisticas())
+        if self.browser.primeira_extracao_em is not None and not self.metrics.metricas['tempo_ate_primeira_extracao_s']:
+            self.metrics.definir('tempo_ate_primeira_extracao_s', round(self.browser.primeira_extracao_em - self._inicio, 1))
+            logger.info(
+                f"Primeira aba extraída {self.metrics.metricas['tempo_ate_primeira_extracao_s']}s após o início "
+                f"(sessão reutilizada: {self.metrics.metricas['sessao_reutilizada']})"
+            )
+        self.metrics.definir('abas_visitadas_ciclo', self.browser.abas_visitadas)
+        self.metrics.definir('caixa_entrada_conversas', self.browser.conversas_caixa_entrada)
+        self.metrics.definir('caixa_entrada_nao_lidas', self.browser.conversas_nao_lidas)
+        if self.browser.captura:
+            captura = self.browser.captura.estatisticas()
+            self.metrics.definir('captura_rede_mensagens', captura['capturadas'])
+            self.metrics.definir('captura_rede_descartadas', captura['descartadas'])
+        pool = self.browser.pool.estatisticas()
+        self.metrics.definir('pool_abas_abertas', pool['abertas'])
+        self.metrics.definir('pool_abas_ocupacao', pool['ocupacao'])
+        self.metrics.definir('pool_abas_despejos', pool['despejos'])
+        self.metrics.definir('pool_abas_reaberturas', pool['reaberturas'])
+        abas = self.browser.estatisticas_abas()
+        self.metrics.definir('perfil_navegador', abas['perfil'])
+        self.metrics.definir('carregamento_aba_medio_ms', abas['carregamento_medio_ms'])
+        self.metrics.definir('memoria_aba_media_mb', abas['memoria_media_mb'])
+
     def ciclo_de_respostas(self):
         """Loop para buscar mensagens pendentes e gerar respostas automáticas"""
         self.metrics.atualizar('inicio_execucao', datetime.now())
         
         while True:
             try:
-                # Verificar novas mensagens
-                logger.info("Verificando novas mensagens...")
-                self.browser.extrair_mensagens_vendedor()
-
-                logger.info("Verificando conversas pendentes...")
-                conversas_pendentes = self.api.buscar_respostas_pendentes()
-
-                if conversas_pendentes:
-                    for conversa in conversas_pendentes:
-                        for msg in conversa['mensagens']:
-                            if msg['tipo'] == 'recebida' and not msg['respondida']:
-                                logger.info(f"Gerando resposta para: {msg['mensagem']}")
-                                
-                                resposta = self.langflow.obter_resposta(msg['mensagem'], conversa['anuncio_id'])
-                                
-                                if resposta:
-                                    logger.info(f"Resposta enviada: {resposta}")
-                                else:
-                                    logger.warning(f"Falha ao gerar resposta")
-                                    self.metrics.atualizar('erros')
+                jobs = []
+                try:
+                    with orcamento("ciclo de respostas", PRAZOS["ciclo"]):
+                        # Verificar novas mensagens
+                        logger.info("Verificando novas mensagens...")
+                        if self.navegadores:
+                            self.navegadores.extrair(PRAZOS["ciclo"])
+                        elif EXTRACAO["origem"] == "caixa_entrada":
+                            self.browser.extrair_nao_lidas()
+                        else:
+                            self.browser.pool.preparar_ciclo()
+                            self.browser.extrair_mensagens_vendedor()
+                        self._aguardar_sincronizacoes()
+                        if self.flusher:
+                            self.flusher.disparar()
+
+                        logger.info("Reservando jobs de resposta pendentes...")
+                        jobs = self.api.reservar_jobs(self.worker_id, JOBS["limite"], JOBS["visibilidade"])
+
+                        while jobs:
+                            verificar("responder o próximo job")
+                            self._responder_job(jobs[0])
+                            jobs.pop(0)
+                except DeadlineExcedido as e:
+                    logger.warning(f"Ciclo de respostas interrompido: {e}")
+                finally:
+                    # Jobs reservados e não tratados voltam para a fila na hora, sem esperar o lease
+                    for job in jobs:
+                        self.api.devolver_job(job['id'], self.worker_id)
                 
                 # Atualizar métricas
                 self.metrics.atualizar('ultima_verificacao', datetime.now())
                 self.metrics.atualizar('tempo_total_execucao', 
                     (self.metrics.metricas['ultima_verificacao'] - self.metrics.metricas['inicio_execucao']).total_seconds())
+                http = self.transport.estatisticas()
+                self.metrics.definir('http_requisicoes', http['requisicoes'])
+                self.metrics.definir('http_conexoes_abertas', http['conexoes_abertas'])
+                self.metrics.definir('http_reuso_conexoes', http['reuso_conexoes'])
+                if self.outbox:
+                    outbox = self.outbox.estatisticas()
+                    self.metrics.definir('outbox_pendentes', outbox['pendentes'])
+                    self.metrics.definir('outbox_lag_segundos', outbox['lag_segundos'])
+                    self.metrics.definir('outbox_falhas', outbox['falhas'])
+                    self.metrics.definir('outbox_enviados', self.flusher.enviados)
+                if self.navegadores:
+                    navegadores = self.navegadores.estatisticas()
+                    self.metrics.definir('navegadores_vivos', navegadores['vivos'])
+                    self.metrics.definir('navegadores_reatribuicoes', navegadores['reatribuicoes'])
+                    self.metrics.definir('abas_extraidas', sum(self.navegadores.abas_extraidas.values()))
+                else:
+                    self._registrar_metricas_navegador()
+                if self.filtro_mensagens:
+                    self.filtro_mensagens.salvar()
+                    filtro = self.filtro_mensagens.estatisticas()
+                    self.metrics.definir('filtro_consultas', filtro['consultas'])
+                    self.metrics.definir('filtro_consultas_evitadas', filtro['evitadas'])
+                    self.metrics.definir('filtro_taxa_fp_estimada', filtro['taxa_fp_estimada'])
+                    self.metrics.definir('filtro_taxa_fp_auditada', filtro['taxa_fp_auditada'])
                 
                 # Log das métricas a cada ciclo
                 self.metrics.log()
@@ -0,0 +1,329 @@
+import inspect
+import json
+import logging
+import socket
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from fastapi import HTTPException, params
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import NewConnectionError
+
+from .deadline import limitar_timeout, verificar
+
+logger = logging.getLogger(__name__)
+
+class _ConexaoUnix(HTTPConnection):
+    """Conexão HTTP que abre um socket Unix em vez de TCP (o Host continua o da URL)"""
+
+    def __init__(self, *args, caminho_uds: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.caminho_uds = caminho_uds
+
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.caminho_uds)
+        except OSError as e:
+            sock.close()
+            raise NewConnectionError(self, f"Falha ao conectar ao socket {self.caminho_uds}: {e}") from e
+        return sock
+
+
+class _PoolUnix(HTTPConnectionPool):
+    ConnectionCls = _ConexaoUnix
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """Adapter do requests que envia as requisições de um prefixo de URL por um socket Unix"""
+
+    def __init__(self, caminho_uds: str, pool_maxsize: int = 16, pool_block: bool = False):
+        self.caminho_uds = caminho_uds
+        self.pools: Dict[tuple, _PoolUnix] = {}
+        self._lock_pools = threading.Lock()
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=pool_block, max_retries=0)
+
+    def _pool(self, url: str) -> _PoolUnix:
+        partes = urlsplit(url)
+        chave = (partes.hostname, partes.port)
+        with self._lock_pools:
+            if chave not in self.pools:
+                self.pools[chave] = _PoolUnix(
+                    partes.hostname,
+                    partes.port,
+                    maxsize=self._pool_maxsize,
+                    block=self._pool_block,
+                    caminho_uds=self.caminho_uds
+                )
+            return self.pools[chave]
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self._pool(request.url)
+
+    def get_connection(self, url, proxies=None):
+        return self._pool(url)
+
+    def close(self):
+        super().close()
+        with self._lock_pools:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools.clear()
+
+
+class HTTPTransport:
+    """Sessão HTTP compartilhada com pool de conexões keep-alive.
+
+    Uma única instância é criada pelo OlxScraper e entregue ao APIManager, ao
+    LangflowManager e ao BrowserManager, para que as chamadas reutilizem as
+    mesmas conexões TCP em vez de abrir uma nova a cada requisição.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16, pool_block: bool = False, keep_alive: bool = True):
+        self.session = requests.Session()
+        # pool_connections: quantos hosts mantêm um pool; pool_maxsize: conexões por host
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers["Connection"] = "keep-alive" if keep_alive else "close"
+
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.adaptadores_uds: Dict[str, UnixSocketAdapter] = {}
+
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        logger.info(f"Transporte HTTP configurado (hosts: {pool_connections}, conexões por host: {pool_maxsize}, keep-alive: {keep_alive})")
+
+    def montar_uds(self, base_url: str, caminho_uds: str) -> None:
+        """Envia pelo socket Unix `caminho_uds` as requisições cujas URLs começam com `base_url`"""
+        adaptador = UnixSocketAdapter(caminho_uds, self.pool_maxsize, self.pool_block)
+        self.session.mount(base_url.rstrip("/") + "/", adaptador)
+        self.adaptadores_uds[base_url] = adaptador
+        logger.info(f"Requisições para {base_url} usarão o socket Unix {caminho_uds}")
+
+    def request(self, metodo: str, url: str, **kwargs) -> requests.Response:
+        """Executa a requisição pela sessão compartilhada"""
+        kwargs["timeout"] = limitar_timeout(kwargs.get("timeout"), f"{metodo} {url}")
+        with self._lock:
+            self.requisicoes += 1
+        return self.session.request(metodo, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Retorna requisições feitas, conexões abertas e a taxa de reutilização por host"""
+        por_host = {}
+        conexoes = 0
+        requisicoes_pool = 0
+        pools = [self.adapter.poolmanager.pools.get(chave) for chave in list(self.adapter.poolmanager.pools.keys())]
+        for adaptador in self.adaptadores_uds.values():
+            pools.extend(list(adaptador.pools.values()))
+        for pool in pools:
+            if pool is None:
+                continue
+            caminho_uds = pool.conn_kw.get("caminho_uds")
+            host = f"unix:{caminho_uds}" if caminho_uds else f"{pool.scheme}://{pool.host}:{pool.port}"
+            por_host[host] = {
+                "conexoes": pool.num_connections,
+                "requisicoes": pool.num_requests,
+            }
+            conexoes += pool.num_connections
+            requisicoes_pool += pool.num_requests
+
+        reuso = 1 - conexoes / requisicoes_pool if requisicoes_pool else 0.0
+        return {
+            "requisicoes": self.requisicoes,
+            "conexoes_abertas": conexoes,
+            "reuso_conexoes": round(reuso, 3),
+            "por_host": por_host,
+        }
+
+    def fechar(self):
+        """Fecha as conexões do pool"""
+        try:
+            self.session.close()
+        except Exception as e:
+            logger.error(f"Erro ao fechar o transporte HTTP: {e}")
+
+
+class RespostaEmbutida:
+    """Resposta no formato usado pelos managers (status_code, json(), text)"""
+
+    def __init__(self, status_code: int, dados: Any):
+        self.status_code = status_code
+        self._dados = dados
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self._dados, ensure_ascii=False)
+
+    def json(self) -> Any:
+        return self._dados
+
+
+class EmbeddedTransport:
+    """Transporte que chama as rotas do pacote Database no próprio processo.
+
+    Para a instalação em uma única máquina: as requisições para `api_url` são
+    despachadas direto para as funções de Database.routes, com o mesmo
+    Storage (e o seu pool de conexões) que o servidor usaria, sem HTTP nem
+    uvicorn no caminho. Qualquer outra URL (Langflow) segue pelo HTTPTransport.
+    """
+
+    def __init__(self, api_url: str, http: Optional[HTTPTransport] = None, storage=None):
+        # Importado aqui para que o modo HTTP não carregue o pacote Database (e o banco local)
+        from Database.routes import router
+        from Database.storage import get_storage
+
+        self.api_url = api_url.rstrip("/")
+        self.http = http or HTTPTransport()
+        self.storage = storage or get_storage()
+        self.storage.inicializar()
+        self.rotas = [self._preparar_rota(rota) for rota in router.routes]
+
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        logger.info(f"Transporte embutido configurado para {self.api_url} ({len(self.rotas)} rotas)")
+
+    def _preparar_rota(self, rota) -> Dict[str, Any]:
+        """Lê a assinatura da rota uma vez: de onde vem cada parâmetro e como validá-lo"""
+        parametros = []
+        for nome, parametro in inspect.signature(rota.endpoint).parameters.items():
+            padrao = parametro.default
+            anotacao = parametro.annotation
+            if isinstance(padrao, params.Depends):
+                origem = "storage"
+            elif isinstance(padrao, params.Header):
+                origem = "header"
+            elif inspect.isclass(anotacao) and issubclass(anotacao, BaseModel):
+                origem = "body"
+            elif nome in rota.param_convertors:
+                origem = "path"
+            else:
+                origem = "query"
+
+            if isinstance(padrao, params.Header):
+                chave = (padrao.alias or nome.replace("_", "-")).lower()
+                padrao = padrao.default
+            else:
+                chave = nome
+
+            parametros.append({
+                "nome": nome,
+                "origem": origem,
+                "chave": chave,
+                "obrigatorio": padrao is inspect.Parameter.empty,
+                "padrao": None if padrao is inspect.Parameter.empty else padrao,
+                "validador": TypeAdapter(anotacao) if origem in ("path", "query") and anotacao is not inspect.Parameter.empty else None,
+                "modelo": anotacao if origem == "body" else None,
+            })
+        return {"metodos": rota.methods, "regex": rota.path_regex, "endpoint": rota.endpoint, "parametros": parametros}
+
+    def _resolver(self, metodo: str, caminho: str):
+        metodo_permitido = False
+        for rota in self.rotas:
+            encontrado = rota["regex"].match(caminho)
+            if not encontrado:
+                continue
+            if metodo not in rota["metodos"]:
+                metodo_permitido = True
+                continue
+            return rota, encontrado.groupdict()
+        if metodo_permitido:
+            raise HTTPException(status_code=405, detail="Method Not Allowed")
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    def _argumentos(self, rota: Dict[str, Any], caminho_params: Dict[str, str], query: Dict[str, Any],
+                    headers: Dict[str, str], corpo: Any) -> Dict[str, Any]:
+        argumentos = {}
+        erros = []
+        for parametro in rota["parametros"]:
+            origem = parametro["origem"]
+            if origem == "storage":
+                argumentos[parametro["nome"]] = self.storage
+                continue
+            if origem == "body":
+                try:
+                    argumentos[parametro["nome"]] = parametro["modelo"].model_validate(corpo)
+                except ValidationError as e:
+                    erros.extend(e.errors(include_url=False))
+                continue
+
+            fonte = {"path": caminho_params, "query": query, "header": headers}[origem]
+            valor = fonte.get(parametro["chave"])
+            if valor is None:
+                if parametro["obrigatorio"]:
+                    erros.append({"type": "missing", "loc": [origem, parametro["chave"]], "msg": "Field required"})
+                else:
+                    argumentos[parametro["nome"]] = parametro["padrao"]
+                continue
+            if parametro["validador"] is not None:
+                try:
+                    valor = parametro["validador"].validate_python(valor)
+                except ValidationError as e:
+                    erros.extend(e.errors(include_url=False))
+                    continue
+            argumentos[parametro["nome"]] = valor
+
+        if erros:
+            raise HTTPException(status_code=422, detail=jsonable_encoder(erros))
+        return argumentos
+
+    def request(self, metodo: str, url: str, **kwargs):
+        """Despacha para a rota local se a URL for da API; senão usa HTTP"""
+        if not url.startswith(self.api_url):
+            return self.http.request(metodo, url, **kwargs)
+
+        caminho = urlsplit(url).path or "/"
+        verificar(f"{metodo} {caminho}")
+        with self._lock:
+            self.requisicoes += 1
+        query = {chave: valor for chave, valor in (kwargs.get("params") or {}).items() if valor is not None}
+        headers = {chave.lower(): valor for chave, valor in (kwargs.get("headers") or {}).items()}
+        try:
+            rota, caminho_params = self._resolver(metodo.upper(), caminho)
+            argumentos = self._argumentos(rota, caminho_params, query, headers, kwargs.get("json"))
+            return RespostaEmbutida(200, jsonable_encoder(rota["endpoint"](**argumentos)))
+        except HTTPException as e:
+            return RespostaEmbutida(e.status_code, {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"Erro no transporte embutido ({metodo} {caminho}): {e}")
+            return RespostaEmbutida(500, {"detail": "Internal Server Error"})
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Estatísticas do HTTP (Langflow), somando as chamadas feitas localmente"""
+        estatisticas = self.http.estatisticas()
+        estatisticas["requisicoes"] += self.requisicoes
+        estatisticas["requisicoes_embutidas"] = self.requisicoes
+        return estatisticas
+
+    def fechar(self):
+        self.http.fechar()
@@ -0,0 +1,306 @@
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from config import LOGGING, SESSAO
+from .deadline import limitar_timeout, orcamento
+
+logger = logging.getLogger(__name__)
+
+# ID do anúncio na URL do OLX (".../titulo-IDabc123.html")
+_ID_NA_URL = re.compile(r"-ID([A-Za-z0-9]+)\.html")
+
+def chave_do_anuncio(link: str) -> str:
+    """Chave estável do anúncio para o sharding: o ID da URL, ou a URL sem parâmetros"""
+    encontrado = _ID_NA_URL.search(link)
+    return encontrado.group(1) if encontrado else link.split("?")[0]
+
+
+class AnelConsistente:
+    """Hashing consistente: cada worker ocupa `replicas` pontos no anel.
+
+    Quando um worker sai, só as chaves dele mudam de dono; as dos outros ficam onde estão.
+    """
+
+    def __init__(self, replicas: int = 64):
+        self.replicas = replicas
+        self._pontos: List[int] = []
+        self._donos: Dict[int, int] = {}
+
+    @staticmethod
+    def _hash(valor: str) -> int:
+        return int.from_bytes(hashlib.blake2b(valor.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def adicionar(self, no: int):
+        for replica in range(self.replicas):
+            ponto = self._hash(f"{no}#{replica}")
+            self._donos[ponto] = no
+            bisect.insort(self._pontos, ponto)
+
+    def remover(self, no: int):
+        self._pontos = [ponto for ponto in self._pontos if self._donos[ponto] != no]
+        self._donos = {ponto: dono for ponto, dono in self._donos.items() if dono != no}
+
+    def no_para(self, chave: str) -> int:
+        if not self._pontos:
+            raise LookupError("Nenhum worker no anel")
+        indice = bisect.bisect(self._pontos, self._hash(chave)) % len(self._pontos)
+        return self._donos[self._pontos[indice]]
+
+
+def _executar_worker(indice: int, comandos, resultados):
+    """Processo de um worker: um Chrome e um BrowserManager próprios, guiados pela fila de comandos"""
+    from .browser import BrowserManager
+
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(
+        level=getattr(logging, LOGGING["level"]),
+        format=f"%(asctime)s - worker {indice} - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler(os.path.join('logs', f"worker_{indice}_{LOGGING['file']}"), encoding='utf-8')]
+    )
+    # Dois Chromes não podem usar o mesmo user-data-dir
+    SESSAO["perfil_dir"] = f"{SESSAO['perfil_dir']}_{indice}"
+    SESSAO["arquivo"] = f"{indice}_{SESSAO['arquivo']}"
+
+    browser = BrowserManager(SimpleNamespace(sincronizar_aba=None))
+    # O link vai junto para o processo principal saber rotear envios ao anúncio
+    browser.sincronizar = lambda dados: resultados.put(
+        ("dados", indice, dados, browser.pool.link_do_anuncio(dados["anuncio_id"]))
+    )
+    try:
+        if not browser.iniciar_navegador() or browser.entrar() is None:
+            resultados.put(("falha", indice, "não foi possível iniciar o navegador e entrar no OLX"))
+            return
+        resultados.put(("pronto", indice, browser.append_links()))
+
+        while True:
+            comando = comandos.get()
+            tipo = comando[0]
+            if tipo == "parar":
+                break
+            elif tipo == "links":
+                browser.pool.definir_links(comando[1])
+                browser.pool.preparar_ciclo()
+            elif tipo == "extrair":
+                try:
+                    with orcamento(f"extração do worker {indice}", comando[1]):
+                        browser.pool.preparar_ciclo()
+                        browser.extrair_mensagens_vendedor()
+                except Exception as e:
+                    logger.error(f"Erro na extração: {e}")
+                resultados.put(("extraido", indice, browser.estatisticas_extracao()))
+            elif tipo == "enviar":
+                _, id_envio, anuncio_id, link, mensagem = comando
+                # O anúncio pode ter vindo de outro worker: sem o link, reabrir_anuncio falharia
+                browser.pool.anuncios.setdefault(anuncio_id, link)
+                resultados.put(("enviado", indice, id_envio, browser.enviar_mensagem_olx(anuncio_id, mensagem)))
+    finally:
+        browser.salvar_sessao()
+        browser.finalizar()
+
+
+class PoolNavegadores:
+    """N workers, cada um um processo com seu próprio Chrome, dividindo os anúncios entre si.
+
+    Os anúncios são distribuídos por hashing consistente da chave do anúncio e
+    cada worker abre e extrai só as abas do seu pedaço. Os dados extraídos
+    voltam por uma fila e seguem para `sincronizar` no processo principal
+    (mesmo caminho da extração local). Um worker que morre sai do anel e o
+    pedaço dele é redistribuído entre os outros.
+    """
+
+    def __init__(self, workers: int, replicas: int = 64, timeout_inicio: float = 300):
+        self.quantidade = workers
+        self.timeout_inicio = timeout_inicio
+        self.anel = AnelConsistente(replicas)
+        self.sincronizar: Callable[[Dict[str, Any]], Any] = lambda dados: None
+        # O Chrome e os drivers não sobrevivem a um fork; spawn em todas as plataformas
+        self._contexto = multiprocessing.get_context("spawn")
+        self._resultados = self._contexto.Queue()
+        self.workers: Dict[int, Dict[str, Any]] = {}
+        self.links: List[str] = []
+        self.donos: Dict[str, int] = {}  # anuncio_id -> worker que extraiu o anúncio
+        self.links_anuncios: Dict[str, str] = {}  # anuncio_id -> link dos favoritos
+        self._ids_envio = itertools.count(1)
+        self._envio_pendente: Optional[int] = None
+        self._resultado_envio: Optional[bool] = None
+        self.reatribuicoes = 0
+        self.abas_extraidas: Dict[int, int] = {}
+
+    def iniciar(self) -> Optional[List[str]]:
+        """Sobe os workers e espera o login de cada um; retorna os links dos favoritos ou None"""
+        for indice in range(self.quantidade):
+            comandos = self._contexto.Queue()
+            processo = self._contexto.Process(
+                target=_executar_worker, args=(indice, comandos, self._resultados),
+                name=f"navegador-{indice}", daemon=True
+            )
+            processo.start()
+            self.workers[indice] = {"processo": processo, "comandos": comandos, "links": []}
+        logger.info(f"{self.quantidade} navegadores iniciando em processos separados...")
+
+        links: Optional[List[str]] = None
+        aguardando = set(self.workers)
+        limite = time.monotonic() + self.timeout_inicio
+        while aguardando and time.monotonic() < limite:
+            try:
+                tipo, indice, conteudo = self._resultados.get(timeout=1)
+            except queue.Empty:
+                for indice in [i for i in aguardando if not self.workers[i]["processo"].is_alive()]:
+                    logger.error(f"Navegador {indice} terminou durante a inicialização")
+                    self._remover_worker(indice)
+                    aguardando.discard(indice)
+                continue
+            aguardando.discard(indice)
+            if tipo == "pronto":
+                self.anel.adicionar(indice)
+                links = links or conteudo
+                logger.info(f"Navegador {indice} pronto")
+            else:
+                logger.error(f"Navegador {indice} falhou: {conteudo}")
+                self._remover_worker(indice)
+
+        for indice in aguardando:
+            logger.error(f"Navegador {indice} não ficou pronto em {self.timeout_inicio}s")
+            self._remover_worker(indice)
+        if not self.workers:
+            logger.error("Nenhum navegador disponível")
+            return None
+        return links or []
+
+    def distribuir(self, links: List[str]):
+        """Divide os links entre os workers vivos e manda cada um abrir o seu pedaço"""
+        self.links = list(links)
+        self._enviar_fragmentos()
+
+    def _enviar_fragmentos(self):
+        fragmentos: Dict[int, List[str]] = {indice: [] for indice in self.workers}
+        for link in self.links:
+            fragmentos[self.anel.no_para(chave_do_anuncio(link))].append(link)
+        for indice, fragmento in fragmentos.items():
+            worker = self.workers[indice]
+            if fragmento != worker["links"]:
+                worker["links"] = fragmento
+                worker["comandos"].put(("links", fragmento))
+        logger.info(f"Anúncios por navegador: { {indice: len(f) for indice, f in fragmentos.items()} }")
+
+    def extrair(self, prazo: float):
+        """Manda todos os workers extraírem suas abas e sincroniza os dados conforme chegam"""
+        prazo = limitar_timeout(prazo, "extrair nos navegadores")
+        for worker in self.workers.values():
+            worker["comandos"].put(("extrair", prazo))
+
+        pendentes: Set[int] = set(self.workers)
+        limite = time.monotonic() + prazo
+        while pendentes:
+            sobra = limite - time.monotonic()
+            if sobra <= 0:
+                logger.warning(f"Navegadores {sorted(pendentes)} não terminaram a extração no prazo")
+                break
+            try:
+                self._tratar(self._resultados.get(timeout=min(1.0, sobra)), pendentes)
+            except queue.Empty:
+                pass
+            self._verificar_workers(pendentes)
+
+    def enviar_mensagem_olx(self, anuncio_id: str, mensagem: str, timeout: float = 60) -> bool:
+        """Envia a mensagem pelo worker que tem a aba do anúncio.
+
+        Sem resposta do worker dentro do prazo o envio conta como falho; uma
+        resposta que chegue depois é descartada.
+        """
+        self._verificar_workers(set())
+        if not self.workers:
+            return False
+        link = self.links_anuncios.get(anuncio_id)
+        if link is None:
+            logger.error(f"Link do anúncio {anuncio_id} desconhecido; mensagem não enviada")
+            return False
+        dono = self.donos.get(anuncio_id)
+        if dono not in self.workers:
+            # O anel é indexado pela chave do link, a mesma usada ao distribuir
+            dono = self.anel.no_para(chave_do_anuncio(link))
+
+        limite = time.monotonic() + limitar_timeout(timeout, f"enviar mensagem no anúncio {anuncio_id}")
+        self._envio_pendente = next(self._ids_envio)
+        self._resultado_envio = None
+        self.workers[dono]["comandos"].put(("enviar", self._envio_pendente, anuncio_id, link, mensagem))
+        try:
+            while self._resultado_envio is None and time.monotonic() < limite:
+                try:
+                    self._tratar(self._resultados.get(timeout=1), set())
+                except queue.Empty:
+                    if not self.workers[dono]["processo"].is_alive():
+                        break
+            return bool(self._resultado_envio)
+        finally:
+            self._envio_pendente = None
+
+    def _tratar(self, mensagem, pendentes: Set[int]):
+        tipo, indice = mensagem[0], mensagem[1]
+        if tipo == "dados":
+            dados, link = mensagem[2], mensagem[3]
+            self.donos[dados["anuncio_id"]] = indice
+            if link:
+                self.links_anuncios[dados["anuncio_id"]] = link
+            try:
+                self.sincronizar(dados)
+            except Exception as e:
+                logger.error(f"Erro ao sincronizar aba do navegador {indice}: {e}")
+        elif tipo == "extraido":
+            pendentes.discard(indice)
+            self.abas_extraidas[indice] = mensagem[2]["abas"]
+        elif tipo == "enviado":
+            if mensagem[2] == self._envio_pendente:
+                self._resultado_envio = mensagem[3]
+            else:
+                logger.warning(f"Resultado atrasado do envio {mensagem[2]} (navegador {indice}) descartado")
+
+    def _verificar_workers(self, pendentes: Set[int]):
+        """Tira do anel os workers que morreram e redistribui os anúncios deles"""
+        mortos = [indice for indice, worker in self.workers.items() if not worker["processo"].is_alive()]
+        if not mortos:
+            return
+        for indice in mortos:
+            logger.error(f"Navegador {indice} terminou (código {self.workers[indice]['processo'].exitcode}); redistribuindo seus anúncios")
+            self._remover_worker(indice)
+            pendentes.discard(indice)
+            self.reatribuicoes += 1
+        if self.workers:
+            self._enviar_fragmentos()
+
+    def _remover_worker(self, indice: int):
+        worker = self.workers.pop(indice, None)
+        if worker is None:
+            return
+        self.anel.remover(indice)
+        if worker["processo"].is_alive():
+            worker["processo"].terminate()
+        for anuncio_id in [a for a, dono in self.donos.items() if dono == indice]:
+            del self.donos[anuncio_id]
+
+    def parar(self, timeout: float = 30):
+        for worker in self.workers.values():
+            worker["comandos"].put(("parar",))
+        for indice, worker in list(self.workers.items()):
+            worker["processo"].join(timeout)
+            if worker["processo"].is_alive():
+                logger.warning(f"Navegador {indice} não parou a tempo; encerrando")
+                worker["processo"].terminate()
+        self.workers.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "workers": self.quantidade,
+            "vivos": len(self.workers),
+            "reatribuicoes": self.reatribuicoes,
+            "anuncios_por_worker": {indice: len(worker["links"]) for indice, worker in self.workers.items()},
+        }
@@ -0,0 +1,106 @@
+"""
+Compara a latência (p50/p99) da API por TCP loopback e por socket Unix nos
+endpoints chamados a cada mensagem (/mensagem-existe e /receber-mensagem).
+
+Sobe um servidor próprio com o armazenamento em memória, para não tocar no
+banco real:
+
+    python benchmark_transporte.py --requisicoes 2000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from OlxManager.transport import HTTPTransport
+
+BASE_URL = "http://localhost:8000"
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def aguardar_servidor(transport, caminho_uds, timeout=20):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            if os.path.exists(caminho_uds) and transport.get(f"{BASE_URL}/conversas/resumo", params={"email": "bench"}, timeout=1).ok:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Servidor não respondeu a tempo")
+
+
+def medir(transport, endpoint, requisicoes):
+    """Executa as requisições e retorna as latências em milissegundos"""
+    latencias = []
+    for i in range(requisicoes):
+        if endpoint == "/mensagem-existe":
+            inicio = time.perf_counter()
+            response = transport.get(
+                f"{BASE_URL}/mensagem-existe",
+                params={"email": "bench", "anuncio_id": "1", "mensagem": f"mensagem {i % 50}", "tipo": "recebida"},
+                timeout=10
+            )
+        else:
+            inicio = time.perf_counter()
+            response = transport.post(
+                f"{BASE_URL}/receber-mensagem",
+                params={"email": "bench", "anuncio_id": str(i % 50), "tipo": "recebida" if i % 2 else "enviada"},
+                json={"mensagem": f"mensagem {i}"},
+                headers={"Idempotency-Key": str(uuid.uuid4())},
+                timeout=10
+            )
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        response.raise_for_status()
+    return latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência da API por TCP e por socket Unix")
+    parser.add_argument("--requisicoes", type=int, default=1000, help="Requisições por endpoint e transporte")
+    parser.add_argument("--aquecimento", type=int, default=100, help="Requisições descartadas antes de medir")
+    args = parser.parse_args()
+
+    caminho_uds = os.path.join(tempfile.mkdtemp(), "api.sock")
+    ambiente = {**os.environ, "API_UDS": caminho_uds, "DB_BACKEND": "memoria"}
+    servidor = subprocess.Popen(
+        [sys.executable, "-c", "from Database.server import iniciar_servidor; iniciar_servidor()"],
+        env=ambiente,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    try:
+        tcp = HTTPTransport()
+        uds = HTTPTransport()
+        uds.montar_uds(BASE_URL, caminho_uds)
+        aguardar_servidor(tcp, caminho_uds)
+
+        print(f"{'endpoint':<20} {'transporte':<10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'média':>9}")
+        for endpoint in ("/mensagem-existe", "/receber-mensagem"):
+            for nome, transport in (("tcp", tcp), ("uds", uds)):
+                medir(transport, endpoint, args.aquecimento)
+                latencias = medir(transport, endpoint, args.requisicoes)
+                print(
+                    f"{endpoint:<20} {nome:<10} {percentil(latencias, 50):>9.3f} "
+                    f"{percentil(latencias, 99):>9.3f} {statistics.mean(latencias):>9.3f}"
+                )
+
+        tcp.fechar()
+        uds.fechar()
+    finally:
+        servidor.terminate()
+        servidor.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
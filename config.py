@@ -6,7 +6,70 @@ load_dotenv()
 
 # Configurações do navegador
 BROWSER_OPTIONS = {
-    "disable_popup_blocking": True
+    "disable_popup_blocking": True,
+    # "completo": Chrome com janela maximizada carregando tudo; "leve": PERFIL_LEVE
+    "perfil": os.getenv("BROWSER_PERFIL", "completo")
+}
+
+# Perfil "leve": só lemos texto das páginas do OLX, então imagens, mídia,
+# fontes e rastreadores de terceiros não são carregados
+PERFIL_LEVE = {
+    "headless": True,
+    "largura": 1280,
+    "altura": 800,
+    # Padrões do Network.setBlockedURLs, aplicados em cada aba antes de navegar
+    "bloquear_urls": [
+        "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+        "*.mp4", "*.webm", "*.mp3",
+        "*.woff", "*.woff2", "*.ttf", "*.otf"
+    ],
+    # Domínios de analytics e anúncios, bloqueados no resolvedor do Chrome (todas as abas)
+    "bloquear_dominios": [
+        "*.google-analytics.com", "*.googletagmanager.com", "*.doubleclick.net",
+        "*.googlesyndication.com", "*.facebook.net", "*.hotjar.com", "*.criteo.com",
+        "*.taboola.com", "*.adnxs.com", "*.scorecardresearch.com"
+    ]
+}
+
+# Reaproveitamento da sessão do OLX entre execuções:
+# "perfil" (user-data-dir persistente do Chrome), "cookies" (cookies e
+# localStorage salvos em arquivo) ou "nenhum" (sempre login completo)
+SESSAO = {
+    "modo": os.getenv("SESSAO_MODO", "perfil"),
+    "perfil_dir": os.getenv("CHROME_PERFIL_DIR", "chrome_perfil"),
+    "arquivo": "sessao_olx.json",
+    "timeout_verificacao": 10  # Espera máxima para decidir se a sessão é válida
+}
+
+# Extração das mensagens de cada aba: "script" (um único execute_script devolve
+# todas as mensagens em ordem) ou "elementos" (um WebElement por mensagem, antigo;
+# útil para comparar o tempo por aba)
+EXTRACAO = {
+    "modo": "script",
+    # Quais abas visitar a cada ciclo: "abas" (todas as abertas) ou "caixa_entrada"
+    # (só os anúncios com conversa não lida ou com prévia nova na caixa de entrada)
+    "origem": "abas",
+    # Lê todas as abas ao mesmo tempo, cada uma pela sua sessão CDP, sem trocar de aba
+    "paralela": False,
+    "max_abas_paralelas": 16
+}
+
+# Captura das mensagens do chat pelo tráfego de rede (eventos Network do CDP no
+# log de performance): respostas JSON e frames de websocket das URLs abaixo. Abas
+# sem nada capturado continuam sendo lidas pelo DOM
+CAPTURA_REDE = {
+    "ativo": False,
+    "padroes_url": [r"/api/v\d+/chat", r"/conversations?/", r"/messages"],
+    # Usuário do OLX logado; identifica as mensagens enviadas quando o payload não traz "minha"
+    "meu_usuario": os.getenv("OLX_USER_ID", ""),
+    # Nomes possíveis de cada campo nos payloads, em ordem de preferência
+    "campos": {
+        "id": ["id", "uuid", "message_id"],
+        "texto": ["text", "message", "body", "content"],
+        "data": ["created_at", "createdAt", "timestamp", "sent_at", "date"],
+        "autor": ["sender_id", "senderId", "author_id", "user_id", "sender", "from"],
+        "minha": ["is_mine", "isMine", "own", "is_own"]
+    }
 }
 
 # Configurações de tempo
@@ -17,6 +80,43 @@ TIMEOUTS = {
     "max_retries": 3
 }
 
+# Esperas do navegador por condições (rede ociosa, elemento, mudança no chat)
+PRONTIDAO = {
+    "intervalo": 0.1,         # Segundos entre verificações da condição
+    "ociosidade_rede": 0.5,   # Segundos sem requisições para considerar a rede ociosa
+    "timeout_rede": 10,       # Espera máxima pela rede ociosa
+    "timeout_envio": 5        # Espera máxima pela mensagem enviada aparecer no chat
+}
+
+# Abertura das abas dos favoritos
+ABERTURA_ABAS = {
+    "max_em_andamento": 8,  # Abas carregando ao mesmo tempo
+    "timeout": 120          # Espera máxima (segundos) para todas as abas carregarem
+}
+
+# Pool de abas: no máximo "maximo" anúncios ficam com aba aberta e os demais
+# entram em rodízio (0 mantém uma aba por favorito, sem limite)
+POOL_ABAS = {
+    "maximo": 20,
+    "janela_atividade": 3600  # Segundos em que uma mensagem nova do vendedor dá prioridade ao anúncio
+}
+
+# Vários navegadores: com "workers" > 1 cada worker é um processo com seu próprio
+# Chrome e os anúncios são divididos entre eles por hashing consistente. Cada
+# Chrome ocupa pelo menos um núcleo renderizando; não passe do número de núcleos
+NAVEGADORES = {
+    "workers": int(os.getenv("NAVEGADORES_WORKERS", "1")),
+    "replicas": 64,         # Pontos de cada worker no anel de hashing
+    "timeout_inicio": 300   # Espera máxima para cada worker abrir o Chrome e entrar no OLX
+}
+
+# Orçamentos de tempo (segundos): nenhuma chamada dentro do bloco passa do prazo
+PRAZOS = {
+    "ciclo": 240,     # Um ciclo inteiro de ciclo_de_respostas (extração + respostas)
+    "conversa": 90,   # Gerar a resposta de um job (API + Langflow)
+    "aba": 30         # Extrair uma aba no navegador
+}
+
 # Configurações de login
 CREDENTIALS = {
     "username": os.getenv("OLX_USERNAME", ""),
@@ -26,11 +126,77 @@ CREDENTIALS = {
 # URLs
 URLS = {
     "favorites": "https://www.olx.pt/favoritos/",
+    "inbox": "https://www.olx.pt/myaccount/answers/",  # Caixa de entrada de mensagens
     "base_url": "https://www.olx.pt",
     "api": "http://localhost:8000",  # URL da API FastAPI
+    # Socket Unix da API (mesma variável API_UDS do servidor); vazio usa TCP.
+    # Com ele, as requisições para URLS["api"] passam pelo socket, sem loopback TCP
+    "api_uds": os.getenv("API_UDS", ""),
     "Langflow_URL" : "http://127.0.0.1:7860/api/v1/run/a0075945-5b70-43d4-9a82-ab84ddc6be27"
 }
 
+# Como o APIManager chega à API: "http" (padrão, servidor local ou remoto) ou
+# "embutido" (chama as rotas do pacote Database no próprio processo, só quando a
+# API e o scraper rodam na mesma máquina; o Langflow continua via HTTP)
+TRANSPORTE_API = {
+    "modo": "http"
+}
+
+# Pool de conexões HTTP compartilhado (API e Langflow)
+HTTP_POOL = {
+    "pool_connections": 4,  # Número de hosts com pool próprio
+    "pool_maxsize": 16,     # Conexões keep-alive mantidas por host
+    "pool_block": False,    # Se True, espera por uma conexão livre em vez de abrir uma extra
+    "keep_alive": True
+}
+
+# Filtro de mensagens já gravadas (Bloom filter por anúncio) usado pelo APIManager
+FILTRO_MENSAGENS = {
+    "ativo": True,
+    "caminho": "filtro_mensagens.json",
+    "capacidade_inicial": 64,  # Mensagens por anúncio antes de o filtro crescer
+    "taxa_fp": 1e-6,           # Taxa de falso positivo desejada por anúncio
+    "taxa_auditoria": 0.01     # Fração dos acertos conferida na API para medir os falsos positivos
+}
+
+# Outbox local: as abas extraídas são gravadas em disco e enviadas à API em lote
+OUTBOX = {
+    "ativo": True,           # Se False, as abas vão direto para a API (ou para o API_ASYNC)
+    "caminho": "outbox.db",
+    "lote": 50,              # Itens por requisição ao /sincronizar-lote
+    "intervalo": 2,          # Segundos entre envios quando a fila está vazia
+    "max_tentativas": 10     # Falhas de um item antes de desistir dele
+}
+
+# Sincronização assíncrona com a API (AsyncAPIManager)
+API_ASYNC = {
+    "ativo": False,             # Se True (e o OUTBOX desativado), as abas são enviadas à API em paralelo
+    "max_concorrencia": 10,     # Abas sincronizadas ao mesmo tempo
+    "max_conexoes": 16,         # Conexões do pool do cliente assíncrono
+    "espera_sincronizacao": 120 # Segundos aguardando as sincronizações antes de reservar jobs
+}
+
+# Novas tentativas e circuit breakers (OlxManager/resilience.py)
+RESILIENCIA = {
+    "politicas": {
+        # espera_base/espera_max em segundos; prazo limita a chamada inteira, incluindo as esperas
+        "api": {"max_tentativas": 3, "espera_base": 0.5, "espera_max": 5, "jitter": 0.5, "prazo": 30},
+        "langflow": {"max_tentativas": 3, "espera_base": 5, "espera_max": 30, "jitter": 0.5, "prazo": 120},
+        "olx": {"max_tentativas": 3, "espera_base": 1, "espera_max": 5, "jitter": 0.5, "prazo": 60}
+    },
+    "circuito": {
+        "limite_falhas": 5,  # Falhas seguidas para abrir o circuito
+        "tempo_aberto": 30   # Segundos recusando chamadas antes de testar de novo
+    }
+}
+
+# Fila de respostas (reply_jobs)
+JOBS = {
+    "limite": 10,         # Máximo de jobs reservados por ciclo
+    "visibilidade": 300,  # Segundos até um job reservado voltar para a fila
+    "atraso_nack": 60     # Segundos de espera antes de reprocessar um job que falhou
+}
+
 # Configurações de logging
 LOGGING = {
     "level": "INFO",